@@ -0,0 +1,121 @@
+# --- artifacts.py (Rendered brief outputs with retention-based eviction) ---
+
+from collections import OrderedDict
+from typing import Optional
+import threading
+import time
+import os
+
+
+class ArtifactStore:
+    """Rendered outputs (PDF/JSON/TXT/ZIP bytes) keyed by brief digest and format.
+
+    Outputs live in a byte-bounded in-memory LRU and, when `directory` is set, in files there as well
+    so they survive restarts. Both tiers drop entries older than `retention_seconds`; the directory
+    is swept at most once a minute, on writes.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        retention_seconds: float = 3600,
+        max_memory_bytes: int = 64 * 1024 * 1024
+    ):
+        self.directory = directory
+        self.retention_seconds = retention_seconds
+        self.max_memory_bytes = max_memory_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str, fmt: str) -> str:
+        return os.path.join(self.directory, f"{key}.{fmt}")
+
+    # ----------- Memory tier -----------
+    def _memory_put(self, name: tuple, data: bytes, stored_at: float):
+        old = self._memory.pop(name, None)
+        if old is not None:
+            self._memory_bytes -= len(old[1])
+        if len(data) > self.max_memory_bytes:
+            return
+        self._memory[name] = (stored_at, data)
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, (_, evicted) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _memory_get(self, name: tuple) -> Optional[bytes]:
+        entry = self._memory.get(name)
+        if entry is None:
+            return None
+        stored_at, data = entry
+        if time.time() - stored_at > self.retention_seconds:
+            del self._memory[name]
+            self._memory_bytes -= len(data)
+            return None
+        self._memory.move_to_end(name)
+        return data
+
+    # ----------- Disk tier -----------
+    def sweep(self):
+        # Deletes files past retention
+        if not self.directory:
+            return
+        cutoff = time.time() - self.retention_seconds
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def _disk_get(self, key: str, fmt: str) -> Optional[tuple]:
+        path = self._path(key, fmt)
+        try:
+            stored_at = os.stat(path).st_mtime
+            if time.time() - stored_at > self.retention_seconds:
+                return None
+            with open(path, "rb") as f:
+                return stored_at, f.read()
+        except FileNotFoundError:
+            return None
+
+    def _disk_put(self, key: str, fmt: str, data: bytes):
+        path = self._path(key, fmt)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    # ----------- Public API -----------
+    def get(self, key: str, fmt: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._memory_get((key, fmt))
+            if data is not None or not self.directory:
+                return data
+        hit = self._disk_get(key, fmt)
+        if hit is None:
+            return None
+        stored_at, data = hit
+        with self._lock:
+            self._memory_put((key, fmt), data, stored_at)
+        return data
+
+    def put(self, key: str, fmt: str, data: bytes):
+        now = time.time()
+        with self._lock:
+            self._memory_put((key, fmt), data, now)
+            sweep = self.directory and now - self._last_sweep > 60
+            if sweep:
+                self._last_sweep = now
+        if self.directory:
+            try:
+                self._disk_put(key, fmt, data)
+                if sweep:
+                    self.sweep()
+            except OSError as e:
+                print(f"⚠️ Could not write artifact {key}.{fmt}: {e}")
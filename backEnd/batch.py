@@ -0,0 +1,249 @@
+# --- batch.py (Staged batch runner for pipeline.py --batch) ---
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List
+import threading
+import time
+import json
+import csv
+import os
+
+import pipeline
+
+MANIFEST_NAME = "manifest.jsonl"
+
+
+# ----------- Batch Input -----------
+def read_batch_file(path: str) -> List[dict]:
+    # Plain citation list (one per line, '#' comments), CSV with a "citation" column, or JSONL objects
+    items = []
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, newline="", encoding="utf-8") as f:
+        if ext == ".jsonl":
+            for line in f:
+                if line.strip():
+                    items.append(json.loads(line))
+        elif ext == ".csv":
+            reader = csv.reader(f)
+            rows = [row for row in reader if row and any(cell.strip() for cell in row)]
+            header = [cell.strip().lower() for cell in rows[0]] if rows else []
+            if "citation" in header:
+                for row in rows[1:]:
+                    items.append({k: v.strip() for k, v in zip(header, row) if v.strip()})
+            else:
+                items.extend({"citation": row[0].strip()} for row in rows)
+        else:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    items.append({"citation": line})
+    return [item for item in items if item.get("citation")]
+
+
+# ----------- Manifest -----------
+def _item_key(citation: str, mode: str, fmt: str) -> str:
+    return f"{' '.join(citation.split()).upper()}|{mode}|{fmt}"
+
+
+def load_completed(manifest_path: str) -> dict:
+    # item key -> output path, for entries that finished and whose output still exists
+    completed = {}
+    if not os.path.exists(manifest_path):
+        return completed
+    with open(manifest_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # a crash may leave a torn last line
+            key = _item_key(entry["citation"], entry["mode"], entry["format"])
+            if entry.get("status") == "done" and entry.get("output") and os.path.exists(entry["output"]):
+                completed[key] = entry["output"]
+            else:
+                completed.pop(key, None)
+    return completed
+
+
+class _Manifest:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, entry: dict):
+        entry["finished_at"] = time.time()
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+
+# ----------- Batch Runner -----------
+def run_batch(
+    items: List[dict],
+    output_dir: str,
+    fmt: str = "pdf",
+    mode: str = "student",
+    temperature: float = 0.3,
+    max_tokens: int = 1500,
+    stop: Optional[List[str]] = None,
+    fetch_workers: int = 8,
+    llm_workers: int = 1,
+    render_workers: Optional[int] = None,
+    resume: bool = True,
+    use_cache: bool = True
+) -> dict:
+    """Run fetch -> generate -> render as overlapping stages.
+
+    Fetches use I/O concurrency, generation is bounded by llm_workers, and PDF rendering runs in a
+    process pool. Every finished item is appended to <output_dir>/manifest.jsonl, which --batch
+    reads on restart to skip work that is already done.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = _Manifest(os.path.join(output_dir, MANIFEST_NAME))
+    completed = load_completed(manifest.path) if resume else {}
+
+    todo = []
+    skipped = 0
+    for item in items:
+        item_mode = item.get("mode", mode)
+        if _item_key(item["citation"], item_mode, fmt) in completed:
+            skipped += 1
+        else:
+            todo.append(dict(item, mode=item_mode))
+    total = len(todo)
+    print(f"📚 Batch: {total} to generate, {skipped} already done")
+
+    stats = {"done": 0, "failed": 0, "skipped": skipped}
+    stats_lock = threading.Lock()
+    all_done = threading.Event()
+    if total == 0:
+        return stats
+    # One citation-lookup request per CL_LOOKUP_BATCH citations instead of one per item
+    try:
+        clusters = pipeline.resolve_citations([item["citation"] for item in todo], os.getenv("CL_API_KEY"))
+    except Exception as e:
+        print(f"⚠️ Bulk citation lookup failed ({e}); resolving citations one at a time")
+        clusters = {}
+
+    remaining = [total]
+    names_lock = threading.Lock()
+    # Bounds how many fetched opinions wait in memory for a free LLM worker
+    ahead = threading.BoundedSemaphore(fetch_workers + 2 * llm_workers)
+
+    fetch_pool = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="fetch")
+    llm_pool = ThreadPoolExecutor(max_workers=llm_workers, thread_name_prefix="generate")
+    # PDFs render in warm worker processes; JSON/TXT are cheap enough to write in-thread
+    render_service = pipeline.RenderService(render_workers if fmt in ("pdf", "zip") else 0)
+
+    def finish(
+        item: dict,
+        ctx: pipeline.CaseContext,
+        status: str,
+        output: Optional[str] = None,
+        error: Optional[str] = None,
+        outcome: Optional[str] = None
+    ):
+        pipeline.record_brief_outcome(ctx, item["citation"], item["mode"], outcome or status, error)
+        try:
+            manifest.record({
+                "citation": item["citation"],
+                "mode": item["mode"],
+                "format": fmt,
+                "status": status,
+                "output": output,
+                "error": error,
+                "case_name": ctx.metadata.get("case_name"),
+                "cache_hit": ctx.cache_hit,
+                "compaction": ctx.compaction,
+                "timings": ctx.timings,
+            })
+        except OSError as e:
+            print(f"⚠️ Could not update batch manifest: {e}")
+        with stats_lock:
+            stats[status] += 1
+            remaining[0] -= 1
+            n = total - remaining[0]
+            if status == "done":
+                print(f"✅ [{n}/{total}] {item['citation']} → {output}")
+            else:
+                print(f"❌ [{n}/{total}] {item['citation']}: {error}")
+            if remaining[0] == 0:
+                all_done.set()
+
+    def fetch_stage(item: dict):
+        ctx = pipeline.CaseContext()
+        try:
+            cache_key = None
+            extraction_key = None
+            if use_cache:
+                cache_key = pipeline.brief_cache_key(item["citation"], item["mode"], temperature, max_tokens, stop)
+                if pipeline.load_cached_brief(ctx, cache_key):
+                    ahead.release()
+                    render_stage(item, ctx)
+                    return
+                if pipeline.two_stage_enabled():
+                    extraction_key = pipeline.extraction_cache_key(item["citation"], temperature, stop)
+                    if pipeline.load_cached_extraction(ctx, extraction_key):
+                        llm_pool.submit(generate_stage, item, ctx, cache_key, extraction_key)
+                        return
+            with ctx.timed("fetch"):
+                full_text = pipeline.handle_input(item["citation"], ctx=ctx, cluster=clusters.get(item["citation"]))
+            with ctx.timed("preprocess"):
+                ctx.cleaned_text = pipeline.preprocess(full_text)
+        except Exception as e:
+            ahead.release()
+            finish(item, ctx, "failed", error=str(e))
+            return
+        llm_pool.submit(generate_stage, item, ctx, cache_key, extraction_key)
+
+    def generate_stage(item: dict, ctx: pipeline.CaseContext, cache_key: Optional[str], extraction_key: Optional[str]):
+        try:
+            pipeline.finish_brief(ctx, item["mode"], temperature, max_tokens, stop, cache_key, extraction_key)
+            ctx.cleaned_text = ""
+        except Exception as e:
+            finish(item, ctx, "failed", error=str(e))
+            return
+        finally:
+            ahead.release()
+        if pipeline.brief_has_errors(ctx.brief):
+            finish(item, ctx, "failed", error="Brief generation failed due to hallucination", outcome="hallucination")
+            return
+        render_stage(item, ctx)
+
+    def render_failed(item: dict, ctx: pipeline.CaseContext, out: Optional[str], error: BaseException):
+        if out and os.path.exists(out):
+            os.remove(out)
+        finish(item, ctx, "failed", error=str(error))
+
+    def render_stage(item: dict, ctx: pipeline.CaseContext):
+        out = None
+        try:
+            with names_lock:
+                out = pipeline.make_unique_path(os.path.join(output_dir, f"{pipeline.case_file_stem(ctx.brief)}.{fmt}"))
+                open(out, "a").close()  # reserve the name until the render lands
+            started = time.perf_counter()
+            future = render_service.submit(ctx.brief, fmt, out)
+        except Exception as e:
+            render_failed(item, ctx, out, e)
+            return
+
+        def rendered(f):
+            ctx.timings["export"] = time.perf_counter() - started
+            error = f.exception()
+            if error is None:
+                finish(item, ctx, "done", output=out)
+            else:
+                render_failed(item, ctx, out, error)
+        future.add_done_callback(rendered)
+
+    try:
+        for item in todo:
+            ahead.acquire()
+            fetch_pool.submit(fetch_stage, item)
+        all_done.wait()
+    finally:
+        fetch_pool.shutdown(wait=True)
+        llm_pool.shutdown(wait=True)
+        render_service.shutdown(wait=True)
+    return stats
@@ -0,0 +1,395 @@
+# --- benchmark.py (Hermetic pipeline/server benchmarks against local stand-ins) ---
+#
+#   python benchmark.py                                  # every scenario, summary to stdout
+#   python benchmark.py --scenarios single,render --out bench.json
+#   python benchmark.py --scenarios imports,cli            # startup cost: import time, cold CLI vs daemon
+#   python benchmark.py --baseline bench.json            # exit 1 if p50/p95 or throughput regress
+
+from contextlib import contextmanager, redirect_stdout
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import subprocess
+import itertools
+import threading
+import platform
+import argparse
+import tempfile
+import socket
+import json
+import time
+import sys
+import os
+
+import fake_services
+import daemon
+
+SCENARIOS = ["imports", "cli", "preprocess", "single", "render", "batch", "concurrency"]
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+# Only imported on the code paths that need them; `import pipeline` must not load any of these
+LAZY_MODULES = ("reportlab", "PIL", "tzlocal", "dotenv")
+_citation_numbers = itertools.count(1)
+
+
+# ----------- Helpers -----------
+def summarize(values: list) -> dict:
+    # Nearest-rank percentiles, in the unit of the inputs (seconds unless noted)
+    if not values:
+        return {"n": 0}
+    ordered = sorted(values)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))]
+
+    return {
+        "n": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": pct(50),
+        "p95": pct(95),
+        "p99": pct(99),
+        "max": ordered[-1],
+    }
+
+
+def stage_breakdown(timings: list) -> dict:
+    stages = sorted({stage for t in timings for stage in t})
+    return {stage: summarize([t[stage] for t in timings if stage in t]) for stage in stages}
+
+
+def unique_citation(size: str) -> str:
+    # A fresh citation per run so neither the opinion store nor the brief cache can short-circuit it
+    return fake_services.size_citation(size, next(_citation_numbers))
+
+
+@contextmanager
+def quiet(enabled: bool):
+    if not enabled:
+        yield
+        return
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        yield
+
+
+def timed_call(fn, *args, **kwargs) -> tuple:
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ----------- Scenarios -----------
+def bench_imports(pipeline, args) -> dict:
+    # `import pipeline` in a fresh interpreter, and how many LAZY_MODULES it loaded anyway
+    code = (
+        "import sys, time; start = time.perf_counter(); import pipeline; "
+        "print(time.perf_counter() - start); "
+        f"print(sum(m in sys.modules for m in {LAZY_MODULES!r}))"
+    )
+    imports, processes, eager = [], [], 0
+    for _ in range(args.runs):
+        seconds, proc = timed_call(
+            subprocess.run, [sys.executable, "-c", code],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        )
+        lines = proc.stdout.split()
+        imports.append(float(lines[-2]))
+        processes.append(seconds)
+        eager = max(eager, int(lines[-1]))
+    return {"import": summarize(imports), "process": summarize(processes), "eager_modules": eager}
+
+
+def bench_cli(pipeline, args) -> dict:
+    # One `python pipeline.py --case ...` per brief, as a shell loop runs it: a cold process every
+    # time, then a thin client of a warm daemon
+    env = dict(os.environ, LEX_DAEMON_SOCKET=os.path.join(args.workdir, "daemon.sock"))
+
+    def invoke(**extra_env) -> float:
+        cmd = [
+            sys.executable, os.path.join(BACKEND_DIR, "pipeline.py"),
+            "--case", unique_citation("small"), "--mode", args.mode,
+            "--format", "json", "--output", "cli.json"
+        ]
+        seconds, _ = timed_call(
+            subprocess.run, cmd,
+            env=dict(env, **extra_env), cwd=args.workdir, capture_output=True, check=True
+        )
+        return seconds
+
+    cold = [invoke(LEX_DAEMON="0") for _ in range(args.runs)]
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, "daemon.py")],
+        env=env, cwd=args.workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.monotonic() + 60
+        while daemon.request("status", env["LEX_DAEMON_SOCKET"]) is None:
+            if server.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("The daemon did not start")
+            time.sleep(0.05)
+        warm = [invoke() for _ in range(args.runs)]
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    return {"cold": summarize(cold), "daemon": summarize(warm)}
+
+
+def bench_preprocess(pipeline, args) -> dict:
+    # CPU-only stages on canned opinions: preprocess, compaction and chunking
+    results = {}
+    for size, pages in fake_services.OPINION_SIZES.items():
+        text = fake_services.make_opinion_text(pages)
+        timings = []
+        for _ in range(args.runs):
+            ctx = pipeline.CaseContext()
+            with ctx.timed("preprocess"):
+                ctx.cleaned_text = pipeline.preprocess(text)
+            with ctx.timed("compact"):
+                pipeline.compact_case_text(ctx, "student")
+            with ctx.timed("chunk"):
+                pipeline.chunk_opinion(ctx.cleaned_text, int(os.getenv("LEX_CHUNK_CHARS", "16000")))
+            timings.append(ctx.timings)
+        results[size] = {
+            "chars": len(text),
+            "stages": stage_breakdown(timings),
+            "tokens_saved": ctx.compaction.get("tokens_saved"),
+        }
+    return results
+
+
+def bench_single(pipeline, args) -> dict:
+    # End-to-end latency of one brief (fetch -> generate) per opinion size, with per-stage breakdowns
+    results = {}
+    for size in fake_services.OPINION_SIZES:
+        latencies, timings = [], []
+        for _ in range(args.runs):
+            ctx = pipeline.CaseContext()
+            seconds, _ = timed_call(pipeline.generate_brief, unique_citation(size), mode=args.mode, ctx=ctx, use_cache=False)
+            latencies.append(seconds)
+            timings.append(ctx.timings)
+        results[size] = {"latency": summarize(latencies), "stages": stage_breakdown(timings)}
+    return results
+
+
+def bench_render(pipeline, args) -> dict:
+    # Export cost per format for one generated brief
+    brief = pipeline.generate_brief(unique_citation("small"), mode=args.mode, use_cache=False)
+    results = {}
+    for fmt in ("pdf", "json", "txt"):
+        pipeline.render_brief(brief, fmt)  # warm caches, as a long-running process would be
+        samples, size = [], 0
+        for _ in range(args.runs):
+            seconds, data = timed_call(pipeline.render_brief, brief, fmt)
+            samples.append(seconds)
+            size = len(data)
+        results[fmt] = {"latency": summarize(samples), "bytes": size}
+    return results
+
+
+def bench_batch(pipeline, args) -> dict:
+    from batch import run_batch
+
+    items = [{"citation": unique_citation("medium")} for _ in range(args.batch_size)]
+    output_dir = tempfile.mkdtemp(prefix="batch-", dir=args.workdir)
+    seconds, stats = timed_call(
+        run_batch, items, output_dir,
+        fmt="pdf", mode=args.mode, llm_workers=args.llm_workers, resume=False, use_cache=False
+    )
+    with open(os.path.join(output_dir, "manifest.jsonl"), encoding="utf-8") as f:
+        timings = [json.loads(line)["timings"] for line in f if line.strip()]
+    return {
+        "items": len(items),
+        "done": stats["done"],
+        "failed": stats["failed"],
+        "seconds": seconds,
+        "items_per_second": stats["done"] / seconds if seconds else 0.0,
+        "stages": stage_breakdown(timings),
+    }
+
+
+def bench_concurrency(pipeline, args) -> dict:
+    # Drives server.py over real HTTP at increasing client concurrency
+    import requests
+    import uvicorn
+    import server
+
+    port = free_port()
+    uv = uvicorn.Server(uvicorn.Config(server.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=uv.run, daemon=True)
+    thread.start()
+    while not uv.started:
+        time.sleep(0.01)
+    url = f"http://127.0.0.1:{port}/api/brief/by-citation"
+
+    def request(_):
+        start = time.perf_counter()
+        response = requests.post(url, data={"citation": unique_citation("small"), "mode": args.mode}, timeout=600)
+        return time.perf_counter() - start, response.status_code
+
+    results = {}
+    try:
+        for level in args.concurrency:
+            total = level * args.requests_per_level
+            start = time.perf_counter()
+            with ThreadPoolExecutor(level) as pool:
+                outcomes = list(pool.map(request, range(total)))
+            wall = time.perf_counter() - start
+            ok = [seconds for seconds, status in outcomes if status == 200]
+            results[str(level)] = {
+                "requests": total,
+                "errors": total - len(ok),
+                "latency": summarize(ok),
+                "requests_per_second": len(ok) / wall if wall else 0.0,
+            }
+    finally:
+        uv.should_exit = True
+        thread.join(timeout=10)
+    return results
+
+
+# ----------- Regression Check -----------
+def _flatten(data, prefix: str = "") -> dict:
+    flat = {}
+    if isinstance(data, dict):
+        for k, v in data.items():
+            flat.update(_flatten(v, f"{prefix}.{k}" if prefix else k))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        flat[prefix] = data
+    return flat
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    # Latency percentiles may not grow, and throughputs may not shrink, by more than `tolerance`;
+    # no module that `import pipeline` used to leave unloaded may be loaded by it
+    current = _flatten(results["scenarios"])
+    regressions = []
+    for key, old in _flatten(baseline["scenarios"]).items():
+        new = current.get(key)
+        if new is None:
+            continue
+        if key.endswith("eager_modules") and new > old:
+            regressions.append(f"{key}: {old:.0f} -> {new:.0f} of {', '.join(LAZY_MODULES)} loaded by `import pipeline`")
+        elif not old:
+            continue
+        elif key.endswith((".p50", ".p95")) and new > old * (1 + tolerance):
+            regressions.append(f"{key}: {old:.4f} -> {new:.4f}")
+        elif key.endswith("_per_second") and new < old * (1 - tolerance):
+            regressions.append(f"{key}: {old:.2f} -> {new:.2f}")
+    return regressions
+
+
+def print_summary(results: dict):
+    for key, value in _flatten(results["scenarios"]).items():
+        stage = ".stages." in key
+        if key.endswith((".p50", "eager_modules", "_per_second")) or (not stage and key.endswith((".p95", ".p99"))):
+            print(f"{key:60s} {value:10.4f}")
+
+
+# ----------- CLI -----------
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the brief pipeline against local CourtListener/Ollama stand-ins")
+    parser.add_argument("--scenarios", type=str, default=",".join(SCENARIOS), help=f"Comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--runs", type=int, default=5, help="Repetitions per measurement")
+    parser.add_argument("--mode", type=str, default="student")
+    parser.add_argument("--tokens-per-second", type=float, default=400.0, help="Fake Ollama generation speed")
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=8000.0, help="Fake Ollama prompt evaluation speed")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake Ollama fixed per-request latency (seconds)")
+    parser.add_argument("--cl-latency", type=float, default=0.02, help="Fake CourtListener per-request latency (seconds)")
+    parser.add_argument("--llm-workers", type=int, default=2, help="LEX_LLM_WORKERS and the fake Ollama's parallel slots")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--concurrency", type=str, default="1,2,4,8", help="Client concurrency levels for the server sweep")
+    parser.add_argument("--requests-per-level", type=int, default=4, help="Requests per client at each concurrency level")
+    parser.add_argument("--out", type=str, help="Write results as JSON to this file")
+    parser.add_argument("--baseline", type=str, help="Earlier --out file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression against --baseline")
+    parser.add_argument("--verbose", action="store_true", help="Show pipeline output")
+    args = parser.parse_args()
+    args.concurrency = [int(c) for c in args.concurrency.split(",") if c]
+    args.out = os.path.abspath(args.out) if args.out else None
+    args.baseline = os.path.abspath(args.baseline) if args.baseline else None
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    courtlistener = fake_services.start_fake_courtlistener(latency=args.cl_latency)
+    ollama = fake_services.start_fake_ollama(
+        tokens_per_second=args.tokens_per_second,
+        prompt_tokens_per_second=args.prompt_tokens_per_second,
+        latency=args.llm_latency,
+        parallel=args.llm_workers
+    )
+    args.workdir = tempfile.mkdtemp(prefix="lex-bench-")
+
+    # Everything points at the stand-ins and a scratch directory; caches are off so every run does the work
+    os.environ.update({
+        "CL_BASE_URL": courtlistener.url,
+        "CL_API_KEY": "benchmark",
+        "OLLAMA_HOST": ollama.url,
+        "LEX_OLLAMA_URLS": ollama.url,
+        "LEX_LLM_WORKERS": str(args.llm_workers),
+        "LEX_CACHE": "0",
+        "LEX_OPINION_STORE": "0",
+        "LEX_OLLAMA_PRELOAD": "0",
+    })
+    os.chdir(args.workdir)
+    import pipeline
+
+    results = {
+        "meta": {
+            "timestamp": time.time(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline", "verbose", "workdir")},
+        },
+        "scenarios": {},
+    }
+    runners = {
+        "imports": bench_imports,
+        "cli": bench_cli,
+        "preprocess": bench_preprocess,
+        "single": bench_single,
+        "render": bench_render,
+        "batch": bench_batch,
+        "concurrency": bench_concurrency,
+    }
+    try:
+        for name in scenarios:
+            print(f"⏱️ {name}...", file=sys.stderr)
+            with quiet(not args.verbose):
+                results["scenarios"][name] = runners[name](pipeline, args)
+        results["meta"]["llm"] = pipeline.get_llm_client().stats()
+    finally:
+        courtlistener.close()
+        ollama.close()
+
+    print_summary(results)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"❌ Regression: {line}")
+        raise SystemExit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
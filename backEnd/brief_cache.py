@@ -0,0 +1,169 @@
+# --- brief_cache.py (Content-addressed brief cache) ---
+
+from collections import OrderedDict
+from typing import Optional, List
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+def make_cache_key(
+    citation: str,
+    mode: str,
+    temperature: float,
+    max_tokens: int,
+    stop: Optional[List[str]],
+    model: str,
+    prompt_version: str
+) -> str:
+    # Everything that changes the generated text goes into the key
+    material = json.dumps({
+        "citation": " ".join(citation.split()).upper(),
+        "mode": mode,
+        "temperature": float(temperature),
+        "max_tokens": int(max_tokens),
+        "stop": list(stop) if stop else None,
+        "model": model,
+        "prompt_version": prompt_version,
+    }, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class BriefCache:
+    """Two-tier cache: a bounded in-memory LRU in front of a size- and TTL-limited directory of JSON files."""
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_items: int = 256,
+        max_bytes: int = 512 * 1024 * 1024,
+        ttl_seconds: float = 30 * 24 * 3600
+    ):
+        self.directory = directory
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._disk_bytes = sum(size for _, _, size in self._disk_entries())
+
+    # ----------- Memory tier -----------
+    def _memory_get(self, key: str) -> Optional[dict]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.time() - stored_at > self.ttl_seconds:
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _memory_put(self, key: str, value: dict, stored_at: float):
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    # ----------- Disk tier -----------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _disk_entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, st.st_mtime, st.st_size
+
+    def _disk_remove(self, path: str, size: int):
+        try:
+            os.remove(path)
+            self._disk_bytes -= size
+        except FileNotFoundError:
+            pass
+
+    def _disk_get(self, key: str) -> Optional[tuple]:
+        path = self._path(key)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if time.time() - st.st_mtime > self.ttl_seconds:
+            self._disk_remove(path, st.st_size)
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            self._disk_remove(path, st.st_size)
+            return None
+        # Touch so size-based eviction drops the least recently used entries first
+        os.utime(path, (time.time(), st.st_mtime))
+        return st.st_mtime, value
+
+    def _disk_put(self, key: str, value: dict):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(value).encode("utf-8")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        try:
+            self._disk_bytes -= os.path.getsize(path)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, path)
+        self._disk_bytes += len(data)
+        if self._disk_bytes > self.max_bytes:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        now = time.time()
+        entries = []
+        for path, mtime, size in self._disk_entries():
+            if now - mtime > self.ttl_seconds:
+                self._disk_remove(path, size)
+            else:
+                entries.append((os.stat(path).st_atime, path, size))
+        entries.sort()
+        for _, path, size in entries:
+            if self._disk_bytes <= self.max_bytes:
+                break
+            self._disk_remove(path, size)
+
+    # ----------- Public API -----------
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            value = self._memory_get(key)
+            if value is not None or not self.directory:
+                return value
+            hit = self._disk_get(key)
+            if hit is None:
+                return None
+            stored_at, value = hit
+            self._memory_put(key, value, stored_at)
+            return value
+
+    def put(self, key: str, value: dict):
+        with self._lock:
+            self._memory_put(key, value, time.time())
+            if self.directory:
+                self._disk_put(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self.directory:
+                for path, _, size in list(self._disk_entries()):
+                    self._disk_remove(path, size)
@@ -0,0 +1,158 @@
+# --- brief_index.py (Full-text search over generated briefs) ---
+
+from typing import List, Optional
+import threading
+import sqlite3
+import time
+import os
+import re
+
+from opinion_store import normalize_citation
+
+# FTS5 column -> the brief fields it holds
+SEARCH_COLUMNS = {
+    "parties": ["Case Name"],
+    "citation": ["Citation"],
+    "justices": ["Judges"],
+    "facts": ["Facts"],
+    "issue": ["Issue"],
+    "rule": ["Rule of Law"],
+    "holding": ["Holding & Reasoning"],
+    "disposition": ["Disposition"],
+    "dissent": ["Dissent"],
+}
+# bm25 weights, in SEARCH_COLUMNS order: a match on the parties or the justices counts for more than one in the text
+COLUMN_WEIGHTS = (10.0, 5.0, 5.0, 1.0, 2.0, 2.0, 1.5, 1.0, 1.0)
+DOCTRINE_COLUMNS = ("issue", "rule", "holding")
+
+TERM_RE = re.compile(r"[\w'’]+\*?")
+
+
+def match_terms(text: str) -> Optional[str]:
+    # Free text -> an FTS5 expression matching every word (a trailing * keeps prefix search);
+    # quoting each word keeps FTS5 operators and punctuation in user input from being parsed
+    terms = []
+    for term in TERM_RE.findall(text or ""):
+        prefix = term.endswith("*")
+        word = term.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"*' if prefix else f'"{word}"')
+    return " AND ".join(terms) or None
+
+
+class BriefIndex:
+    """SQLite FTS5 index of finished briefs, one entry per (citation, mode).
+
+    Parties (the case name), justices (the judges line plus each opinion's author and joiners) and
+    the substantive sections are separate columns, so a search can be narrowed to any of them;
+    results are ranked by bm25.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS briefs (
+                id         INTEGER PRIMARY KEY,
+                citation   TEXT NOT NULL,
+                mode       TEXT NOT NULL,
+                case_name  TEXT,
+                date_filed TEXT,
+                indexed_at REAL NOT NULL,
+                UNIQUE (citation, mode)
+            )
+        """)
+        # Raises sqlite3.OperationalError when SQLite was built without FTS5
+        self._conn.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS brief_search USING fts5({', '.join(SEARCH_COLUMNS)}, tokenize='porter unicode61')"
+        )
+        self._conn.commit()
+
+    def add(self, brief: dict, mode: str, metadata: Optional[dict] = None):
+        # Replaces any earlier entry for the same citation and mode
+        citation = normalize_citation(brief["Citation"])
+        values = {column: "\n".join(str(brief.get(f) or "") for f in fields) for column, fields in SEARCH_COLUMNS.items()}
+        for opinion in (metadata or {}).get("opinions", []):
+            values["justices"] += f"\n{opinion.get('author') or ''} {opinion.get('joined_by') or ''}"
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO briefs (citation, mode, case_name, date_filed, indexed_at) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (citation, mode) DO UPDATE SET "
+                    "case_name = excluded.case_name, date_filed = excluded.date_filed, indexed_at = excluded.indexed_at",
+                    (citation, mode, brief.get("Case Name"), brief.get("Date Filed"), time.time())
+                )
+                rowid = self._conn.execute(
+                    "SELECT id FROM briefs WHERE citation = ? AND mode = ?", (citation, mode)
+                ).fetchone()[0]
+                self._conn.execute("DELETE FROM brief_search WHERE rowid = ?", (rowid,))
+                self._conn.execute(
+                    f"INSERT INTO brief_search (rowid, {', '.join(SEARCH_COLUMNS)}) VALUES (?{', ?' * len(SEARCH_COLUMNS)})",
+                    (rowid, *values.values())
+                )
+
+    def has(self, citation: str, mode: str) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM briefs WHERE citation = ? AND mode = ?", (normalize_citation(citation), mode)
+            ).fetchone() is not None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM briefs").fetchone()[0]
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        party: Optional[str] = None,
+        justice: Optional[str] = None,
+        doctrine: Optional[str] = None,
+        mode: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> List[dict]:
+        """Briefs matching every given criterion, best first. `query` searches all columns, `party` the
+        case name, `justice` the judges and opinion authors, `doctrine` the issue, rule and holding."""
+        clauses = []
+        for columns, text in ((None, query), (("parties",), party), (("justices",), justice), (DOCTRINE_COLUMNS, doctrine)):
+            terms = match_terms(text)
+            if terms is None:
+                continue
+            clauses.append(f"({terms})" if columns is None else f"{{{' '.join(columns)}}} : ({terms})")
+        if not clauses:
+            raise ValueError("Give at least one search term")
+
+        sql = (
+            "SELECT b.citation, b.mode, b.case_name, b.date_filed, "
+            "snippet(brief_search, -1, '[', ']', '…', 16), "
+            f"bm25(brief_search, {', '.join(map(str, COLUMN_WEIGHTS))}) AS score "
+            "FROM brief_search JOIN briefs b ON b.id = brief_search.rowid "
+            "WHERE brief_search MATCH ?"
+        )
+        params = [" AND ".join(clauses)]
+        if mode:
+            sql += " AND b.mode = ?"
+            params.append(mode)
+        sql += " ORDER BY score LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            {
+                "citation": citation,
+                "mode": row_mode,
+                "case_name": case_name,
+                "date_filed": date_filed,
+                "snippet": snippet,
+                "score": -score,
+            }
+            for citation, row_mode, case_name, date_filed, snippet, score in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
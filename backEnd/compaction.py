@@ -0,0 +1,251 @@
+# --- compaction.py (Token-budgeted opinion compaction) ---
+
+from dataclasses import dataclass, field
+from typing import Optional, List
+import re
+
+PAGE_MARKER_RE = re.compile(r"\[Page \d+\]")
+SENTENCE_END_RE = re.compile(r"[.!?][\"')]*\s+(?=[\[A-Z\"'(])")
+# Periods that end legal abbreviations ("v.", "U. S.", "Co.", "J.") rather than sentences
+ABBREVIATION_RE = re.compile(
+    r"(?:\b(?:v|vs|No|Nos|Co|Corp|Inc|Ltd|Mr|Mrs|Ms|Dr|Jr|Sr|St|Id|Ibid|Ct|Ed|Supp|Stat|Cong|Sess|App|Cir|"
+    r"Dist|Cf|Art|Amdt|Const|Rev|Gen|Ann|Ass'n|Dept|Gov|Comm|Cl|ch|pp|p|n|nn|etc|e\.g|i\.e)|\b[A-Z])\.$"
+)
+
+# Reporter boilerplate that repeats on every page of slip opinions and CourtListener plain text
+BOILERPLATE_RES = [
+    re.compile(r"NOTE: Where it is feasible, a syllabus \(headnote\) will be released.{0,600}?200 U\. ?S\. 321, 337\.", re.S),
+    re.compile(r"\(Slip Opinion\)"),
+    re.compile(r"Cite as: \d+ U\. ?S\. [_\d]+ \(\d{4}\)"),
+    re.compile(r"SUPREME COURT OF THE UNITED STATES"),
+    re.compile(r"U\.S\. Supreme Court"),
+    re.compile(r"OCTOBER TERM, \d{4}"),
+]
+
+OPINION_START_RE = re.compile(
+    r"(?:MR\.\s+)?(?:CHIEF\s+)?JUSTICE\s+[A-Z][A-Za-z'-]+\s+(?:delivered|announced)\s+the\s+(?:opinion|judgment)",
+    re.I
+)
+SYLLABUS_RE = re.compile(r"\bSyllabus\b")
+
+REPORTERS = (
+    r"U\.\s?S\.|S\.\s?Ct\.|L\.\s?Ed\.(?:\s?2d)?|F\.(?:\s?(?:2d|3d|4th))?|F\.\s?Supp\.(?:\s?(?:2d|3d))?"
+    r"|Wall\.|Wheat\.|Pet\.|How\.|Cranch|Dall\."
+)
+REPORTER_CITE_RE = re.compile(
+    rf",?\s*\b\d{{1,4}}\s+(?:{REPORTERS})\s+[_\d]{{1,5}}(?:,\s*\d{{1,5}}(?:[-–]\d{{1,5}})?)*(?:\s*\(\d{{4}}\))?"
+)
+# preprocess() turns "Id.," into "Id,"
+ID_CITE_RE = re.compile(r"\b(?:Id|Ibid)\.?,?(?:\s+at\s+\d+(?:[-–]\d+)?)?\.?(?=\s|$)")
+FOOTNOTE_RE = re.compile(r"\[(?:Footnote\s+)?(\d{1,3})\]")
+
+
+@dataclass
+class CompactionReport:
+    budget: int
+    tokens_before: int = 0
+    tokens_after: int = 0
+    steps: List[str] = field(default_factory=list)
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+    def to_dict(self) -> dict:
+        return {
+            "budget": self.budget,
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "tokens_saved": self.tokens_saved,
+            "steps": self.steps,
+        }
+
+
+# ----------- Token Counting -----------
+class TokenCounter:
+    """Counts tokens with the model's own tokenizer when a tokenizer.json is available, else estimates.
+
+    The exact path needs the optional `tokenizers` package and the model's tokenizer.json (for Mixtral,
+    from the mistralai/Mixtral-8x7B-Instruct-v0.1 repository). The estimate uses a chars-per-token ratio;
+    3.5 is close to Mixtral's SentencePiece vocabulary on opinion text.
+    """
+
+    def __init__(self, tokenizer_file: Optional[str] = None, chars_per_token: float = 3.5):
+        self.chars_per_token = chars_per_token
+        self._tokenizer = None
+        if tokenizer_file:
+            try:
+                from tokenizers import Tokenizer
+                self._tokenizer = Tokenizer.from_file(tokenizer_file)
+            except ImportError:
+                print("⚠️ LEX_TOKENIZER_FILE is set but the 'tokenizers' package is not installed; estimating token counts")
+            except Exception as e:
+                print(f"⚠️ Could not load tokenizer '{tokenizer_file}': {e}; estimating token counts")
+
+    @property
+    def exact(self) -> bool:
+        return self._tokenizer is not None
+
+    def count(self, text: str) -> int:
+        if self._tokenizer is not None:
+            return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+        return int(len(text) / self.chars_per_token + 0.5)
+
+
+# ----------- Helpers -----------
+def _remove_spans(text: str, spans: list) -> str:
+    # Drops each (start, end) span but keeps any [Page N] markers inside it, so page citations stay anchored
+    if not spans:
+        return text
+    spans = sorted(spans)
+    parts = []
+    pos = 0
+    for start, end in spans:
+        if start < pos:
+            start = pos
+        if end <= start:
+            continue
+        parts.append(text[pos:start])
+        markers = PAGE_MARKER_RE.findall(text, start, end)
+        parts.append(" " + " ".join(markers) + " " if markers else " ")
+        pos = end
+    parts.append(text[pos:])
+    return re.sub(r"\s+", " ", "".join(parts)).strip()
+
+
+def _sentences(text: str, start: int = 0, end: Optional[int] = None) -> list:
+    # (start, end) spans of the sentences in text[start:end]
+    end = len(text) if end is None else end
+    spans = []
+    pos = start
+    for m in SENTENCE_END_RE.finditer(text, start, end):
+        if ABBREVIATION_RE.search(text, max(pos, m.start() - 12), m.start() + 1):
+            continue
+        spans.append((pos, m.end()))
+        pos = m.end()
+    if pos < end:
+        spans.append((pos, end))
+    return spans
+
+
+def _shingles(words: list, n: int = 5) -> set:
+    return {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def _words(text: str) -> list:
+    return re.findall(r"[a-z0-9']+", PAGE_MARKER_RE.sub(" ", text).lower())
+
+
+# ----------- Compaction Steps -----------
+def strip_boilerplate(text: str) -> str:
+    # Keeps the first occurrence of each reporter header, drops the repeats and the standard syllabus note
+    spans = []
+    for pattern in BOILERPLATE_RES:
+        matches = list(pattern.finditer(text))
+        keep_first = pattern is not BOILERPLATE_RES[0]
+        spans.extend(m.span() for m in matches[1 if keep_first else 0:])
+    text = _remove_spans(text, spans)
+
+    # Sentences repeated three or more times verbatim are running heads, not content
+    seen = {}
+    spans = []
+    for start, end in _sentences(text):
+        key = PAGE_MARKER_RE.sub("", text[start:end]).strip()
+        if len(key.split()) >= 6:
+            seen.setdefault(key, []).append((start, end))
+    for occurrences in seen.values():
+        if len(occurrences) >= 3:
+            spans.extend(occurrences[1:])
+    return _remove_spans(text, spans)
+
+
+def dedupe_syllabus(text: str, threshold: float = 0.5) -> str:
+    # Drops syllabus sentences whose wording the opinion body already contains
+    opinion = OPINION_START_RE.search(text)
+    syllabus = SYLLABUS_RE.search(text, 0, opinion.start()) if opinion else None
+    if syllabus is None:
+        return text
+    body_shingles = _shingles(_words(text[opinion.start():]))
+    spans = []
+    for start, end in _sentences(text, syllabus.end(), opinion.start()):
+        shingles = _shingles(_words(text[start:end]))
+        if len(shingles) >= 4 and len(shingles & body_shingles) / len(shingles) >= threshold:
+            spans.append((start, end))
+    return _remove_spans(text, spans)
+
+
+def strip_citations(text: str) -> str:
+    # Removes reporter volume/page strings and Id. cites; case names stay so the model can still refer to them
+    spans = [m.span() for m in REPORTER_CITE_RE.finditer(text)]
+    spans.extend(m.span() for m in ID_CITE_RE.finditer(text))
+    return _remove_spans(text, spans)
+
+
+def _footnote_bodies(text: str) -> list:
+    # A footnote marker's second occurrence starts its body, which runs to the next footnote marker
+    seen = set()
+    starts = []
+    for m in FOOTNOTE_RE.finditer(text):
+        number = m.group(1)
+        if number in seen:
+            starts.append(m)
+        seen.add(number)
+    bodies = []
+    for i, m in enumerate(starts):
+        end = starts[i + 1].start() if i + 1 < len(starts) else len(text)
+        nxt = FOOTNOTE_RE.search(text, m.end(), end)
+        bodies.append((m.start(), nxt.start() if nxt else end))
+    return bodies
+
+
+def compact_footnotes(text: str, how: str) -> str:
+    # "trim" keeps each footnote's first sentence, "strip" drops the bodies and the in-text markers
+    spans = []
+    for start, end in _footnote_bodies(text):
+        if how == "trim":
+            first = _sentences(text, start, end)[0]
+            spans.append((first[1], end))
+        else:
+            spans.append((start, end))
+    text = _remove_spans(text, spans)
+    if how == "strip":
+        text = _remove_spans(text, [m.span() for m in FOOTNOTE_RE.finditer(text)])
+    return text
+
+
+# ----------- Compaction -----------
+def compact_opinion(
+    text: str,
+    budget: int,
+    counter: TokenCounter,
+    footnotes: str = "auto",
+    citations: str = "auto"
+) -> tuple:
+    """Shrinks preprocessed opinion text towards a token budget; returns (text, CompactionReport).
+
+    Boilerplate and syllabus sentences repeated in the opinion are always removed. Citation strings and
+    footnotes are removed only while the text is over budget ("auto"), always ("strip"/"trim") or never
+    ("keep"). [Page N] markers are never removed.
+    """
+    report = CompactionReport(budget=budget, tokens_before=counter.count(text))
+
+    def step(name: str, new_text: str) -> str:
+        if new_text != text:
+            report.steps.append(name)
+        return new_text
+
+    text = step("boilerplate", strip_boilerplate(text))
+    text = step("syllabus", dedupe_syllabus(text))
+
+    if citations == "strip" or (citations == "auto" and counter.count(text) > budget):
+        text = step("citations", strip_citations(text))
+    if footnotes in ("trim", "strip"):
+        text = step(f"footnotes:{footnotes}", compact_footnotes(text, footnotes))
+    elif footnotes == "auto":
+        for how in ("trim", "strip"):
+            if counter.count(text) <= budget:
+                break
+            text = step(f"footnotes:{how}", compact_footnotes(text, how))
+
+    report.tokens_after = counter.count(text)
+    return text, report
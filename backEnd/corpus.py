@@ -0,0 +1,248 @@
+# --- corpus.py (CourtListener bulk-data ingestion into the opinion store) ---
+
+from typing import Iterable, Iterator, List, Optional
+import tempfile
+import sqlite3
+import html
+import glob
+import json
+import time
+import zlib
+import gzip
+import bz2
+import lzma
+import csv
+import sys
+import os
+import re
+
+from opinion_store import DEFAULT_BASE_URL, OpinionStore, normalize_citation, trim_opinion
+
+# Bulk exports are named "<kind>-<date>.csv.bz2"; the newest of each kind in a directory is used
+EXPORT_KINDS = {"clusters": "opinion-clusters-", "opinions": "opinions-", "citations": "citations-"}
+
+# Which parallel citation a cluster is stored under (the others become aliases of it)
+REPORTER_PREFERENCE = ["U.S.", "S. Ct.", "L. Ed. 2d", "L. Ed."]
+
+CLUSTER_FIELDS = ("case_name", "case_name_full", "date_filed", "judges", "procedural_history", "attorneys", "disposition", "syllabus")
+
+# Opinion text columns, best first; plain_text is empty for many opinions that only have HTML
+TEXT_FIELDS = ("plain_text", "html_with_citations", "html", "html_lawbox", "html_columbia", "xml_harvard")
+
+HTML_BREAK_RE = re.compile(r"<\s*(?:br|/p|/div|/h\d|/blockquote)\b[^>]*>", re.IGNORECASE)
+HTML_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def find_export_files(directory: str) -> dict:
+    # {"clusters": path, "opinions": path, "citations": path} from a bulk-data download directory
+    files = {}
+    for kind, prefix in EXPORT_KINDS.items():
+        matches = sorted(glob.glob(os.path.join(directory, f"{prefix}*.csv*")))
+        if not matches:
+            raise FileNotFoundError(f"No {prefix}*.csv[.bz2] file in '{directory}'")
+        files[kind] = matches[-1]
+    return files
+
+
+def _open_text(path: str):
+    opener = {".bz2": bz2.open, ".gz": gzip.open, ".xz": lzma.open}.get(os.path.splitext(path)[1].lower(), open)
+    return opener(path, "rt", encoding="utf-8", newline="")
+
+
+def iter_csv(path: str) -> Iterator[dict]:
+    # Row by row, decompressing as it goes; the exports are PostgreSQL CSV with backslash escapes
+    csv.field_size_limit(sys.maxsize)
+    with _open_text(path) as f:
+        yield from csv.DictReader(f, escapechar="\\")
+
+
+def html_to_text(markup: str) -> str:
+    text = HTML_TAG_RE.sub("", HTML_BREAK_RE.sub("\n", markup))
+    return re.sub(r"[ \t]+", " ", html.unescape(text)).strip()
+
+
+def _bool(value: Optional[str]) -> bool:
+    return (value or "").strip().lower() in ("t", "true", "1")
+
+
+def _int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def opinion_from_row(row: dict, base_url: str) -> dict:
+    # A bulk opinion row shaped like the REST API's opinion, trimmed to what the pipeline reads
+    text = row.get("plain_text") or ""
+    if not text.strip():
+        markup = next((row[k] for k in TEXT_FIELDS[1:] if (row.get(k) or "").strip()), "")
+        text = html_to_text(markup)
+    author_id = _int(row.get("author_id"))
+    return trim_opinion({
+        "id": _int(row.get("id")),
+        "type": row.get("type") or None,
+        "author": f"{base_url}/api/rest/v4/people/{author_id}/" if author_id else None,
+        "author_str": row.get("author_str") or "",
+        "joined_by_str": row.get("joined_by_str") or "",
+        "per_curiam": _bool(row.get("per_curiam")),
+        "ordering_key": _int(row.get("ordering_key")),
+        "plain_text": text,
+    })
+
+
+def cluster_from_row(row: dict) -> dict:
+    cluster = {k: row.get(k) or "" for k in CLUSTER_FIELDS}
+    cluster["id"] = _int(row.get("id"))
+    cluster["absolute_url"] = f"/opinion/{cluster['id']}/{row.get('slug') or ''}/"
+    return cluster
+
+
+def _citation_rank(citation: str) -> tuple:
+    # Citations are normalized (upper case) by now
+    preference = [r.upper() for r in REPORTER_PREFERENCE]
+    reporter = citation.split(" ", 1)[-1].rsplit(" ", 1)[0]
+    rank = preference.index(reporter) if reporter in preference else len(preference)
+    return rank, citation
+
+
+class _Staging:
+    # Scratch SQLite database: the three exports are sorted by their own ids, not by cluster,
+    # so rows are staged on disk and joined per cluster at the end
+    def __init__(self, directory: Optional[str]):
+        fd, self.path = tempfile.mkstemp(prefix="lex-ingest-", suffix=".sqlite3", dir=directory)
+        os.close(fd)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.executescript("""
+            CREATE TABLE citations (cluster_id INTEGER NOT NULL, citation TEXT NOT NULL, wanted INTEGER NOT NULL);
+            CREATE TABLE kept (cluster_id INTEGER PRIMARY KEY);
+            CREATE TABLE clusters (id INTEGER PRIMARY KEY, cluster BLOB NOT NULL);
+            CREATE TABLE opinions (cluster_id INTEGER NOT NULL, opinion BLOB NOT NULL);
+        """)
+
+    def is_kept(self, cluster_id: Optional[int]) -> bool:
+        return cluster_id is not None and self.conn.execute(
+            "SELECT 1 FROM kept WHERE cluster_id = ?", (cluster_id,)
+        ).fetchone() is not None
+
+    def close(self):
+        self.conn.close()
+        os.remove(self.path)
+
+
+def _insert_batches(conn: sqlite3.Connection, sql: str, rows: Iterable[tuple], label: str, batch_size: int = 5000) -> int:
+    count = 0
+    batch = []
+    started = time.perf_counter()
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            conn.executemany(sql, batch)
+            conn.commit()
+            count += len(batch)
+            batch.clear()
+            if count % (batch_size * 20) == 0:
+                print(f"   … {count:,} {label} ({time.perf_counter() - started:.0f}s)")
+    if batch:
+        conn.executemany(sql, batch)
+        conn.commit()
+        count += len(batch)
+    return count
+
+
+def ingest_bulk_export(
+    files: dict,
+    store: OpinionStore,
+    reporters: Optional[List[str]] = None,
+    citations: Optional[List[str]] = None,
+    base_url: str = DEFAULT_BASE_URL,
+    staging_dir: Optional[str] = None
+) -> dict:
+    """Loads a CourtListener bulk-data export (clusters, opinions and citations CSVs) into `store`.
+
+    The files are streamed row by row and only clusters with a citation in `reporters` (e.g. ["U.S."])
+    or in `citations` are kept; with neither, every cited cluster is. Each cluster is stored under its
+    preferred citation with the rest as aliases, so fetch_case_by_citation serves it without a request.
+    Returns counts of the rows read and the clusters stored.
+    """
+    reporters = set(reporters or [])
+    wanted_citations = {normalize_citation(c) for c in citations or []}
+    base_url = base_url.rstrip("/")
+    staging = _Staging(staging_dir)
+    stats = {}
+    try:
+        conn = staging.conn
+
+        print(f"📚 Reading citations from {files['citations']}")
+
+        def citation_rows():
+            for row in iter_csv(files["citations"]):
+                cluster_id = _int(row.get("cluster_id"))
+                if cluster_id is None:
+                    continue
+                citation = normalize_citation(f"{row.get('volume', '')} {row.get('reporter', '')} {row.get('page', '')}")
+                wanted = (
+                    (not reporters and not wanted_citations)
+                    or row.get("reporter") in reporters
+                    or citation in wanted_citations
+                )
+                yield cluster_id, citation, int(wanted)
+
+        stats["citations"] = _insert_batches(conn, "INSERT INTO citations VALUES (?, ?, ?)", citation_rows(), "citations")
+        conn.execute("INSERT OR IGNORE INTO kept SELECT cluster_id FROM citations WHERE wanted = 1")
+        conn.execute("CREATE INDEX citations_cluster ON citations (cluster_id)")
+        conn.commit()
+        kept = conn.execute("SELECT COUNT(*) FROM kept").fetchone()[0]
+        print(f"📚 {kept:,} cluster(s) selected from {stats['citations']:,} citation(s)")
+
+        print(f"📚 Reading clusters from {files['clusters']}")
+        stats["clusters"] = _insert_batches(
+            conn,
+            "INSERT OR REPLACE INTO clusters VALUES (?, ?)",
+            (
+                (cluster["id"], zlib.compress(json.dumps(cluster).encode("utf-8")))
+                for cluster in map(cluster_from_row, iter_csv(files["clusters"]))
+                if staging.is_kept(cluster["id"])
+            ),
+            "clusters"
+        )
+
+        print(f"📚 Reading opinions from {files['opinions']}")
+        stats["opinions"] = _insert_batches(
+            conn,
+            "INSERT INTO opinions VALUES (?, ?)",
+            (
+                (_int(row.get("cluster_id")), zlib.compress(json.dumps(opinion_from_row(row, base_url)).encode("utf-8")))
+                for row in iter_csv(files["opinions"])
+                if staging.is_kept(_int(row.get("cluster_id")))
+            ),
+            "opinions"
+        )
+        conn.execute("CREATE INDEX opinions_cluster ON opinions (cluster_id)")
+        conn.commit()
+
+        def store_rows():
+            for cluster_id, blob in conn.execute("SELECT id, cluster FROM clusters ORDER BY id"):
+                opinions = [
+                    json.loads(zlib.decompress(b))
+                    for b, in staging.conn.execute("SELECT opinion FROM opinions WHERE cluster_id = ?", (cluster_id,))
+                ]
+                cites = [c for c, in staging.conn.execute("SELECT citation FROM citations WHERE cluster_id = ?", (cluster_id,))]
+                if not opinions or not cites:
+                    continue
+                cluster = json.loads(zlib.decompress(blob))
+                entries = []
+                for opinion in opinions:
+                    url = f"{base_url}/api/rest/v4/opinions/{opinion['id']}/"
+                    entries.append({"url": url, "opinion": opinion, "etag": None, "last_modified": None})
+                cluster["sub_opinions"] = [e["url"] for e in entries]
+                cluster["citations"] = sorted(set(cites), key=_citation_rank)
+                yield cluster["citations"], cluster, entries
+
+        stats["stored"] = store.put_many(store_rows())
+        print(f"✅ Stored {stats['stored']:,} cluster(s) in {store.path}")
+    finally:
+        staging.close()
+    return stats
@@ -0,0 +1,330 @@
+# --- daemon.py (Warm local daemon that runs pipeline.py command lines over a Unix socket) ---
+#
+#   python daemon.py                  # serve until interrupted; `python pipeline.py ...` then runs here
+#   python daemon.py --status         # what a running daemon has done so far
+#   python daemon.py --stop
+#
+# The pipeline.py CLI imports this module before anything else, so the client side is standard library only.
+
+from typing import Callable, Iterable, Iterator, List, Optional
+import socketserver
+import contextvars
+import traceback
+import threading
+import argparse
+import tempfile
+import signal
+import socket
+import json
+import time
+import sys
+import os
+
+from envfile import load_env_file
+
+
+def socket_path() -> str:
+    # LEX_DAEMON_SOCKET, else a per-user socket in XDG_RUNTIME_DIR or the temp directory
+    path = os.getenv("LEX_DAEMON_SOCKET")
+    if path:
+        return path
+    directory = os.getenv("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(directory, f"lexemetica-clerk-{os.getuid()}.sock")
+
+
+# ----------- Wire Format -----------
+# One JSON object per line. The client sends {"argv": [...], "cwd": "...", "env": {...}} (or
+# {"op": "status"|"stop"}); the daemon answers with {"stream": "out"|"err", "data": "..."} lines as the
+# command prints and a final {"exit": status}, or with {"local": [...]} alone when the command has to
+# run in the client's own process.
+def _send(conn: socket.socket, message: dict):
+    conn.sendall(json.dumps(message).encode("utf-8") + b"\n")
+
+
+def _messages(conn: socket.socket) -> Iterator[dict]:
+    with conn.makefile("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _connect(path: str) -> Optional[socket.socket]:
+    # None when nothing is listening, including a socket file left behind by a killed daemon
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(path):
+        return None
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(path)
+    except OSError:
+        conn.close()
+        return None
+    return conn
+
+
+# ----------- Client -----------
+def run_remote(argv: List[str], path: Optional[str] = None) -> Optional[int]:
+    """Runs a pipeline.py command line in the daemon, streaming its output to this process's stdout
+    and stderr, and returns its exit status. Returns None when LEX_DAEMON=0, no daemon is listening,
+    or this process's environment differs from the daemon's in a setting the daemon has already
+    applied, so the caller runs the command itself."""
+    if os.getenv("LEX_DAEMON", "1") == "0":
+        return None
+    conn = _connect(path or socket_path())
+    if conn is None:
+        return None
+    with conn:
+        _send(conn, {"argv": argv, "cwd": os.getcwd(), "env": dict(os.environ)})
+        for message in _messages(conn):
+            if "local" in message:
+                print(f"ℹ️ The daemon was started with other {', '.join(message['local'])}; running here", file=sys.stderr)
+                return None
+            if "exit" in message:
+                return message["exit"]
+            stream = sys.stderr if message.get("stream") == "err" else sys.stdout
+            stream.write(message["data"])
+            stream.flush()
+    print("❌ The daemon closed the connection before the command finished", file=sys.stderr)
+    return 1
+
+
+def request(op: str, path: Optional[str] = None) -> Optional[dict]:
+    # {"op": "status"} or {"op": "stop"} -> the daemon's reply, or None when none is listening
+    conn = _connect(path or socket_path())
+    if conn is None:
+        return None
+    with conn:
+        _send(conn, {"op": op})
+        return next(_messages(conn), None)
+
+
+# ----------- Server -----------
+class _ClientStream:
+    # Write-only text stream that forwards to the client; once it disconnects, output is dropped
+    # and the command still runs to completion
+    encoding = "utf-8"
+
+    def __init__(self, conn: socket.socket, name: str, lock: threading.Lock):
+        self.conn = conn
+        self.name = name
+        self.lock = lock
+
+    def write(self, data: str) -> int:
+        if data:
+            try:
+                with self.lock:
+                    _send(self.conn, {"stream": self.name, "data": data})
+            except OSError:
+                pass
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def isatty(self) -> bool:
+        return False
+
+
+# The client streams of the command this thread is working for; executor threads that run tasks in a
+# copy of the command's context (pipeline.submit_in_context) inherit them, every other thread has none
+_client_streams = contextvars.ContextVar("lex_daemon_client_streams", default=None)
+
+
+class _RoutedStream:
+    # Installed as sys.stdout/sys.stderr while the daemon serves. Output from a command goes to its
+    # client; output from anything else (health probes, the preload thread) stays in the daemon's log
+    def __init__(self, fallback, name: str):
+        self.fallback = fallback
+        self.name = name
+
+    def _target(self):
+        streams = _client_streams.get()
+        return streams[self.name] if streams is not None else self.fallback
+
+    def write(self, data: str) -> int:
+        return self._target().write(data)
+
+    def flush(self):
+        self._target().flush()
+
+    def isatty(self) -> bool:
+        return self._target().isatty()
+
+    def __getattr__(self, name):
+        return getattr(self.fallback, name)
+
+
+def _replace_environ(env: dict):
+    # In place and key by key, so other threads never see an empty environment
+    for key in set(os.environ) - set(env):
+        del os.environ[key]
+    os.environ.update(env)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        message = next(_messages(self.connection), None)
+        if message is not None:
+            self.server.daemon.handle(self.connection, message)
+
+
+class PipelineDaemon:
+    """Runs command lines with `run(argv) -> exit status` in this process, one at a time.
+
+    Each command runs in the client's working directory and environment with its stdout and stderr
+    streamed back, so relative paths, per-invocation variables and the CLI's printed output behave as
+    they would in a fresh process. Everything the pipeline keeps per process stays warm between
+    commands. `warm_env` names the variables that warm state was built from; a client whose values
+    differ is told to run the command itself. The socket is only accessible to the user who started
+    the daemon.
+    """
+
+    def __init__(self, run: Callable[[List[str]], int], path: str, warm_env: Iterable[str] = ()):
+        self.run = run
+        self.path = path
+        self.warm_env = list(warm_env)
+        self.env = dict(os.environ)
+        self.started = time.time()
+        self._command_lock = threading.Lock()
+        self._running: Optional[List[str]] = None
+        self._stats = {"commands": 0, "failed": 0}
+        self._server = None
+
+    def status(self) -> dict:
+        return dict(
+            self._stats,
+            pid=os.getpid(),
+            socket=self.path,
+            uptime_seconds=round(time.time() - self.started, 1),
+            running=self._running
+        )
+
+    def handle(self, conn: socket.socket, message: dict):
+        op = message.get("op")
+        if op == "status":
+            _send(conn, self.status())
+        elif op == "stop":
+            _send(conn, dict(self.status(), stopping=True))
+            threading.Thread(target=self.shutdown, daemon=True).start()
+        else:
+            env = message.get("env")
+            differing = [key for key in self.warm_env if env is not None and env.get(key) != self.env.get(key)]
+            if differing:
+                _send(conn, {"local": differing})
+                return
+            self._run_command(conn, [str(arg) for arg in message.get("argv", [])], message.get("cwd") or os.getcwd(), env)
+
+    def _call(self, argv: List[str]) -> int:
+        try:
+            return self.run(argv) or 0
+        except SystemExit as e:
+            # argparse errors and --help exit, as do the CLI's own failure paths
+            if e.code is None or isinstance(e.code, int):
+                return e.code or 0
+            print(e.code, file=sys.stderr)
+            return 1
+        except Exception:
+            traceback.print_exc()
+            return 1
+
+    def _run_command(self, conn: socket.socket, argv: List[str], cwd: str, env: Optional[dict] = None):
+        write_lock = threading.Lock()
+        out = _ClientStream(conn, "out", write_lock)
+        err = _ClientStream(conn, "err", write_lock)
+        with self._command_lock:
+            self._running = argv
+            start = time.perf_counter()
+            previous = os.getcwd()
+            previous_env = dict(os.environ)
+            token = _client_streams.set({"out": out, "err": err})
+            try:
+                if env is not None:
+                    _replace_environ(env)
+                os.chdir(cwd)
+                code = self._call(argv)
+            except OSError as e:
+                code = 1
+                err.write(f"❌ Could not run in '{cwd}': {e}\n")
+            finally:
+                _client_streams.reset(token)
+                os.chdir(previous)
+                _replace_environ(previous_env)
+                self._running = None
+            self._stats["commands"] += 1
+            if code:
+                self._stats["failed"] += 1
+        print(f"🛰️ {' '.join(argv) or '(no arguments)'} -> {code} in {time.perf_counter() - start:.2f}s")
+        try:
+            _send(conn, {"exit": code})
+        except OSError:
+            pass
+
+    def serve_forever(self):
+        if _connect(self.path) is not None:
+            raise RuntimeError(f"A daemon is already listening on {self.path}")
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Owner-only socket: anyone who can connect can run pipeline commands as this user
+        umask = os.umask(0o177)
+        try:
+            self._server = socketserver.ThreadingUnixStreamServer(self.path, _Handler)
+        finally:
+            os.umask(umask)
+        self._server.daemon_threads = True
+        self._server.daemon = self
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = _RoutedStream(stdout, "out"), _RoutedStream(stderr, "err")
+        try:
+            self._server.serve_forever()
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+            self._server.server_close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+
+# ----------- CLI -----------
+def main():
+    parser = argparse.ArgumentParser(description="Keep the brief pipeline warm and run pipeline.py command lines sent to it")
+    parser.add_argument("--socket", type=str, default=None, help="Unix socket path (default: LEX_DAEMON_SOCKET, else a per-user socket in XDG_RUNTIME_DIR or the temp directory)")
+    parser.add_argument("--status", action="store_true", help="Print a running daemon's status")
+    parser.add_argument("--stop", action="store_true", help="Ask a running daemon to exit")
+    args = parser.parse_args()
+
+    load_env_file()
+    path = args.socket or socket_path()
+    if args.status or args.stop:
+        reply = request("stop" if args.stop else "status", path)
+        if reply is None:
+            raise SystemExit(f"❌ No daemon listening on {path}")
+        print(json.dumps(reply, indent=2))
+        return
+
+    if not hasattr(socket, "AF_UNIX"):
+        raise SystemExit("❌ The daemon needs Unix domain sockets")
+    import pipeline
+
+    start = time.perf_counter()
+    pipeline.warm_up()
+    print(f"🔥 Pipeline warmed in {time.perf_counter() - start:.2f}s")
+    if os.getenv("LEX_OLLAMA_PRELOAD", "1") != "0":
+        threading.Thread(target=pipeline.preload_model, name="ollama-preload", daemon=True).start()
+
+    daemon = PipelineDaemon(pipeline.run_cli, path, pipeline.WARM_ENV)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=daemon.shutdown, daemon=True).start())
+    print(f"🛰️ Listening on {path}")
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    except RuntimeError as e:
+        raise SystemExit(f"❌ {e}")
+    print("👋 Daemon stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+# --- envfile.py (.env loading without importing python-dotenv when there is no .env) ---
+
+from typing import Optional
+import os
+
+
+def find_env_file(start: Optional[str] = None) -> Optional[str]:
+    # The nearest .env in `start` (default: this directory) or a parent, as load_dotenv() finds it
+    directory = os.path.abspath(start or os.path.dirname(os.path.abspath(__file__)))
+    while True:
+        path = os.path.join(directory, ".env")
+        if os.path.isfile(path):
+            return path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+def load_env_file() -> Optional[str]:
+    # Variables already set in the environment win, as with load_dotenv()
+    path = find_env_file()
+    if path is not None:
+        from dotenv import load_dotenv
+        load_dotenv(path)
+    return path
@@ -0,0 +1,339 @@
+# --- fake_services.py (Local stand-ins for CourtListener and Ollama, used by benchmark.py) ---
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional
+import threading
+import random
+import sys
+import json
+import time
+import re
+
+SECTION_KEYS = ["Disposition", "Rule of Law", "Facts", "Issue", "Holding & Reasoning", "Dissent"]
+EXTRACTION_FIELDS = {
+    "parties", "majority_author", "procedural_history", "facts", "issues",
+    "rules", "holding", "reasoning", "disposition", "dissents"
+}
+
+# Canned opinion sizes; citations look like "<pages> U.S. <n>" and any such citation resolves
+OPINION_SIZES = {"small": 6, "medium": 30, "large": 120}
+
+
+def size_citation(size: str, n: int = 1) -> str:
+    return f"{OPINION_SIZES[size]} U.S. {n}"
+
+
+def make_opinion_text(pages: int, words_per_page: int = 450, seed: int = 0) -> str:
+    # Slip-opinion-like plain text: header boilerplate, syllabus, star-paged body with citations, footnotes
+    rng = random.Random(seed)
+    vocab = (
+        "the court held that petitioner respondent custodial interrogation privilege amendment statute "
+        "evidence trial judgment record counsel warning confession procedure safeguards officers state "
+        "federal review question rule doctrine precedent decision argument reasoning conviction appeal"
+    ).split()
+
+    def sentence(n: int) -> str:
+        words = [rng.choice(vocab) for _ in range(n)]
+        return " ".join(words).capitalize() + "."
+
+    parts = [
+        "(Slip Opinion) OCTOBER TERM, 1965",
+        "NOTE: Where it is feasible, a syllabus (headnote) will be released, as is being done in connection with this case, "
+        "at the time the opinion is issued. The syllabus constitutes no part of the opinion of the Court but has been prepared "
+        "by the Reporter of Decisions for the convenience of the reader. See United States v. Detroit Timber & Lumber Co., 200 U. S. 321, 337.",
+        "SUPREME COURT OF THE UNITED STATES",
+        "Syllabus",
+    ]
+    body = []
+    footnotes = []
+    first_page = 100
+    for i in range(pages):
+        page = [f"*{first_page + i}", f"Cite as: {pages} U. S. 1 (1966)"]
+        words = 0
+        while words < words_per_page:
+            s = sentence(rng.randint(12, 28))
+            if rng.random() < 0.15:
+                s = s[:-1] + f", see Escobedo v. Illinois, 378 U. S. 478, {rng.randint(479, 499)} (1964)."
+            if rng.random() < 0.05:
+                n = len(footnotes) + 1
+                s += f" [{n}]"
+                footnotes.append(f"[{n}] {sentence(rng.randint(20, 40))} {sentence(rng.randint(20, 40))}")
+            page.append(s)
+            words += len(s.split())
+        body.append("\n".join(page))
+    parts.extend(body[0].split("\n")[2:6])  # the syllabus restates the opening of the opinion
+    parts.append("MR. CHIEF JUSTICE WARREN delivered the opinion of the Court.")
+    parts.extend(body)
+    if footnotes:
+        parts.append("Footnotes")
+        parts.extend(footnotes)
+    return "\n".join(parts)
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that stop a stream early reset the connection; that is expected here
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+class FakeServer:
+    """A ThreadingHTTPServer on a free localhost port running in a daemon thread."""
+
+    def __init__(self, handler_cls, **config):
+        handler = type(handler_cls.__name__, (handler_cls,), {"config": config, "state": {"requests": 0}})
+        self.httpd = _QuietHTTPServer(("127.0.0.1", 0), handler)
+        self.state = handler.state
+        self.config = config
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: dict = {}
+    state: dict = {}
+
+    def log_message(self, *args):
+        pass
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, code: int, data, headers: Optional[dict] = None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# ----------- CourtListener -----------
+class FakeCourtListenerHandler(_Handler):
+    # config: latency (seconds per request), words_per_page, throttle (the first N requests get a 429)
+    # Each cluster has a lead opinion and a dissent (a sixth of its length)
+
+    def _throttled(self) -> bool:
+        if self.state.get("throttled", 0) >= self.config.get("throttle", 0):
+            return False
+        self.state["throttled"] = self.state.get("throttled", 0) + 1
+        self._send_json(429, {"detail": "Request was throttled."}, {"Retry-After": "0"})
+        return True
+
+    def do_POST(self):
+        self.state["requests"] += 1
+        body = self._read_json()
+        time.sleep(self.config.get("latency", 0))
+        if self._throttled():
+            return
+        if not self.path.startswith("/api/rest/v4/citation-lookup/"):
+            self._send_json(404, {"detail": "Not found"})
+            return
+        text = body.get("text", "")
+        base = f"http://127.0.0.1:{self.server.server_port}"
+        results = []
+        for m in re.finditer(r"(\d+)\s+U\.\s?S\.\s+(\d+)", text):
+            pages, n = m.group(1), m.group(2)
+            results.append({
+                "citation": m.group(0),
+                "start_index": m.start(),
+                "end_index": m.end(),
+                "status": 200,
+                "clusters": [{
+                    "case_name": f"Petitioner{n} v. State",
+                    "date_filed": "1966-06-13",
+                    "absolute_url": f"/opinion/{n}/petitioner-v-state/",
+                    "judges": "Warren, Black, Douglas, Clark, Harlan, Brennan, Stewart, White, Fortas",
+                    "sub_opinions": [
+                        f"{base}/api/rest/v4/opinions/{pages}-{n}-dissent/",
+                        f"{base}/api/rest/v4/opinions/{pages}-{n}/",
+                    ],
+                }],
+            })
+        if not results:
+            results = [{"citation": text, "start_index": 0, "end_index": len(text), "status": 404, "clusters": []}]
+        self._send_json(200, results)
+
+    def do_GET(self):
+        self.state["requests"] += 1
+        time.sleep(self.config.get("latency", 0))
+        if self._throttled():
+            return
+        m = re.match(r"/api/rest/v4/opinions/(\d+)-(\d+)(-dissent)?/", self.path)
+        if not m:
+            self._send_json(404, {"detail": "Not found"})
+            return
+        pages, n, dissent = int(m.group(1)), int(m.group(2)), bool(m.group(3))
+        words = self.config.get("words_per_page", 450)
+        if dissent:
+            opinion = {
+                "type": "040dissent",
+                "author_str": "Harlan",
+                "plain_text": make_opinion_text(max(1, pages // 6), words, seed=n + 1),
+            }
+        else:
+            opinion = {"type": "020lead", "author_str": "Warren", "plain_text": make_opinion_text(pages, words, seed=n)}
+        opinion_id = f"{pages}-{n}" + ("-dissent" if dissent else "")
+        if self.headers.get("If-None-Match") == f'"{opinion_id}"':
+            # Opinions never change here, so a conditional GET for a known ETag is always current
+            self.state["not_modified"] = self.state.get("not_modified", 0) + 1
+            self.send_response(304)
+            self.send_header("ETag", f'"{opinion_id}"')
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self._send_json(200, dict(opinion, id=opinion_id), {"ETag": f'"{opinion_id}"'})
+
+
+# ----------- Ollama -----------
+class FakeOllamaHandler(_Handler):
+    # config: tokens_per_second, prompt_tokens_per_second, load_seconds, latency, parallel
+
+    _slots = None
+    _slots_lock = threading.Lock()
+
+    @classmethod
+    def _semaphore(cls):
+        with cls._slots_lock:
+            if cls._slots is None:
+                cls._slots = threading.Semaphore(cls.config.get("parallel", 1))
+            return cls._slots
+
+    def do_GET(self):
+        if self.path in ("/api/version", "/"):
+            self._send_json(200, {"version": "0.0.0-fake"})
+        elif self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": "mixtral:latest"}]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _response_text(self, payload: dict) -> str:
+        prompt = payload.get("prompt", "")
+        pages = re.findall(r"\[Page (\d+)\]", prompt) or ["1"]
+        page = pages[len(pages) // 2]
+        m = re.search(r"\*\*(.+? v\. .+?), ", prompt)
+        case = m.group(1) if m else "Petitioner v. State"
+        fmt = payload.get("format")
+        properties = fmt.get("properties", {}) if isinstance(fmt, dict) else {}
+        if properties and set(properties) <= EXTRACTION_FIELDS:
+            # The whole extraction, or the part of it one section's passages are asked for
+            petitioner, _, respondent = case.partition(" v. ")
+            point = lambda text: [{"point": f"{text} in {case}", "page": int(page)}]
+            extraction = {
+                "parties": {"petitioner": petitioner, "respondent": respondent},
+                "majority_author": "Warren",
+                "procedural_history": point("The state court affirmed the conviction"),
+                "facts": point("The petitioner was questioned in custody without warnings"),
+                "issues": point("Whether statements from custodial interrogation are admissible"),
+                "rules": point("The Fifth Amendment privilege applies to custodial interrogation"),
+                "holding": point("The statements were inadmissible"),
+                "reasoning": point("Custodial interrogation is inherently compelling"),
+                "disposition": point("Reversed"),
+                "dissents": [{"author": "Harlan", "points": point("The new rule is unwise")}],
+            }
+            return json.dumps({key: extraction[key] for key in properties})
+        if isinstance(fmt, dict) or fmt == "json" or "Respond in JSON" in prompt:
+            keys = list(fmt.get("properties", {})) if isinstance(fmt, dict) else SECTION_KEYS
+            return json.dumps({
+                key: f"In {case}, the court's {key.lower()} is stated on this page of the opinion (Page {page})."
+                for key in keys
+            })
+        return f"- The court discussed the custodial interrogation in {case} (Page {page}).\n" * 5
+
+    def do_POST(self):
+        self.state["requests"] += 1
+        payload = self._read_json()
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+        if "prompt" not in payload:
+            # Preload request
+            self._send_json(200, {"model": payload.get("model"), "response": "", "done": True})
+            return
+
+        with self._semaphore():
+            started = time.perf_counter()
+            load = 0.0
+            if not self.state.get("loaded"):
+                load = self.config.get("load_seconds", 0.0)
+                self.state["loaded"] = True
+            prompt_tokens = len(payload["prompt"]) // 4
+            prompt_seconds = prompt_tokens / self.config.get("prompt_tokens_per_second", 2000.0)
+            time.sleep(self.config.get("latency", 0.0) + load + prompt_seconds)
+
+            text = self._response_text(payload)
+            limit = (payload.get("options") or {}).get("num_predict")
+            tokens = [text[i:i + 4] for i in range(0, len(text), 4)]
+            if limit and limit > 0:
+                tokens = tokens[:limit]
+            done_reason = "length" if limit and len(tokens) == limit else "stop"
+            tps = self.config.get("tokens_per_second", 200.0)
+            stats = lambda: {
+                "done": True,
+                "done_reason": done_reason,
+                "eval_count": len(tokens),
+                "eval_duration": int((time.perf_counter() - started - load - prompt_seconds) * 1e9),
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(prompt_seconds * 1e9),
+                "load_duration": int(load * 1e9),
+                "total_duration": int((time.perf_counter() - started) * 1e9),
+            }
+
+            if not payload.get("stream", True):
+                time.sleep(len(tokens) / tps)
+                self._send_json(200, dict(stats(), model=payload.get("model"), response="".join(tokens)))
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            # Sleep in batches so high token rates aren't limited by timer resolution
+            batch = max(1, int(tps * 0.01))
+            try:
+                for i, token in enumerate(tokens):
+                    self._write_chunk({"model": payload.get("model"), "response": token, "done": False})
+                    if (i + 1) % batch == 0:
+                        time.sleep(batch / tps)
+                self._write_chunk(dict(stats(), model=payload.get("model"), response=""))
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stopped early
+                self.close_connection = True
+
+    def _write_chunk(self, data: dict):
+        line = (json.dumps(data) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+        self.wfile.flush()
+
+
+def start_fake_courtlistener(latency: float = 0.0, words_per_page: int = 450, throttle: int = 0) -> FakeServer:
+    return FakeServer(FakeCourtListenerHandler, latency=latency, words_per_page=words_per_page, throttle=throttle)
+
+
+def start_fake_ollama(
+    tokens_per_second: float = 200.0,
+    prompt_tokens_per_second: float = 2000.0,
+    load_seconds: float = 0.0,
+    latency: float = 0.0,
+    parallel: int = 1
+) -> FakeServer:
+    return FakeServer(
+        FakeOllamaHandler,
+        tokens_per_second=tokens_per_second,
+        prompt_tokens_per_second=prompt_tokens_per_second,
+        load_seconds=load_seconds,
+        latency=latency,
+        parallel=parallel
+    )
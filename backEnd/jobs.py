@@ -0,0 +1,228 @@
+# --- jobs.py (Brief job queue with a bounded worker pool) ---
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+import threading
+import time
+import uuid
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def _notify(callbacks: list, *args):
+    # A subscriber that fails (e.g. its event loop has closed) must not take the worker down with it
+    for fn in callbacks:
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"⚠️ Job subscriber failed: {e}")
+
+
+@dataclass
+class Job:
+    id: str
+    params: dict
+    status: str = "queued"          # queued -> running -> done | failed
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    timings: dict = field(default_factory=dict)
+    result: Any = None
+    error: Optional[str] = None
+    key: Optional[str] = None
+    subscribers: int = 1            # requests sharing this job through coalescing
+    background: bool = False        # low priority: runs only when no other job is waiting
+    events: list = field(default_factory=list, repr=False)
+    _done: threading.Event = field(default_factory=threading.Event, repr=False)
+    _events_cond: threading.Condition = field(default_factory=threading.Condition, repr=False)
+    _done_callbacks: list = field(default_factory=list, repr=False)
+    _listeners: list = field(default_factory=list, repr=False)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def add_done_callback(self, fn: Callable[["Job"], None]):
+        # fn(job) runs once the job has finished: in the worker thread, or right away if it already has.
+        # Lets an event loop await the job (via call_soon_threadsafe) without parking a thread on wait()
+        with self._events_cond:
+            if not self._done.is_set():
+                self._done_callbacks.append(fn)
+                return
+        fn(self)
+
+    def add_listener(self, fn: Callable[[], None]) -> Callable[[], None]:
+        # fn() runs in the publishing thread after every new event; returns a function that removes it
+        with self._events_cond:
+            self._listeners.append(fn)
+
+        def remove():
+            with self._events_cond:
+                if fn in self._listeners:
+                    self._listeners.remove(fn)
+        return remove
+
+    def publish(self, event: dict):
+        with self._events_cond:
+            self.events.append(event)
+            self._events_cond.notify_all()
+            listeners = list(self._listeners)
+        _notify(listeners)
+
+    def _mark_done(self):
+        with self._events_cond:
+            self._done.set()
+            callbacks, self._done_callbacks = self._done_callbacks, []
+        _notify(callbacks, self)
+
+    def events_since(self, index: int, timeout: Optional[float] = None) -> list:
+        # Blocks until there are events past `index` (or the timeout passes) and returns them
+        with self._events_cond:
+            self._events_cond.wait_for(lambda: len(self.events) > index, timeout)
+            return self.events[index:]
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "params": self.params,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "timings": self.timings,
+            "error": self.error,
+            "subscribers": self.subscribers,
+            "background": self.background,
+        }
+
+
+class JobQueue:
+    """FIFO of brief jobs served by a fixed number of worker threads.
+
+    `workers` should match how many generations the model server can run in
+    parallel; `max_queued` bounds the backlog so overload is rejected instead of piling up.
+    Submissions with the same `key` as a queued or running job share that job instead of adding another.
+    Background jobs wait in a separate line that workers only take from when the main one is empty;
+    they don't count against `max_queued`.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Job], Any],
+        workers: int = 1,
+        max_queued: int = 100,
+        retention_seconds: float = 3600
+    ):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+        self._pending = deque()
+        self._background = deque()
+        self._jobs = {}
+        self._inflight = {}             # key -> queued or running job
+        self._coalesced = 0
+        self._running = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"brief-worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, params: dict, key: Optional[str] = None, background: bool = False) -> Job:
+        with self._cond:
+            self._prune()
+            if key is not None and key in self._inflight:
+                job = self._inflight[key]
+                job.subscribers += 1
+                self._coalesced += 1
+                if job.background and not background and job.status == "queued":
+                    # Someone is waiting for it now: move it to the main line
+                    self._background.remove(job)
+                    self._pending.append(job)
+                    job.background = False
+                return job
+            if not background and len(self._pending) >= self.max_queued:
+                raise QueueFullError(f"Queue is full ({self.max_queued} jobs waiting)")
+            job = Job(id=uuid.uuid4().hex, params=params, key=key, background=background)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._inflight[key] = job
+            (self._background if background else self._pending).append(job)
+            self._cond.notify()
+            return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def position(self, job: Job) -> Optional[int]:
+        # 0-based place in line; None once the job has left the queue
+        with self._cond:
+            if job in self._pending:
+                return self._pending.index(job)
+            if job in self._background:
+                return len(self._pending) + self._background.index(job)
+            return None
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "queued": len(self._pending),
+                "background": len(self._background),
+                "max_queued": self.max_queued,
+                "coalesced": self._coalesced,
+            }
+
+    def shutdown(self, wait: bool = False):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for t in self._threads:
+                t.join()
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._background and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                job = (self._pending or self._background).popleft()
+                self._running += 1
+                job.status = "running"
+                job.started_at = time.time()
+                job.timings["queued"] = job.started_at - job.submitted_at
+            job.publish({"event": "status", "status": "running"})
+            try:
+                job.result = self.handler(job)
+                job.status = "done"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+            finally:
+                job.finished_at = time.time()
+                with self._cond:
+                    self._running -= 1
+                    if job.key is not None:
+                        # Later identical requests start fresh (and hit the brief cache on success)
+                        del self._inflight[job.key]
+                job._mark_done()
+                job.publish({"event": "status", "status": job.status, "error": job.error, "timings": job.timings})
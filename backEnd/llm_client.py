@@ -0,0 +1,415 @@
+# --- llm_client.py (Pooled Ollama client) ---
+
+from dataclasses import dataclass, field
+from typing import Callable, Optional, List
+from requests.adapters import HTTPAdapter
+import requests
+import threading
+import json
+import time
+
+DEFAULT_OLLAMA_URL = "http://localhost:11434"
+
+
+def normalize_ollama_url(url: str) -> str:
+    # Accepts OLLAMA_HOST-style values such as "0.0.0.0:11434"
+    url = url.strip().rstrip("/")
+    if "://" not in url:
+        url = f"http://{url}"
+    return url
+
+
+@dataclass
+class GenerationResult:
+    response: str
+    eval_count: int = 0
+    eval_duration: int = 0            # nanoseconds, as reported by Ollama
+    prompt_eval_count: int = 0
+    prompt_eval_duration: int = 0
+    load_duration: int = 0
+    total_duration: int = 0
+    done_reason: Optional[str] = None
+    stopped_early: bool = False       # closed before Ollama's final chunk; counts are estimated
+    backend: Optional[str] = None     # base URL of the server that answered
+    raw_text: str = field(default="", repr=False)
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.eval_count / (self.eval_duration / 1e9) if self.eval_duration else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.eval_count} tokens in {self.eval_duration / 1e9:.1f}s ({self.tokens_per_second:.1f} tok/s), "
+            f"prompt {self.prompt_eval_count} tokens in {self.prompt_eval_duration / 1e9:.1f}s, "
+            f"load {self.load_duration / 1e9:.1f}s"
+        )
+
+
+class OllamaClient:
+    """Keep-alive client for one Ollama server.
+
+    Requests share a pooled session and ask Ollama to keep the model resident (`keep_alive`), so the
+    weights and the KV cache of the static prompt prefix survive between briefs. Ollama reuses cached
+    KV entries for a matching prompt prefix, which is why prompts put their fixed instructions first.
+    """
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_OLLAMA_URL,
+        model: str = "mixtral",
+        keep_alive: str = "30m",
+        num_ctx: Optional[int] = None,
+        pool_size: int = 8,
+        timeout: Optional[float] = None
+    ):
+        self.base_url = normalize_ollama_url(base_url)
+        self.model = model
+        self.keep_alive = keep_alive
+        self.num_ctx = num_ctx
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "calls": 0,
+            "errors": 0,
+            "eval_count": 0,
+            "eval_duration": 0,
+            "prompt_eval_count": 0,
+            "prompt_eval_duration": 0,
+            "load_duration": 0,
+            "stopped_early": 0,
+        }
+
+    # ----------- Requests -----------
+    def build_payload(
+        self,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        stop: Optional[List[str]] = None,
+        stream: bool = False,
+        format: Optional[object] = None
+    ) -> dict:
+        # Sampling settings belong under "options"; Ollama ignores them at the top level
+        options = {"temperature": temperature, "num_predict": max_tokens}
+        if stop:
+            options["stop"] = stop
+        if self.num_ctx:
+            options["num_ctx"] = self.num_ctx
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": options,
+        }
+        if format is not None:
+            payload["format"] = format
+        return payload
+
+    def generate(
+        self,
+        prompt: str,
+        temperature: float = 0.3,
+        max_tokens: int = 1500,
+        stop: Optional[List[str]] = None,
+        on_token: Optional[Callable[[str], Optional[bool]]] = None,
+        format: Optional[object] = None
+    ) -> GenerationResult:
+        # With on_token the NDJSON stream is consumed token by token; returning True from on_token stops generation
+        payload = self.build_payload(prompt, temperature, max_tokens, stop, stream=on_token is not None, format=format)
+        try:
+            if on_token is None:
+                response = self.session.post(f"{self.base_url}/api/generate", json=payload, timeout=self.timeout)
+                response.raise_for_status()
+                data = response.json()
+                result = self._result_from(data, data.get("response", ""))
+                result.raw_text = response.text
+            else:
+                result = self._generate_stream(payload, on_token)
+        except Exception:
+            with self._stats_lock:
+                self._stats["errors"] += 1
+            raise
+        self._record(result)
+        return result
+
+    def _generate_stream(self, payload: dict, on_token: Callable[[str], Optional[bool]]) -> GenerationResult:
+        parts = []
+        final = {}
+        stopped = False
+        first_token_at = None
+        with self.session.post(
+            f"{self.base_url}/api/generate",
+            json=payload,
+            stream=True,
+            timeout=self.timeout
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
+                token = chunk.get("response", "")
+                parts.append(token)
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                if chunk.get("done"):
+                    final = chunk
+                    break
+                if on_token(token):
+                    # Closing the connection makes Ollama abort the rest of the generation
+                    stopped = True
+                    break
+        if not final:
+            # Ollama only reports counts in the closing chunk. Without it each streamed chunk counts as one
+            # output token, timed from the first one; the prompt counts are unknown and stay 0
+            stopped = True
+            eval_seconds = time.perf_counter() - first_token_at if first_token_at is not None else 0.0
+            final = {"eval_count": len(parts), "eval_duration": int(eval_seconds * 1e9)}
+        result = self._result_from(final, "".join(parts))
+        result.stopped_early = stopped
+        result.raw_text = json.dumps(final)
+        return result
+
+    @staticmethod
+    def _result_from(data: dict, text: str) -> GenerationResult:
+        return GenerationResult(
+            response=text,
+            eval_count=data.get("eval_count", 0),
+            eval_duration=data.get("eval_duration", 0),
+            prompt_eval_count=data.get("prompt_eval_count", 0),
+            prompt_eval_duration=data.get("prompt_eval_duration", 0),
+            load_duration=data.get("load_duration", 0),
+            total_duration=data.get("total_duration", 0),
+            done_reason=data.get("done_reason"),
+        )
+
+    def preload(self) -> float:
+        # An empty prompt loads the model and applies keep_alive without generating anything
+        start = time.perf_counter()
+        response = self.session.post(
+            f"{self.base_url}/api/generate",
+            json={"model": self.model, "keep_alive": self.keep_alive},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    def health(self, timeout: float = 5.0) -> bool:
+        try:
+            return self.session.get(f"{self.base_url}/api/version", timeout=timeout).ok
+        except requests.RequestException:
+            return False
+
+    # ----------- Stats -----------
+    def _record(self, result: GenerationResult):
+        with self._stats_lock:
+            self._stats["calls"] += 1
+            for key in ("eval_count", "eval_duration", "prompt_eval_count", "prompt_eval_duration", "load_duration"):
+                self._stats[key] += getattr(result, key)
+            if result.stopped_early:
+                self._stats["stopped_early"] += 1
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["tokens_per_second"] = (
+            stats["eval_count"] / (stats["eval_duration"] / 1e9) if stats["eval_duration"] else 0.0
+        )
+        return stats
+
+    def close(self):
+        self.session.close()
+
+
+# ----------- Router -----------
+class _Backend:
+    def __init__(self, client: OllamaClient):
+        self.client = client
+        self.outstanding = 0
+        self.healthy = True
+        self.failures = 0             # consecutive
+        self.ejected_at: Optional[float] = None
+
+
+class OllamaRouter:
+    """Spreads generations over several Ollama servers.
+
+    Each request goes to the healthy backend with the fewest requests in flight. A backend that fails
+    `eject_after` times in a row is ejected; a background thread probes every backend each
+    `health_interval` seconds, ejecting unreachable ones and re-admitting those that answer again.
+    A failed generation is retried on another backend as long as nothing has been streamed to the caller yet.
+    """
+
+    def __init__(
+        self,
+        base_urls: List[str],
+        model: str = "mixtral",
+        keep_alive: str = "30m",
+        num_ctx: Optional[int] = None,
+        pool_size: int = 8,
+        timeout: Optional[float] = None,
+        eject_after: int = 2,
+        health_interval: float = 10.0
+    ):
+        if not base_urls:
+            raise ValueError("At least one Ollama URL is required")
+        self.model = model
+        self.eject_after = eject_after
+        self.health_interval = health_interval
+        self.backends = [
+            _Backend(OllamaClient(url, model, keep_alive, num_ctx, pool_size, timeout))
+            for url in dict.fromkeys(normalize_ollama_url(u) for u in base_urls)
+        ]
+        self._lock = threading.Lock()
+        self._next = 0
+        self._retries = 0
+        self._closed = threading.Event()
+        self._health_thread = None
+        if len(self.backends) > 1 and health_interval > 0:
+            self._health_thread = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+            self._health_thread.start()
+
+    # ----------- Selection -----------
+    def _acquire(self, exclude: set) -> Optional[_Backend]:
+        with self._lock:
+            candidates = [b for b in self.backends if b not in exclude]
+            # With every remaining backend ejected, still try one rather than failing outright
+            healthy = [b for b in candidates if b.healthy] or candidates
+            if not healthy:
+                return None
+            # Rotate the starting point so ties don't always land on the first backend
+            start = self._next % len(self.backends)
+            self._next += 1
+            order = self.backends[start:] + self.backends[:start]
+            backend = min(healthy, key=lambda b: (b.outstanding, order.index(b)))
+            backend.outstanding += 1
+            return backend
+
+    def _release(self, backend: _Backend, ok: bool):
+        with self._lock:
+            backend.outstanding -= 1
+            if ok:
+                backend.failures = 0
+                if not backend.healthy:
+                    self._readmit(backend)
+                return
+            backend.failures += 1
+            if backend.healthy and backend.failures >= self.eject_after:
+                self._eject(backend)
+
+    def _eject(self, backend: _Backend):
+        backend.healthy = False
+        backend.ejected_at = time.time()
+        print(f"⚠️ Ejecting Ollama backend {backend.client.base_url}")
+
+    def _readmit(self, backend: _Backend):
+        backend.healthy = True
+        backend.failures = 0
+        backend.ejected_at = None
+        print(f"✅ Re-admitting Ollama backend {backend.client.base_url}")
+
+    @staticmethod
+    def _retryable(error: Exception) -> bool:
+        # Client errors (unknown model, bad request) would fail the same way everywhere
+        if isinstance(error, requests.HTTPError) and error.response is not None:
+            return error.response.status_code >= 500
+        return isinstance(error, (requests.RequestException, RuntimeError))
+
+    # ----------- Requests -----------
+    def generate(
+        self,
+        prompt: str,
+        temperature: float = 0.3,
+        max_tokens: int = 1500,
+        stop: Optional[List[str]] = None,
+        on_token: Optional[Callable[[str], Optional[bool]]] = None,
+        format: Optional[object] = None
+    ) -> GenerationResult:
+        tried = set()
+        streamed = [False]
+        forward = None
+        if on_token is not None:
+            def forward(token: str):
+                streamed[0] = True
+                return on_token(token)
+
+        while True:
+            backend = self._acquire(tried)
+            if backend is None:
+                raise RuntimeError("No Ollama backend available")
+            tried.add(backend)
+            try:
+                result = backend.client.generate(prompt, temperature, max_tokens, stop, forward, format)
+            except Exception as e:
+                self._release(backend, ok=not self._retryable(e))
+                if not self._retryable(e) or streamed[0] or len(tried) == len(self.backends):
+                    raise
+                with self._lock:
+                    self._retries += 1
+                print(f"🔁 {backend.client.base_url} failed ({e}); retrying on another backend")
+                continue
+            self._release(backend, ok=True)
+            result.backend = backend.client.base_url
+            return result
+
+    def preload(self) -> float:
+        # Loads the model on every reachable backend; returns the slowest load time
+        slowest = 0.0
+        for backend in self.backends:
+            try:
+                slowest = max(slowest, backend.client.preload())
+            except requests.RequestException as e:
+                print(f"⚠️ Could not preload {self.model} on {backend.client.base_url}: {e}")
+        return slowest
+
+    def health(self, timeout: float = 5.0) -> bool:
+        return any(b.client.health(timeout) for b in self.backends)
+
+    def check_health(self):
+        for backend in self.backends:
+            ok = backend.client.health(timeout=min(5.0, self.health_interval or 5.0))
+            with self._lock:
+                if ok and not backend.healthy:
+                    self._readmit(backend)
+                elif not ok and backend.healthy:
+                    self._eject(backend)
+
+    def _health_loop(self):
+        while not self._closed.wait(self.health_interval):
+            self.check_health()
+
+    # ----------- Stats -----------
+    def stats(self) -> dict:
+        backends = []
+        with self._lock:
+            for b in self.backends:
+                backends.append(dict(
+                    b.client.stats(),
+                    url=b.client.base_url,
+                    healthy=b.healthy,
+                    outstanding=b.outstanding
+                ))
+            retries = self._retries
+        totals = {
+            key: sum(b[key] for b in backends)
+            for key in (
+                "calls", "errors", "eval_count", "eval_duration", "prompt_eval_count", "prompt_eval_duration",
+                "load_duration", "stopped_early"
+            )
+        }
+        totals["tokens_per_second"] = (
+            totals["eval_count"] / (totals["eval_duration"] / 1e9) if totals["eval_duration"] else 0.0
+        )
+        return dict(totals, retries=retries, backends=backends)
+
+    def close(self):
+        self._closed.set()
+        for backend in self.backends:
+            backend.client.close()
@@ -0,0 +1,174 @@
+# --- metrics.py (Process-wide counters and histograms in Prometheus text format) ---
+
+from typing import Callable, Optional, List
+import threading
+import math
+
+# Seconds; spans from sub-millisecond preprocessing to multi-minute generations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key: tuple, value) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value: float, **labels):
+        # For totals another component already accumulates (e.g. the Ollama client's stats)
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def _render_sample(self, key: tuple, value) -> List[str]:
+        counts, total, count = value
+        lines = []
+        for bound, n in zip(self.buckets, counts):
+            le = 'le="%s"' % _number(bound)
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {n}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect: Callable[[], None]):
+        # Called before each render, e.g. to copy queue depth or Ollama totals into gauges
+        with self._lock:
+            self._collectors.append(collect)
+
+    def render(self) -> str:
+        with self._lock:
+            collectors = list(self._collectors)
+            metrics = list(self._metrics)
+        for collect in collectors:
+            try:
+                collect()
+            except Exception as e:
+                print(f"⚠️ Metrics collector failed: {e}")
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str, labelnames: tuple = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help, labelnames))
+
+
+def gauge(name: str, help: str, labelnames: tuple = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, labelnames))
+
+
+def histogram(name: str, help: str, labelnames: tuple = (), buckets: Optional[tuple] = None) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labelnames, buckets or DEFAULT_BUCKETS))
+
+
+# ----------- Pipeline Metrics -----------
+STAGE_SECONDS = histogram("lex_stage_seconds", "Time spent in each pipeline stage", ("stage",))
+LLM_REQUEST_SECONDS = histogram("lex_llm_request_seconds", "Wall time of each model request", ("kind",))
+BRIEFS = counter("lex_briefs_total", "Briefs finished, by outcome", ("outcome",))
+CACHE_LOOKUPS = counter("lex_cache_lookups_total", "Brief and extraction cache lookups", ("cache", "result"))
+SECTION_EVENTS = counter(
+    "lex_section_events_total",
+    "Section validation outcomes (validated, failed, regenerated, recovered, unrecovered)",
+    ("event", "section", "reason")
+)
+
+# Mirrored from the Ollama router's own totals at scrape time
+LLM_CALLS = counter("lex_llm_calls_total", "Model requests completed, per backend", ("backend",))
+LLM_ERRORS = counter("lex_llm_errors_total", "Model requests that failed, per backend", ("backend",))
+LLM_RETRIES = counter("lex_llm_retries_total", "Model requests retried on another backend")
+LLM_TOKENS = counter("lex_llm_tokens_total", "Tokens reported by Ollama, per backend", ("backend", "kind"))
+LLM_STOPPED_EARLY = counter(
+    "lex_llm_stopped_early_total",
+    "Streamed requests closed before Ollama's final chunk (output tokens counted per chunk, prompt tokens unreported), per backend",
+    ("backend",)
+)
+LLM_SECONDS = counter("lex_llm_seconds_total", "Time reported by Ollama, per backend and phase", ("backend", "phase"))
+LLM_BACKEND_UP = gauge("lex_llm_backend_up", "1 while a backend is in rotation", ("backend",))
+LLM_OUTSTANDING = gauge("lex_llm_outstanding_requests", "Requests in flight per backend", ("backend",))
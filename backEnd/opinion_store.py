@@ -0,0 +1,342 @@
+# --- opinion_store.py (CourtListener client + local opinion store) ---
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional, List
+from urllib3.util.retry import Retry
+from requests.adapters import HTTPAdapter
+import requests
+import sqlite3
+import threading
+import json
+import time
+import zlib
+import os
+
+USER_AGENT = "LexEmetica Clerk/1.0 (Theodor Owchariw; for academic use)"
+DEFAULT_BASE_URL = "https://www.courtlistener.com"
+
+
+# Only the opinion fields the pipeline reads are kept; the HTML renderings are large
+OPINION_FIELDS = ("id", "type", "author", "author_str", "joined_by_str", "per_curiam", "ordering_key", "plain_text")
+
+# CourtListener opinion type codes -> the kind of opinion, in the order they are presented
+OPINION_KINDS = {
+    "010combined": "combined",
+    "015unamimous": "majority",
+    "020lead": "majority",
+    "025plurality": "plurality",
+    "030concurrence": "concurrence",
+    "035concurrenceinpart": "concurrence in part",
+    "040dissent": "dissent",
+    "050addendum": "addendum",
+}
+KIND_ORDER = ["combined", "majority", "plurality", "concurrence", "concurrence in part", "dissent", "addendum", "other"]
+
+
+def normalize_citation(citation: str) -> str:
+    return " ".join(citation.split()).upper()
+
+
+def trim_opinion(opinion: dict) -> dict:
+    return {k: opinion.get(k) for k in OPINION_FIELDS if k in opinion}
+
+
+def opinion_kind(opinion: dict) -> str:
+    return OPINION_KINDS.get(opinion.get("type") or "", "other")
+
+
+def opinion_author(opinion: dict) -> str:
+    # author_str is the name as printed; per curiam opinions have no author
+    if opinion.get("per_curiam"):
+        return "Per Curiam"
+    return (opinion.get("author_str") or "").strip() or "Unknown"
+
+
+def order_opinions(opinions: List[dict]) -> List[dict]:
+    # Majority first, then concurrences and dissents, keeping CourtListener's order within a kind
+    def key(item):
+        position, opinion = item
+        return KIND_ORDER.index(opinion_kind(opinion)), opinion.get("ordering_key") or 0, position
+    return [opinion for _, opinion in sorted(enumerate(opinions), key=key)]
+
+
+# ----------- HTTP Client -----------
+class CourtListenerClient:
+    """Pooled keep-alive session for the CourtListener REST API with 429 backoff and conditional GETs."""
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        base_url: str = DEFAULT_BASE_URL,
+        pool_size: int = 10,
+        max_retries: int = 5,
+        backoff_factor: float = 1.0,
+        timeout: float = 30.0
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": USER_AGENT})
+        if api_key:
+            self.session.headers["Authorization"] = f"Token {api_key}"
+
+        # Honour Retry-After on 429s and back off exponentially otherwise
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=None,
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Concurrent GETs share the session's connection pool, so the pool size bounds the fan-out
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="courtlistener")
+
+    def lookup_citation(self, text: str) -> list:
+        response = self.session.post(
+            f"{self.base_url}/api/rest/v4/citation-lookup/",
+            json={"text": text},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def lookup_citations(self, citations: List[str], batch_size: int = 100) -> dict:
+        """Resolves many citations with one citation-lookup request per `batch_size`.
+
+        The endpoint parses free text, so the citations are sent as one newline-separated document
+        and each result is matched back by its offset. Returns {citation: result} for every citation
+        the endpoint reported; a result has "status" and "clusters" as in the single lookup.
+        """
+        resolved = {}
+        for i in range(0, len(citations), batch_size):
+            batch = citations[i:i + batch_size]
+            starts = []
+            pos = 0
+            for citation in batch:
+                starts.append(pos)
+                pos += len(citation) + 1
+            for result in self.lookup_citation("\n".join(batch)):
+                start = result.get("start_index")
+                if start is None:
+                    continue
+                index = max(j for j, s in enumerate(starts) if s <= start)
+                # A citation that parses as several (e.g. parallel cites) keeps its first resolved result
+                if batch[index] not in resolved or resolved[batch[index]].get("status") != 200:
+                    resolved[batch[index]] = result
+        return resolved
+
+    def get_json(
+        self,
+        url: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None
+    ) -> tuple:
+        # Returns (data, etag, last_modified); data is None when the server answered 304 Not Modified
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            return None, etag, last_modified
+        response.raise_for_status()
+        return (
+            response.json(),
+            response.headers.get("ETag", etag),
+            response.headers.get("Last-Modified", last_modified)
+        )
+
+    def get_many(self, targets: List[tuple]) -> list:
+        # Concurrent get_json for (url, etag, last_modified) tuples; each entry is a result tuple or the exception
+        futures = [self._executor.submit(self.get_json, *r) for r in targets]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+# ----------- Opinion Store -----------
+class OpinionStore:
+    """SQLite store mapping citation -> cluster metadata + its sub-opinions (zlib-compressed JSON).
+
+    The opinion column holds a list of {"url", "opinion", "etag", "last_modified"} entries, one per
+    sub-opinion; opinion_url/etag/last_modified mirror the first. Rows written before sub-opinions
+    were kept hold a single opinion dict and are read back as a one-entry list.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS opinions (
+                citation      TEXT PRIMARY KEY,
+                cluster       BLOB NOT NULL,
+                opinion_url   TEXT,
+                opinion       BLOB NOT NULL,
+                etag          TEXT,
+                last_modified TEXT,
+                fetched_at    REAL NOT NULL
+            )
+        """)
+        # Parallel citations of a stored cluster (e.g. "86 S. Ct. 1602" -> "384 U.S. 436")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS citation_aliases (
+                citation  TEXT PRIMARY KEY,
+                canonical TEXT NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def _pack(value: dict) -> bytes:
+        return zlib.compress(json.dumps(value).encode("utf-8"))
+
+    @staticmethod
+    def _unpack(blob: bytes) -> dict:
+        return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+    def get(self, citation: str) -> Optional[dict]:
+        citation = normalize_citation(citation)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT cluster, opinion_url, opinion, etag, last_modified, fetched_at FROM opinions WHERE citation = "
+                "COALESCE((SELECT canonical FROM citation_aliases WHERE citation = ?), ?)",
+                (citation, citation)
+            ).fetchone()
+        if row is None:
+            return None
+        opinions = self._unpack(row[2])
+        if isinstance(opinions, dict):
+            opinions = [{"url": row[1], "opinion": opinions, "etag": row[3], "last_modified": row[4]}]
+        return {
+            "cluster": self._unpack(row[0]),
+            "opinions": opinions,
+            "fetched_at": row[5],
+        }
+
+    def _row(self, citation: str, cluster: dict, opinions: List[dict]) -> tuple:
+        lead = opinions[0] if opinions else {}
+        return (
+            normalize_citation(citation),
+            self._pack(cluster),
+            lead.get("url"),
+            self._pack(opinions),
+            lead.get("etag"),
+            lead.get("last_modified"),
+            time.time()
+        )
+
+    def put(self, citation: str, cluster: dict, opinions: List[dict]):
+        citation = self.canonical(citation)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO opinions VALUES (?, ?, ?, ?, ?, ?, ?)", self._row(citation, cluster, opinions))
+            self._conn.commit()
+
+    def put_many(self, items: Iterable[tuple]) -> int:
+        """Stores (citations, cluster, opinions) tuples in one transaction. The first citation holds the
+        row and the others become aliases of it. Returns the number of clusters stored."""
+        count = 0
+        with self._lock:
+            with self._conn:
+                for citations, cluster, opinions in items:
+                    canonical = normalize_citation(citations[0])
+                    self._conn.execute("INSERT OR REPLACE INTO opinions VALUES (?, ?, ?, ?, ?, ?, ?)", self._row(canonical, cluster, opinions))
+                    self._conn.execute("DELETE FROM citation_aliases WHERE citation = ?", (canonical,))
+                    aliases = [(a,) for a in dict.fromkeys(map(normalize_citation, citations[1:])) if a != canonical]
+                    # An alias may have been fetched on its own before; its row is superseded
+                    self._conn.executemany("DELETE FROM opinions WHERE citation = ?", aliases)
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO citation_aliases VALUES (?, ?)",
+                        [(alias, canonical) for alias, in aliases]
+                    )
+                    count += 1
+        return count
+
+    def canonical(self, citation: str) -> str:
+        citation = normalize_citation(citation)
+        with self._lock:
+            row = self._conn.execute("SELECT canonical FROM citation_aliases WHERE citation = ?", (citation,)).fetchone()
+        return row[0] if row else citation
+
+    def touch(self, citation: str):
+        citation = self.canonical(citation)
+        with self._lock:
+            self._conn.execute("UPDATE opinions SET fetched_at = ? WHERE citation = ?", (time.time(), citation))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# ----------- Fetch With Store -----------
+def fetch_opinions(
+    citation: str,
+    client: CourtListenerClient,
+    store: Optional[OpinionStore] = None,
+    revalidate_after: float = 30 * 24 * 3600,
+    cluster: Optional[dict] = None
+) -> tuple:
+    """Returns (cluster, opinions): every sub-opinion of the citation's cluster, majority first.
+
+    Sub-opinions are fetched concurrently; stored ones are served while fresh and revalidated with
+    conditional GETs once older than `revalidate_after`. A `cluster` already resolved (e.g. by
+    lookup_citations) skips the citation lookup.
+    """
+    stored = store.get(citation) if store is not None else None
+    entries = {}
+    if stored is not None:
+        cluster = stored["cluster"]
+        entries = {e["url"]: e for e in stored["opinions"]}
+    elif cluster is None:
+        results = client.lookup_citation(citation)
+        cluster = results[0]["clusters"][0]
+
+    urls = cluster.get("sub_opinions") or list(entries)
+    stale = stored is not None and time.time() - stored["fetched_at"] >= revalidate_after
+    todo = [url for url in urls if url not in entries or stale]
+    changed = False
+    revalidated = False
+    if todo:
+        results = client.get_many([
+            (url, entries[url]["etag"], entries[url]["last_modified"]) if url in entries else (url,)
+            for url in todo
+        ])
+        for url, result in zip(todo, results):
+            if isinstance(result, Exception):
+                if stored is None or not isinstance(result, requests.RequestException):
+                    raise result
+                # Offline or rate limited: the stored copies are still good; missing ones are retried next time
+                print(f"⚠️ Could not fetch {url}: {result}")
+                continue
+            opinion, etag, last_modified = result
+            if opinion is None:
+                revalidated = True
+                continue
+            entries[url] = {"url": url, "opinion": trim_opinion(opinion), "etag": etag, "last_modified": last_modified}
+            changed = True
+
+    if store is not None:
+        if changed:
+            store.put(citation, cluster, [entries[url] for url in urls if url in entries])
+        elif revalidated:
+            store.touch(citation)
+    if not entries:
+        raise ValueError(f"No opinions found for {citation}")
+    return cluster, order_opinions([entries[url]["opinion"] for url in urls if url in entries])
@@ -0,0 +1,149 @@
+# --- pdf_ingest.py (Memory-mapped, parallel PDF text extraction) ---
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional
+import multiprocessing
+import importlib.util
+import mmap
+import os
+
+PDF_MAGIC = b"%PDF-"
+
+
+def _import_pymupdf():
+    # PyMuPDF is optional: only PDF input needs it
+    try:
+        import pymupdf
+    except ImportError:
+        try:
+            import fitz as pymupdf
+        except ImportError:
+            raise RuntimeError("PDF input needs the optional 'pymupdf' package (pip install pymupdf)")
+    return pymupdf
+
+
+def pdf_support_available() -> bool:
+    # Checks for PyMuPDF without importing it, so callers can refuse PDF input up front
+    return any(importlib.util.find_spec(name) is not None for name in ("pymupdf", "fitz"))
+
+
+class MappedPdf:
+    """A PDF opened over a read-only memory map of the file.
+
+    MuPDF parses the cross-reference table up front and decodes page content only when a page is
+    loaded, so memory stays proportional to the pages being extracted rather than the file. Worker
+    processes map the same file and share its page cache.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            if os.fstat(self._file.fileno()).st_size < len(PDF_MAGIC):
+                raise ValueError(f"'{path}' is not a PDF")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        self._view = memoryview(self._map)
+        self.doc = None
+        try:
+            if self._map.find(PDF_MAGIC, 0, 1024) < 0:
+                raise ValueError(f"'{path}' is not a PDF")
+            pymupdf = _import_pymupdf()
+            self.doc = pymupdf.open(stream=self._view, filetype="pdf")
+            self._flags = (pymupdf.TEXTFLAGS_TEXT | pymupdf.TEXT_DEHYPHENATE) & ~pymupdf.TEXT_PRESERVE_LIGATURES
+        except Exception:
+            self.close()
+            raise
+        if self.doc.needs_pass:
+            self.close()
+            raise ValueError(f"'{path}' is encrypted")
+
+    @property
+    def page_count(self) -> int:
+        return self.doc.page_count
+
+    def page_text(self, index: int) -> str:
+        # "*N" is the star-page form preprocess() turns into a [Page N] marker
+        page = self.doc.load_page(index)
+        label = page.get_label()
+        number = label if label.isdigit() else str(index + 1)
+        return f"*{number}\n{page.get_text('text', flags=self._flags).strip()}"
+
+    def pages_text(self, start: int, stop: int) -> list:
+        return [self.page_text(i) for i in range(start, stop)]
+
+    def close(self):
+        if self.doc is not None:
+            self.doc.close()
+            self.doc = None
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ----------- Worker Processes -----------
+_worker_pdf: Optional[MappedPdf] = None
+
+
+def _open_in_worker(path: str):
+    global _worker_pdf
+    _worker_pdf = MappedPdf(path)
+
+
+def _extract_range(start: int, stop: int) -> list:
+    return _worker_pdf.pages_text(start, stop)
+
+
+def iter_pdf_pages(
+    path: str,
+    workers: Optional[int] = None,
+    batch_pages: int = 8,
+    parallel_min_pages: int = 64
+) -> Iterator[str]:
+    """Yields each page's text, in order, with a leading "*N" page marker.
+
+    Documents of at least `parallel_min_pages` pages are split into `batch_pages` ranges extracted by
+    `workers` processes (default: CPU count); at most two ranges per worker are in flight, so a
+    long opinion never sits in memory all at once. Shorter documents are extracted in-process,
+    where starting the workers would cost more than it saves.
+    """
+    workers = workers or os.cpu_count() or 1
+    with MappedPdf(path) as pdf:
+        count = pdf.page_count
+        if workers <= 1 or count < parallel_min_pages:
+            for i in range(count):
+                yield pdf.page_text(i)
+            return
+
+    ranges = [(start, min(start + batch_pages, count)) for start in range(0, count, batch_pages)]
+    # spawn, not fork: callers are usually multi-threaded
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(ranges)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_open_in_worker,
+        initargs=(path,)
+    ) as pool:
+        in_flight = []
+        pending = iter(ranges)
+        for start, stop in pending:
+            in_flight.append(pool.submit(_extract_range, start, stop))
+            if len(in_flight) >= 2 * workers:
+                break
+        while in_flight:
+            pages = in_flight.pop(0).result()
+            nxt = next(pending, None)
+            if nxt is not None:
+                in_flight.append(pool.submit(_extract_range, *nxt))
+            yield from pages
+
+
+def extract_pdf_text(path: str, workers: Optional[int] = None, parallel_min_pages: int = 64) -> str:
+    return "\n".join(iter_pdf_pages(path, workers, parallel_min_pages=parallel_min_pages))
@@ -0,0 +1,238 @@
+# --- pdf_render.py (ReportLab brief layout; imported only when a PDF is rendered) ---
+
+from functools import lru_cache
+from typing import BinaryIO, Union
+import os
+
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, Flowable, HRFlowable
+from reportlab.lib.utils import ImageReader
+from reportlab import rl_config
+from PIL import Image as PILImage
+from reportlab.lib.pagesizes import LETTER
+from reportlab.lib.units import inch
+from reportlab.lib import colors
+
+
+# Built once per process and shared by every brief rendered in it
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logo_transparent.png')
+LOGO_DPI = 200
+
+# Write image streams as binary: pure-Python ASCII85 encoding of the logo dominated render time
+rl_config.useA85 = 0
+
+
+@lru_cache(maxsize=None)
+def get_pdf_styles():
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(
+        name="LegalBodyText",
+        parent=styles["Normal"],
+        fontName="Times-Roman",
+        fontSize=11,
+        leading=14,
+        spaceAfter=6
+    ))
+    styles.add(ParagraphStyle(
+        name="CoverMeta",
+        parent=styles["Normal"],
+        fontName="Times-Roman",
+        fontSize=14,
+        leading=18,
+        alignment=1            
+    ))
+    styles.add(ParagraphStyle(
+        name="CoverMetaHeading",
+        parent=styles["Heading3"],
+        fontName="Times-Bold",
+        fontSize=20,
+        spaceAfter=6,
+        textColor=colors.HexColor("#800020"),
+        alignment=1
+    ))
+    styles.add(ParagraphStyle(
+        name="BriefHeading",
+        parent=styles["Heading3"],
+        fontName="Times-Bold",
+        fontSize=13,
+        spaceAfter=6,
+        textColor="navy"
+    ))
+    styles.add(ParagraphStyle(
+        name="TitleText",
+        parent=styles["Normal"],
+        fontName="Times-Bold",
+        fontSize=20,
+        leading=24,
+        textColor=colors.HexColor("#800020"),
+        spaceAfter=10,
+        alignment=1
+    ))
+    styles.add(ParagraphStyle(
+        name="DisclosureText",
+        parent=styles["Normal"],
+        fontName="Times-Italic",
+        fontSize=9,
+        leading=12,
+        textColor=colors.grey,
+        spaceBefore=12,
+        spaceAfter=12
+    ))
+    return styles
+
+
+@lru_cache(maxsize=None)
+def get_logo(height: float) -> tuple:
+    # (ImageReader, draw width, draw height) for the logo drawn `height` points tall,
+    # decoded once and downscaled to LOGO_DPI so each PDF embeds a small image
+    with PILImage.open(LOGO_PATH) as im:
+        im.load()
+        orig_w, orig_h = im.size
+        draw_w = orig_w * (height / orig_h)
+        target_h = int(height / inch * LOGO_DPI)
+        if target_h < orig_h:
+            im = im.resize((max(1, round(orig_w * target_h / orig_h)), target_h), PILImage.LANCZOS)
+        return ImageReader(im.copy()), draw_w, height
+
+
+class CachedImage(Flowable):
+    # Draws a pre-decoded ImageReader; platypus' Image re-reads its source file for every document
+    def __init__(self, reader: ImageReader, width: float, height: float, hAlign: str = "CENTER"):
+        super().__init__()
+        self.reader = reader
+        self.width = width
+        self.height = height
+        self.hAlign = hAlign
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        self.canv.drawImage(self.reader, 0, 0, width=self.width, height=self.height, mask='auto')
+
+
+def build_cover_page(brief: dict, styles: dict):
+    elems = []
+    # Centered logo
+    reader, cover_w, cover_h = get_logo(2 * inch)
+    logo = CachedImage(reader, cover_w, cover_h, hAlign="CENTER")
+    elems.append(Spacer(1, 1.35 * inch))
+    elems.append(logo)
+    elems.append(Spacer(1, 0.5 * inch))
+
+    # Case Title
+    case_name = brief.get("Case Name", "Unknown Case")
+    date_filed = brief.get("Date Filed", "Unknown Date")
+    year = date_filed.split("-")[0] if "-" in date_filed else date_filed
+    title = f"{case_name} ({year})"
+    elems.append(Paragraph(title, styles["TitleText"]))
+    elems.append(Spacer(1, 0.2 * inch))
+    elems.append(Paragraph("– CASE BRIEF –", styles["CoverMetaHeading"]))
+    elems.append(Spacer(1, 0.5 * inch))
+
+    # Docket & Date
+    elems.append(Paragraph(f"Citation: {brief.get('Citation', '—')}", styles["CoverMeta"]))       
+    elems.append(Paragraph(f"Docket No.: {brief.get('Docket Number', '—')}", styles["CoverMeta"]))  
+    elems.append(Paragraph(f"Date Filed: {brief.get('Date Filed', 'Unknown Date')}", styles["CoverMeta"]))
+
+    # Final rule line
+    elems.append(Spacer(1, 0.5 * inch))
+    elems.append(HRFlowable(
+        width="85%",
+        thickness=4,
+        lineCap="round",
+        color=colors.HexColor("#800020"),
+        spaceBefore=12, spaceAfter=24
+    ))
+
+    # Push main brief to page 2
+    elems.append(PageBreak())
+    return elems
+
+def _draw_header(canvas, doc):
+    canvas.saveState()
+    page_w, page_h = doc.pagesize
+
+    # cached logo, scaled to 0.85" tall
+    reader, w, h = get_logo(0.85 * inch)
+
+    # fixed 0.25" margin
+    margin = 0.25 * inch
+
+    # bottom-left of logo at (margin, page_h – margin – logo_height)
+    x = margin
+    y = page_h - margin - h
+
+    canvas.drawImage(reader, x, y, width=w, height=h, mask='auto')
+    canvas.restoreState()
+
+
+def warm():
+    # Builds the shared styles and logos ahead of the first render
+    get_pdf_styles()
+    get_logo(2 * inch)
+    get_logo(0.85 * inch)
+
+
+def write_pdf(brief: dict, out: Union[str, BinaryIO], timestamp: str):
+    # `out` is a path or a binary file-like object; `timestamp` goes in the generation note
+    doc = SimpleDocTemplate(
+        out,
+        pagesize=LETTER,
+        leftMargin=1 * inch,
+        rightMargin=1 * inch,
+        topMargin=1 * inch,
+        bottomMargin=1 * inch,
+        title="LexEmetica Case Brief"
+    )
+
+    styles = get_pdf_styles()
+
+    elements = []
+    # 1) Cover Page
+    elements.extend(build_cover_page(
+        brief=brief,
+        styles=styles
+    ))
+
+    # --- Generate and Add Title ---
+    case_title = brief.get("Case Name", "Unknown Case")
+    case_year = brief.get("Date Filed", "Unknown Date").split("-")[0]
+    title_text = f"{case_title} ({case_year}) – Case Brief"
+    elements.append(Paragraph(title_text, styles["TitleText"]))
+
+    # Horizontal rule under title
+    elements.append(HRFlowable(
+        width="85%",
+        thickness=2,
+        lineCap='round',
+        color=colors.HexColor("#800020"),
+        spaceBefore=4,
+        spaceAfter=20
+    ))
+
+    # --- Main Brief Content ---
+    for section, content in brief.items():
+        elements.append(Paragraph(f"<b>{section}:</b>", styles["BriefHeading"]))
+        elements.append(Paragraph(content.replace('\n', '<br/>'), styles["LegalBodyText"]))
+
+    # --- Footer with Timestamp & Disclosure ---
+    disclosure_full = (
+        f"Generated using LexEmetica Clerk on {timestamp}<br/><br/>"
+        "<b>Disclosure:</b><br/>"
+        "This brief was generated with the assistance of an AI system trained to summarize legal opinions based on the provided court text. "
+        "While efforts have been made to ensure accuracy, this document may contain errors, omissions, or hallucinated content.<br/><br/>"
+        "Users must not rely solely on this brief for legal decision-making, academic work, or court preparation. "
+        "Always cross-check information against the original court opinion and consult with a licensed attorney if applicable.<br/><br/>"
+        "Use of this tool is at your own risk. No liability is assumed by the developer or contributors for any inaccuracies."
+        "<br/><br/>© 2025 LexEmetica Clerk. All rights reserved.<br/>"
+        "Unauthorized copying, reproduction, or distribution of this material, in whole or in part, without the prior written consent of LexEmetica Clerk is strictly prohibited."
+    )
+    elements.append(Spacer(1, 0.5 * inch))
+    elements.append(Paragraph(disclosure_full, styles["DisclosureText"]))
+
+    doc.build(
+      elements,
+      onFirstPage=lambda c, d: None,  # no header on cover
+      onLaterPages=_draw_header      # header starting with page 2
+    )
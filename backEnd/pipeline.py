@@ -1,25 +1,53 @@
-from dotenv import load_dotenv
+from envfile import load_env_file
 # Load environment
-load_dotenv()
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, Image, HRFlowable
-from reportlab.lib.utils import ImageReader
-from reportlab.lib.pagesizes import LETTER
-from reportlab.lib.units import inch
-from tzlocal import get_localzone
-from reportlab.lib import colors
+load_env_file()
+import sys
+if __name__ == "__main__":
+    # With a daemon listening (python daemon.py), the CLI is a thin client: the command runs in the
+    # warm daemon and nothing below is imported here
+    import daemon
+    _exit_code = daemon.run_remote(sys.argv[1:])
+    if _exit_code is not None:
+        raise SystemExit(_exit_code)
 from datetime import datetime
-from typing import Optional, List
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from functools import lru_cache
+from typing import BinaryIO, Callable, Optional, List, Union
+import multiprocessing
+import contextvars
 import argparse
-import requests
+import threading
+import zipfile
+import hashlib
+import time
 import json
+import uuid
+import sqlite3
+import io
 import os
 import re
 
+from brief_cache import BriefCache, make_cache_key
+from brief_index import BriefIndex
+from opinion_store import CourtListenerClient, OpinionStore, fetch_opinions, opinion_author, opinion_kind
+from llm_client import OllamaRouter
+from compaction import TokenCounter, compact_opinion
+from pdf_ingest import extract_pdf_text
+from retrieval import PassageIndex, split_passages
+import metrics
+
+
 
+# Model and prompt identity; bump PROMPT_VERSION whenever the prompt changes so cached briefs are invalidated
+MODEL_NAME = "mixtral"
+PROMPT_VERSION = "4"
+# Bump when the extraction prompt or schema changes so cached extractions are invalidated
+EXTRACTION_VERSION = "2"
 
-# Global case metadata initialization
-case_metadata = {
+# Default case metadata, copied into each request's CaseContext
+DEFAULT_CASE_METADATA = {
     "case_name": "Sample Case",
     "citation": "Sample Citation",
     "date": "Unknown Date",
@@ -30,70 +58,97 @@ case_metadata = {
     "disposition": "..."
 }
 
-def build_cover_page(brief: dict, styles: dict, logo_path: str):
-    elems = []
-    # Centered logo
-    img = ImageReader(logo_path)
-    orig_w, orig_h = img.getSize()
-    cover_h = 2 * inch
-    cover_w = orig_w * (cover_h / orig_h)
-    logo = Image(logo_path, width=cover_w, height=cover_h)
-    logo.hAlign = "CENTER"
-    elems.append(Spacer(1, 1.35 * inch))
-    elems.append(logo)
-    elems.append(Spacer(1, 0.5 * inch))
-
-    # Case Title
-    case_name = brief.get("Case Name", "Unknown Case")
-    date_filed = brief.get("Date Filed", "Unknown Date")
-    year = date_filed.split("-")[0] if "-" in date_filed else date_filed
-    title = f"{case_name} ({year})"
-    elems.append(Paragraph(title, styles["TitleText"]))
-    elems.append(Spacer(1, 0.2 * inch))
-    elems.append(Paragraph("– CASE BRIEF –", styles["CoverMetaHeading"]))
-    elems.append(Spacer(1, 0.5 * inch))
-
-    # Docket & Date
-    elems.append(Paragraph(f"Citation: {brief.get('Citation', '—')}", styles["CoverMeta"]))       
-    elems.append(Paragraph(f"Docket No.: {brief.get('Docket Number', '—')}", styles["CoverMeta"]))  
-    elems.append(Paragraph(f"Date Filed: {brief.get('Date Filed', 'Unknown Date')}", styles["CoverMeta"]))
-
-    # Final rule line
-    elems.append(Spacer(1, 0.5 * inch))
-    elems.append(HRFlowable(
-        width="85%",
-        thickness=4,
-        lineCap="round",
-        color=colors.HexColor("#800020"),
-        spaceBefore=12, spaceAfter=24
-    ))
-
-    # Push main brief to page 2
-    elems.append(PageBreak())
-    return elems
-
-def _draw_header(canvas, doc):
-    canvas.saveState()
-    page_w, page_h = doc.pagesize
-
-    # load your logo…
-    logo_path = os.path.join(os.path.dirname(__file__), 'logo_transparent.png')
-    img = ImageReader(logo_path)
-    orig_w, orig_h = img.getSize()
-
-    # scale logo to 0.9" tall
-    h = 0.85 * inch
-    w = orig_w * (h / orig_h)
-
-    # fixed 0.25" margin
-    margin = 0.25 * inch
-
-    # bottom-left of logo at (margin, page_h – margin – logo_height)
-    x = margin
-    y = page_h - margin - h
-
-    canvas.drawImage(logo_path, x, y, width=w, height=h, mask='auto')
-    canvas.restoreState()
+
+# ----------- Case Context -----------
+@dataclass
+class CaseContext:
+    # Everything one brief needs, passed explicitly so briefs can run concurrently
+    metadata: dict = field(default_factory=lambda: dict(DEFAULT_CASE_METADATA))
+    cleaned_text: str = ""
+    sections: dict = field(default_factory=dict)
+    brief: dict = field(default_factory=dict)
+    timings: dict = field(default_factory=dict)
+    # (stage, start offset, seconds) in the order stages finished, and one record per model request
+    spans: list = field(default_factory=list)
+    llm_calls: list = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+    cache_hit: bool = False
+    compaction: dict = field(default_factory=dict)
+    # Mode-independent structured extraction (two-stage pipeline), reused by every mode's styling pass
+    extraction: Optional[dict] = None
+    # BM25 index over the opinion's passages, built once for per-section retrieval
+    passages: Optional[PassageIndex] = None
+    # Optional progress hook called with (section, content) as each section is generated
+    on_section: Optional[Callable[[str, str], None]] = None
+
+    @contextmanager
+    def timed(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[stage] = self.timings.get(stage, 0.0) + elapsed
+            self.spans.append({"stage": stage, "start": round(start - self.started, 4), "seconds": round(elapsed, 4)})
+            metrics.STAGE_SECONDS.observe(elapsed, stage=stage)
+
+
+# The CaseContext of the brief running in this thread, so LLM calls deep in the pipeline can record into it
+_active_ctx = contextvars.ContextVar("lex_active_ctx", default=None)
+
+
+@contextmanager
+def active_context(ctx: CaseContext):
+    token = _active_ctx.set(ctx)
+    try:
+        yield ctx
+    finally:
+        _active_ctx.reset(token)
+
+
+@contextmanager
+def stage_span(stage: str):
+    # Times a stage into the active brief's context, or straight into the metrics when there is none
+    ctx = _active_ctx.get()
+    if ctx is not None:
+        with ctx.timed(stage):
+            yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def submit_in_context(executor, fn, *args):
+    # Executor threads don't inherit context variables; carry the active brief across
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def debug_llm_enabled() -> bool:
+    return os.getenv("LEX_DEBUG_LLM", "0").lower() in ("1", "true", "yes")
+
+
+def _record_llm_call(kind: str, result, seconds: float):
+    metrics.LLM_REQUEST_SECONDS.observe(seconds, kind=kind)
+    ctx = _active_ctx.get()
+    if ctx is not None:
+        ctx.llm_calls.append({
+            "kind": kind,
+            "backend": result.backend,
+            "seconds": round(seconds, 4),
+            "prompt_tokens": result.prompt_eval_count,
+            "output_tokens": result.eval_count,
+            "tokens_per_second": round(result.tokens_per_second, 2),
+            "load_seconds": round(result.load_duration / 1e9, 4),
+            "done_reason": result.done_reason,
+            "stopped_early": result.stopped_early,
+        })
+    if debug_llm_enabled():
+        print(f"DEBUG RAW RESPONSE ({kind}):")
+        print(result.response)
+
 
 def make_unique_path(path: str) -> str:
     base, ext = os.path.splitext(path)
@@ -105,33 +160,15 @@ def make_unique_path(path: str) -> str:
     return new_path
 
 # ----------- Mixtral Integration -----------
-def generate_case_sections_with_mixtral(
-    text: str,
-    mode: str = "professional",
-    case_name: str = "",
-    citation: str = "",
-    temperature: float = 0.3,
-    max_tokens: int = 1500,
-    stop: Optional[List[str]] = None,
-    _retry: bool = False
-) -> dict:
-    if mode == "student":
-        detail_instructions = (
-            "Use clear, accessible legal language and explain each section in 4–6 sentences. "
-            "Include examples or analogies where helpful to aid comprehension."
-        )
-    else:
-        detail_instructions = (
-            "Use formal, detailed legal writing. Provide 3–5 sentences per section using precise legal terminology, "
-            "with references to relevant facts, doctrines, or precedent when appropriate."
-        )
+SECTION_KEYS = ["Disposition", "Rule of Law", "Facts", "Issue", "Holding & Reasoning", "Dissent"]
+PAGE_MARKER_RE = re.compile(r"\[Page (\d+)\]")
 
-    prompt = f"""
-You are LexEmetica Clerk, a legal writing assistant.
 
-The following is the full text of the U.S. Supreme Court opinion in **{case_name}, {citation}**, a real and specific legal case.
+# Identical for every brief and placed first, so Ollama can reuse the KV cache for this prefix across requests
+BRIEF_PROMPT_PREFIX = """
+You are LexEmetica Clerk, a legal writing assistant.
 
-Analyze *only* this opinion and extract the following six sections using professional legal language. Refer to the actual events, rulings, and reasoning in this case only:
+You will be given the text of a U.S. Supreme Court opinion, a real and specific legal case. Analyze *only* that opinion and extract the following six sections using professional legal language. Refer to the actual events, rulings, and reasoning in that case only:
 
 - Disposition
 - Rule of Law
@@ -142,16 +179,16 @@ Analyze *only* this opinion and extract the following six sections using profess
 
 Each section should be explained in detail (minimum 3–5 sentences). Respond in JSON format like:
 
-{{
+{
     "Disposition": "...",
     "Rule of Law": "...",
     "Facts": "...",
     "Issue": "...",
     "Holding & Reasoning": "...",
     "Dissent": "..."
-}}
+}
 
-🛡️ Before returning your final answer, carefully verify the accuracy of each section based strictly on the court opinion provided above. Do not rely on general legal knowledge or assumptions.
+🛡️ Before returning your final answer, carefully verify the accuracy of each section based strictly on the court opinion provided below. Do not rely on general legal knowledge or assumptions.
 
 Perform the following quality checks before submitting your response:
 
@@ -166,79 +203,643 @@ Perform the following quality checks before submitting your response:
 - ✅ If any section fails verification, **rewrite only that section** to eliminate the issue.
 
 📚 After each section, include a parenthetical indicating the page number from the opinion text, such as (Page 440), to help the reader locate the source.
+"""
+
+
+def mode_instructions(mode: str) -> str:
+    if mode == "student":
+        return (
+            "Use clear, accessible legal language and explain each section in 4–6 sentences. "
+            "Include examples or analogies where helpful to aid comprehension."
+        )
+    return (
+        "Use formal, detailed legal writing. Provide 3–5 sentences per section using precise legal terminology, "
+        "with references to relevant facts, doctrines, or precedent when appropriate."
+    )
+
+
+def build_brief_prompt(text: str, mode: str, case_name: str, citation: str, from_notes: bool = False) -> str:
+    if from_notes:
+        source_intro = (
+            f"The following are page-cited reading notes taken, in order, from every part of the U.S. Supreme Court opinion "
+            f"in **{case_name}, {citation}**. Treat them as the opinion text."
+        )
+        source_heading = "Opinion Notes (by page range):"
+    else:
+        source_intro = f"The following is the full text of the U.S. Supreme Court opinion in **{case_name}, {citation}**."
+        source_heading = "Court Opinion:"
+
+    prompt = f"""{BRIEF_PROMPT_PREFIX}
+{mode_instructions(mode)}
+
+{source_intro}
 
 All content must remain strictly specific to **{case_name}**, {citation}.
 
-Court Opinion:
+{source_heading}
 {text}
 """
 
+    return prompt
+
+
+class SectionStreamParser:
+    # Incrementally parses the model's JSON object, reporting each "key": value pair as soon as it closes.
+    # Pairs that closed before a truncation or a malformed tail are kept; raw newlines inside strings are accepted.
+    _decoder = json.JSONDecoder(strict=False)
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.started = False
+        self.complete = False
+        self.sections = {}
+
+    def feed(self, chunk: str) -> list:
+        self.buffer += chunk
+        completed = []
+        while not self.complete:
+            if not self.started:
+                start = self.buffer.find("{", self.pos)
+                if start == -1:
+                    self.pos = len(self.buffer)
+                    break
+                self.pos = start + 1
+                self.started = True
+                continue
+
+            # Skip whitespace and separators between members
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n,":
+                self.pos += 1
+            if self.pos >= len(self.buffer):
+                break
+            if self.buffer[self.pos] == "}":
+                self.pos += 1
+                self.complete = True
+                break
+
+            if self.buffer[self.pos] != '"' and not self.sections:
+                # A stray brace in a preamble rather than the object itself; look for the next "{"
+                self.started = False
+                continue
+
+            pair = self._parse_member(self.pos)
+            if pair is None:
+                break
+            key, value, self.pos = pair
+            self.sections[key] = value
+            completed.append((key, value))
+        return completed
+
+    def _parse_member(self, pos: int):
+        # Returns (key, value, end) or None when the member is still incomplete
+        try:
+            key, pos = self._decoder.raw_decode(self.buffer, pos)
+        except json.JSONDecodeError:
+            return None
+        colon = self.buffer.find(":", pos)
+        if colon == -1:
+            return None
+        pos = colon + 1
+        while pos < len(self.buffer) and self.buffer[pos] in " \t\r\n":
+            pos += 1
+        if pos >= len(self.buffer):
+            return None
+        try:
+            value, end = self._decoder.raw_decode(self.buffer, pos)
+        except json.JSONDecodeError:
+            return None
+        # A bare number/literal may still be growing until a delimiter arrives
+        if not isinstance(value, (str, list, dict)):
+            rest = self.buffer[end:].lstrip()
+            if not rest or rest[0] not in ",}":
+                return None
+        return key, value, end
+
+
+def parse_sections(text: str, max_attempts: int = 20) -> dict:
+    # One-shot tolerant parse: tries each "{" in turn (skipping stray braces in any preamble)
+    # and keeps the attempt that recovers the most sections
+    best = {}
+    start = text.find("{")
+    while start != -1 and max_attempts > 0:
+        parser = SectionStreamParser()
+        parser.feed(text[start:])
+        if len(parser.sections) > len(best):
+            best = parser.sections
+        if parser.complete:
+            break
+        start = text.find("{", start + 1)
+        max_attempts -= 1
+    return best
+
+
+def sections_format(keys: List[str], schema: Optional[dict] = None):
+    # Ollama "format": a JSON schema for the requested keys (default), plain "json" for older Ollama builds, or none
+    fmt = os.getenv("LEX_OLLAMA_FORMAT", "schema").lower()
+    if fmt == "schema":
+        return schema or {
+            "type": "object",
+            "properties": {key: {"type": "string"} for key in keys},
+            "required": list(keys),
+        }
+    if fmt == "json":
+        return "json"
+    return None
+
+
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+
+def get_llm_client() -> OllamaRouter:
+    # One warm, pooled router per process; LEX_OLLAMA_URLS lists the backends, OLLAMA_HOST is the single-host fallback
+    global _llm_client
+    with _llm_client_lock:
+        if _llm_client is None:
+            num_ctx = os.getenv("LEX_OLLAMA_NUM_CTX")
+            urls = os.getenv("LEX_OLLAMA_URLS") or os.getenv("OLLAMA_HOST", "http://localhost:11434")
+            _llm_client = OllamaRouter(
+                [url for url in urls.split(",") if url.strip()],
+                model=MODEL_NAME,
+                keep_alive=os.getenv("LEX_OLLAMA_KEEP_ALIVE", "30m"),
+                num_ctx=int(num_ctx) if num_ctx else None,
+                pool_size=int(os.getenv("LEX_OLLAMA_POOL_SIZE", "8")),
+                eject_after=int(os.getenv("LEX_OLLAMA_EJECT_AFTER", "2")),
+                health_interval=float(os.getenv("LEX_OLLAMA_HEALTH_INTERVAL", "10"))
+            )
+        return _llm_client
+
+
+def preload_model():
+    try:
+        seconds = get_llm_client().preload()
+        print(f"🔥 {MODEL_NAME} loaded in {seconds:.1f}s")
+    except Exception as e:
+        print(f"⚠️ Could not preload {MODEL_NAME}: {e}")
+
+
+def _collect_llm_metrics():
+    # Mirrors the router's running totals into the metrics at scrape time
+    if _llm_client is None:
+        return
+    stats = _llm_client.stats()
+    metrics.LLM_RETRIES.set_total(stats["retries"])
+    for b in stats["backends"]:
+        url = b["url"]
+        metrics.LLM_CALLS.set_total(b["calls"], backend=url)
+        metrics.LLM_ERRORS.set_total(b["errors"], backend=url)
+        metrics.LLM_TOKENS.set_total(b["prompt_eval_count"], backend=url, kind="prompt")
+        metrics.LLM_TOKENS.set_total(b["eval_count"], backend=url, kind="output")
+        metrics.LLM_STOPPED_EARLY.set_total(b["stopped_early"], backend=url)
+        for phase, key in (("load", "load_duration"), ("prompt", "prompt_eval_duration"), ("eval", "eval_duration")):
+            metrics.LLM_SECONDS.set_total(b[key] / 1e9, backend=url, phase=phase)
+        metrics.LLM_BACKEND_UP.set(1 if b["healthy"] else 0, backend=url)
+        metrics.LLM_OUTSTANDING.set(b["outstanding"], backend=url)
+
+
+metrics.REGISTRY.add_collector(_collect_llm_metrics)
+
+
+def _request_generation(prompt: str, temperature: float, max_tokens: int, stop: Optional[List[str]] = None) -> str:
+    # Free-text generation (chunk notes)
+    started = time.perf_counter()
+    result = get_llm_client().generate(prompt, temperature, max_tokens, stop)
+    _record_llm_call("text", result, time.perf_counter() - started)
+    print(f"📊 Mixtral: {result.summary()}")
+    return result.response
+
+
+def _request_sections(
+    prompt: str,
+    keys: List[str],
+    temperature: float,
+    max_tokens: int,
+    stop: Optional[List[str]] = None,
+    on_section: Optional[Callable[[str, str], None]] = None,
+    schema: Optional[dict] = None,
+    kind: str = "sections"
+) -> dict:
+    # Streams a schema-constrained JSON object, reports each section the moment its value closes,
+    # and hangs up as soon as every requested key has closed
+    parser = SectionStreamParser()
+
+    def on_token(token: str) -> bool:
+        for key, value in parser.feed(token):
+            if on_section is not None:
+                on_section(key, value)
+        return parser.complete or all(key in parser.sections for key in keys)
+
+    started = time.perf_counter()
+    result = get_llm_client().generate(
+        prompt, temperature, max_tokens, stop, on_token=on_token, format=sections_format(keys, schema)
+    )
+    _record_llm_call(kind, result, time.perf_counter() - started)
+    print(f"📊 Mixtral: {result.summary()}" + (" (stopped after the last section)" if result.stopped_early else ""))
+    sections = parser.sections or parse_sections(result.response)
+    if not sections:
+        print(f"⚠️ No sections recovered from {len(result.response)} characters of output (set LEX_DEBUG_LLM=1 to dump it)")
+    elif result.done_reason == "length":
+        missing = [key for key in keys if key not in sections]
+        print(f"⚠️ Output hit max_tokens; recovered {len(sections)} section(s), missing: {', '.join(missing) or 'none'}")
+    return sections
+
+
+# ----------- Section Validation -----------
+# Descriptions used when a single section has to be regenerated on its own
+SECTION_GUIDANCE = {
+    "Disposition": "the final outcome of the case (affirmed, reversed, remanded, etc.) and the vote if stated",
+    "Rule of Law": "the legal rule or principle the Court applied or announced",
+    "Facts": "the relevant facts and procedural history that led to this case",
+    "Issue": "the legal question(s) the Court had to decide",
+    "Holding & Reasoning": "the Court's answer to the issue and the reasoning the majority gave for it",
+    "Dissent": "the dissenting opinion(s), naming the dissenting justices, or a statement that there was no dissent",
+}
+
+PAGE_CITE_RE = re.compile(r"\(Pages?\s+\d+")
+# The source is page-anchored: opinion text with [Page N] markers, or map-step notes under [Pages a–b] headers
+PAGE_SOURCE_RE = re.compile(r"\[Pages? (?:up to )?\d+")
+CASE_CITE_RE = re.compile(r"\b([A-Z][\w'&-]*)\s+v\.\s+([A-Z][\w'&-]*)")
+NO_DISSENT_RE = re.compile(r"\bno (?:dissent|dissenting)", re.IGNORECASE)
+
+_section_stats_lock = threading.Lock()
+SECTION_STATS = {
+    "validated": {k: 0 for k in SECTION_KEYS},
+    "failed": {},           # "Section:reason" -> count on first validation
+    "regenerated": {k: 0 for k in SECTION_KEYS},
+    "recovered": {k: 0 for k in SECTION_KEYS},
+    "unrecovered": {k: 0 for k in SECTION_KEYS},
+}
+
+
+def _record_section_stat(kind: str, key: str):
+    with _section_stats_lock:
+        counts = SECTION_STATS[kind]
+        counts[key] = counts.get(key, 0) + 1
+    section, _, reason = key.partition(":")
+    metrics.SECTION_EVENTS.inc(event=kind, section=section, reason=reason)
+
+
+def get_section_stats() -> dict:
+    with _section_stats_lock:
+        return {kind: dict(counts) for kind, counts in SECTION_STATS.items()}
+
+
+def _party_keywords(case_name: str) -> list:
+    # First significant word of each party, e.g. "Miranda v. Arizona" -> ["miranda", "arizona"]
+    keywords = []
+    for party in re.split(r"\s+v\.?\s+", case_name.lower()):
+        words = [w for w in re.findall(r"[a-z][a-z'-]+", party) if w not in ("the", "in", "re", "of", "ex", "parte", "united", "states")]
+        if words:
+            keywords.append(words[0])
+    if not keywords and case_name.split():
+        keywords.append(case_name.lower().split()[0])
+    return keywords
+
+
+def validate_section(section: str, content, case_name: str, source_text: str) -> list:
+    # Returns the reasons this section fails; an empty list means it passed
+    if not isinstance(content, str) or not content.strip() or content.strip() in ("...", "N/A"):
+        return ["empty"]
+    reasons = []
+    source_lower = source_text.lower()
+    no_dissent = section == "Dissent" and NO_DISSENT_RE.search(content)
+    if PAGE_SOURCE_RE.search(source_text) and not PAGE_CITE_RE.search(content) and not no_dissent:
+        reasons.append("missing_page")
+    allowed = source_lower + " " + case_name.lower()
+    for m in CASE_CITE_RE.finditer(content):
+        if m.group(1).lower() not in allowed or m.group(2).lower() not in allowed:
+            reasons.append(f"unknown_entity:{m.group(0)}")
+            break
+    return reasons
+
+
+def validate_sections(sections: dict, case_name: str, source_text: str) -> dict:
+    # {section: [reasons]} for every failing section
+    failures = {}
+    for key in SECTION_KEYS:
+        reasons = validate_section(key, sections.get(key), case_name, source_text)
+        if reasons:
+            failures[key] = reasons
+    return failures
+
+
+def names_parties(sections: dict, case_name: str) -> bool:
+    # Brief-wide check from the original prompt guard: the case itself must be named somewhere.
+    # Skipped when no case name was supplied (an upload without one keeps the placeholder name)
+    if case_name.strip() in ("", DEFAULT_CASE_METADATA["case_name"]):
+        return True
+    keywords = _party_keywords(case_name)
+    combined = " ".join(str(v) for v in sections.values()).lower()
+    return not keywords or any(k in combined for k in keywords)
+
+
+def retry_unless_parties_named(generate: Callable[[], dict], case_name: str) -> Optional[dict]:
+    # A draft that never names either party is regenerated once, as the original guard did;
+    # None when the retry doesn't name them either, which fails the whole brief
+    brief_data = generate()
+    if names_parties(brief_data, case_name):
+        return brief_data
+    _record_section_stat("failed", "Brief:missing_case_name")
+    print("⚠️ No section names the parties in this case. Retrying once...")
+    _record_section_stat("regenerated", "Brief")
+    brief_data = generate()
+    if names_parties(brief_data, case_name):
+        _record_section_stat("recovered", "Brief")
+        return brief_data
+    print("❌ Second attempt also failed: hallucination still detected.")
+    _record_section_stat("unrecovered", "Brief")
+    return None
+
+
+def _describe_failure(reason: str) -> str:
+    if reason == "empty":
+        return "it was empty"
+    if reason == "missing_page":
+        return "it did not cite a page of the opinion, such as (Page 440)"
+    if reason.startswith("unknown_entity:"):
+        return f"it named a case that does not appear in the opinion ({reason.split(':', 1)[1]})"
+    return reason
+
+
+def build_section_prompt(
+    section: str,
+    reasons: list,
+    text: str,
+    mode: str,
+    case_name: str,
+    citation: str,
+    from_notes: bool = False,
+    from_passages: bool = False
+) -> str:
+    # With no reasons this is a first draft (per-section retrieval) rather than a regeneration
+    style = "clear, accessible legal language (4–6 sentences)" if mode == "student" else "formal, precise legal writing (3–5 sentences)"
+    rejected = ""
+    if reasons:
+        rejected = f"\nA previous draft of this section was rejected because {'; '.join(_describe_failure(r) for r in reasons)}."
+    if from_notes:
+        source_heading = "Opinion Notes (by page range):"
+    elif from_passages:
+        source_heading = "Passages from the opinion (the most relevant ones, in page order, each starting with its page):"
+    else:
+        source_heading = "Court Opinion:"
+    return f"""
+You are LexEmetica Clerk, a legal writing assistant.
+
+Write only the "{section}" section of a case brief for **{case_name}, {citation}**: {SECTION_GUIDANCE[section]}.{rejected}
+
+Use {style}. Use only names, cases and facts that appear in the text below, and end with the page it comes from, such as (Page 440).
+Respond in JSON format like: {{"{section}": "..."}}
+
+{source_heading}
+{text}
+"""
+
+
+def regenerate_section(
+    section: str,
+    reasons: list,
+    text: str,
+    mode: str,
+    case_name: str,
+    citation: str,
+    temperature: float,
+    max_tokens: int,
+    stop: Optional[List[str]],
+    from_notes: bool = False,
+    from_passages: bool = False
+) -> Optional[str]:
+    prompt = build_section_prompt(section, reasons, text, mode, case_name, citation, from_notes, from_passages)
+    try:
+        value = _request_sections(prompt, [section], temperature, max_tokens, stop, kind="regenerate").get(section)
+        return value if isinstance(value, str) else None
+    except Exception as e:
+        print(f"Error regenerating {section}: {e}")
+        return None
+
+
+def generate_case_sections_with_mixtral(
+    text: str,
+    mode: str = "professional",
+    case_name: str = "",
+    citation: str = "",
+    temperature: float = 0.3,
+    max_tokens: int = 1500,
+    stop: Optional[List[str]] = None,
+    on_section: Optional[Callable[[str, str], None]] = None,
+    from_notes: bool = False,
+    section_sources: Optional[dict] = None
+) -> dict:
+    prompt = build_brief_prompt(text, mode, case_name, citation, from_notes)
+
+    def generate() -> dict:
+        brief_data = _request_sections(prompt, SECTION_KEYS, temperature, max_tokens, stop, on_section)
+        if not brief_data:
+            raise ValueError("No JSON object found in model response.")
+        return brief_data
+
     try:
         print("⏳ Generating case brief using Mixtral... (this may take a while)")
-        payload = {
-            "model": "mixtral",
-            "prompt": prompt,
-            "stream": False,
-            "temperature": temperature,
-            "max_tokens": max_tokens,
-        }
-        if stop is not None:
-            payload["stop"] = stop
+        brief_data = retry_unless_parties_named(generate, case_name)
+    except Exception as e:
+        print(f"Error generating brief: {e}")
+        return {k: "[ERROR]" for k in SECTION_KEYS}
+    if brief_data is None:
+        return {k: "[ERROR: hallucination]" for k in SECTION_KEYS}
+
+    return repair_sections(
+        brief_data, text, mode, case_name, citation, temperature, max_tokens, stop, on_section, from_notes, section_sources
+    )
 
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json=payload
-        )
-        print("DEBUG RAW RESPONSE:")
-        print(response.text)
-
-        result_str = response.json().get("response", "")
-        match = re.search(r"\{.*\}", result_str, re.DOTALL)
-
-        if match:
-            brief_data = json.loads(match.group(0))
-
-            combined_text = " ".join(brief_data.values()).lower()
-            case_name_keyword = case_name.lower().split()[0]
-
-            if case_name_keyword not in combined_text:
-                if not _retry:
-                    print("⚠️ Hallucination detected on first try. Retrying with stricter prompt...")
-                    return generate_case_sections_with_mixtral(
-                        text,
-                        mode,
-                        case_name,
-                        citation,
-                        temperature,
-                        max_tokens,
-                        stop,
-                        _retry=True
-                    )
-                else:
-                    print("❌ Second attempt also failed: hallucination still detected.")
-                    return {k: "[ERROR: hallucination]" for k in ["Disposition", "Rule of Law", "Facts", "Issue", "Holding & Reasoning", "Dissent"]}
-
-            return brief_data
 
+def repair_sections(
+    brief_data: dict,
+    text: str,
+    mode: str,
+    case_name: str,
+    citation: str,
+    temperature: float,
+    max_tokens: int,
+    stop: Optional[List[str]],
+    on_section: Optional[Callable[[str, str], None]] = None,
+    from_notes: bool = False,
+    section_sources: Optional[dict] = None
+) -> dict:
+    # Validates every section against `text`. A failing one is regenerated from its own excerpt:
+    # `section_sources[section]` when given, otherwise its top passages of `text`
+    for key in SECTION_KEYS:
+        _record_section_stat("validated", key)
+    failures = validate_sections(brief_data, case_name, text)
+    if not failures:
+        return brief_data
+
+    # Only the failing sections are regenerated, each with its own short prompt and token budget
+    for key, reasons in failures.items():
+        for reason in reasons:
+            _record_section_stat("failed", f"{key}:{reason.split(':', 1)[0]}")
+    print(f"⚠️ {len(failures)} section(s) failed validation ({', '.join(failures)}). Regenerating only those...")
+    if section_sources is None:
+        section_sources = section_excerpts(text)
+    section_tokens = max(256, max_tokens // 3)
+    executor = get_llm_executor()
+    with stage_span("regenerate"):
+        futures = {
+            key: submit_in_context(
+                executor, regenerate_section, key, reasons,
+                section_sources[key], mode, case_name, citation,
+                temperature, section_tokens, stop, from_notes, not from_notes
+            )
+            for key, reasons in failures.items()
+        }
+        results = {key: future.result() for key, future in futures.items()}
+    for key, candidate in results.items():
+        _record_section_stat("regenerated", key)
+        retry_reasons = ["empty"] if candidate is None else validate_section(key, candidate, case_name, text)
+        if not retry_reasons:
+            _record_section_stat("recovered", key)
         else:
-            raise ValueError("No JSON object found in model response.")
+            # Still failing: reported, but it doesn't fail the brief; the draft with fewer problems is kept
+            _record_section_stat("unrecovered", key)
+            print(f"⚠️ {key} still failed validation after regeneration: {', '.join(retry_reasons)}")
+            if candidate is None or (len(retry_reasons) > len(failures[key]) and failures[key] != ["empty"]):
+                continue
+        brief_data[key] = candidate
+        if on_section is not None:
+            on_section(key, candidate)
+    return brief_data
+
+
+# ----------- Per-Section Retrieval -----------
+# Each section is written from the passages that best match its query, as its own small prompt
+SECTION_QUERIES = {
+    "Facts": "facts petitioner respondent arrested charged indicted trial convicted sentenced evidence testified appeal court below",
+    "Issue": "question presented whether issue decide granted certiorari consider resolve conflict",
+    "Rule of Law": "rule hold require constitution amendment clause statute standard test doctrine principle right must",
+    "Holding & Reasoning": "we hold conclude reason because therefore accordingly precedent protect hold that",
+    "Disposition": "judgment affirmed reversed remanded vacated ordered further proceedings consistent opinion",
+    "Dissent": "dissent dissenting disagree respectfully majority court today would hold",
+}
+MAJORITY_KINDS = ("combined", "majority", "plurality")
+# Dissent reads only the separate opinions that disagree; every other section reads the majority
+SECTION_SCOPES = {"Dissent": ("dissent", "concurrence in part")}
+
+
+def retrieval_enabled() -> bool:
+    return os.getenv("LEX_SECTION_RETRIEVAL", "1") != "0"
+
+
+def build_passage_index(text: str) -> PassageIndex:
+    headings = {heading: kind for kind, heading in OPINION_HEADINGS.items()}
+    return PassageIndex(split_passages(text, headings, int(os.getenv("LEX_PASSAGE_CHARS", "900"))))
+
+
+def get_passage_index(ctx: CaseContext) -> PassageIndex:
+    if ctx.passages is None:
+        ctx.passages = build_passage_index(ctx.cleaned_text)
+    return ctx.passages
+
+
+def section_passages(index: PassageIndex, section: str, k: int) -> str:
+    scope = SECTION_SCOPES.get(section, MAJORITY_KINDS)
+    in_scope = [p.index for p in index.passages if p.kind in scope]
+    if not in_scope:
+        # No such opinion (or no opinion headings, e.g. an uploaded PDF): search the whole text
+        in_scope, scope = [p.index for p in index.passages], None
+    where = (lambda p: p.kind in scope) if scope else None
+    # Facts and Issue are set out at the start of the opinion, the disposition at its end
+    pinned = {"Facts": in_scope[:2], "Issue": in_scope[:1], "Disposition": in_scope[-2:]}.get(section, [])
+    return "\n\n".join(p.render() for p in index.search(SECTION_QUERIES[section], k, where, pinned))
+
 
+def section_excerpts(text: str) -> dict:
+    # {section: its top passages of `text`}, so a regenerated section is prompted with an excerpt, not all of it
+    index = build_passage_index(text)
+    k = int(os.getenv("LEX_SECTION_PASSAGES", "6"))
+    return {key: section_passages(index, key, k) for key in SECTION_KEYS}
+
+
+def generate_section(
+    section: str,
+    text: str,
+    mode: str,
+    case_name: str,
+    citation: str,
+    temperature: float,
+    max_tokens: int,
+    stop: Optional[List[str]],
+    on_section: Optional[Callable[[str, str], None]] = None
+) -> Optional[str]:
+    prompt = build_section_prompt(section, [], text, mode, case_name, citation, from_passages=True)
+    try:
+        value = _request_sections(prompt, [section], temperature, max_tokens, stop, on_section, kind="section").get(section)
+        return value if isinstance(value, str) else None
     except Exception as e:
+        print(f"Error generating {section}: {e}")
+        return None
+
+
+def generate_sections_from_passages(
+    ctx: CaseContext,
+    mode: str,
+    temperature: float,
+    max_tokens: int,
+    stop: Optional[List[str]]
+) -> dict:
+    # One prompt per section over its top-k passages, run in parallel; sections stream out as each finishes
+    case_name = ctx.metadata.get("case_name", "")
+    citation = ctx.metadata.get("citation", "")
+    k = int(os.getenv("LEX_SECTION_PASSAGES", "6"))
+    with ctx.timed("retrieve"):
+        index = get_passage_index(ctx)
+        sources = {key: section_passages(index, key, k) for key in SECTION_KEYS}
+    print(f"⏳ Generating {len(SECTION_KEYS)} sections from the top {k} of {len(index.passages)} passages each...")
+    section_tokens = max(256, max_tokens // 3)
+    executor = get_llm_executor()
+
+    def generate() -> dict:
+        futures = {
+            key: submit_in_context(
+                executor, generate_section, key, sources[key], mode, case_name, citation,
+                temperature, section_tokens, stop, ctx.on_section
+            )
+            for key in SECTION_KEYS
+        }
+        brief_data = {key: value for key, value in ((key, f.result()) for key, f in futures.items()) if value is not None}
+        if not brief_data:
+            raise ValueError("No section was generated")
+        return brief_data
+
+    try:
+        brief_data = retry_unless_parties_named(generate, case_name)
+    except ValueError as e:
         print(f"Error generating brief: {e}")
-        return {k: "[ERROR]" for k in ["Disposition", "Rule of Law", "Facts", "Issue", "Holding & Reasoning", "Dissent"]}
+        return {k: "[ERROR]" for k in SECTION_KEYS}
+    if brief_data is None:
+        return {k: "[ERROR: hallucination]" for k in SECTION_KEYS}
+    return repair_sections(
+        brief_data, ctx.cleaned_text, mode, case_name, citation, temperature, max_tokens, stop,
+        ctx.on_section, section_sources=sources
+    )
 
 # ----------- Input Handling -----------
-def handle_input(case_number: Optional[str] = None, pdf_path: Optional[str] = None, raw_text: Optional[str] = None) -> str:
-    global case_metadata
+def handle_input(
+    case_number: Optional[str] = None,
+    pdf_path: Optional[str] = None,
+    raw_text: Optional[str] = None,
+    ctx: Optional[CaseContext] = None,
+    cluster: Optional[dict] = None,
+    source_url: Optional[str] = None
+) -> str:
+    # cluster: the citation's CourtListener cluster when already resolved (see resolve_citations)
+    if ctx is None:
+        ctx = CaseContext()
     if case_number:
-        result = fetch_case_by_citation(case_number, os.getenv("CL_API_KEY"))
+        result = fetch_case_by_citation(case_number, os.getenv("CL_API_KEY"), ctx, cluster)
         if "error" in result:
             raise ValueError(result["error"])
-        case_metadata = result
         return result["full_text"]
     elif pdf_path:
-        abs_pdf = os.path.abspath(pdf_path)
-        case_metadata["url"] = f"file://{abs_pdf}"
+        ctx.metadata["url"] = source_url or f"file://{os.path.abspath(pdf_path)}"
         return parse_pdf_to_text(pdf_path)
     elif raw_text:
         return raw_text
@@ -246,26 +847,96 @@ def handle_input(case_number: Optional[str] = None, pdf_path: Optional[str] = No
         raise ValueError("No input provided")
 
 # ----------- CourtListener API Fetch -----------
-def fetch_case_by_citation(citation: str, api_key: str) -> dict:
-    headers = {
-        "Authorization": f"Token {api_key}",
-        "Content-Type": "application/json",
-        "User-Agent": "LexEmetica Clerk/1.0 (Theodor Owchariw; for academic use)"
+_cl_clients = {}
+_opinion_store = None
+_cl_lock = threading.Lock()
+
+
+def get_courtlistener_client(api_key: Optional[str]) -> CourtListenerClient:
+    # One pooled keep-alive session per API key, shared by every request in this process
+    with _cl_lock:
+        client = _cl_clients.get(api_key)
+        if client is None:
+            client = CourtListenerClient(
+                api_key,
+                base_url=os.getenv("CL_BASE_URL", "https://www.courtlistener.com"),
+                pool_size=int(os.getenv("CL_POOL_SIZE", "10"))
+            )
+            _cl_clients[api_key] = client
+        return client
+
+
+def get_opinion_store() -> Optional[OpinionStore]:
+    global _opinion_store
+    with _cl_lock:
+        if _opinion_store is None and os.getenv("LEX_OPINION_STORE", "1") != "0":
+            _opinion_store = OpinionStore(os.getenv(
+                "LEX_OPINION_DB",
+                os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "opinions.sqlite3")
+            ))
+        return _opinion_store
+
+
+def resolve_citations(citations: List[str], api_key: Optional[str]) -> dict:
+    # Bulk citation lookup for the citations not already in the opinion store: {citation: cluster}
+    store = get_opinion_store()
+    todo = list(dict.fromkeys(c for c in citations if store is None or store.get(c) is None))
+    if not todo:
+        return {}
+    batch_size = int(os.getenv("CL_LOOKUP_BATCH", "100"))
+    results = get_courtlistener_client(api_key).lookup_citations(todo, batch_size)
+    clusters = {
+        citation: result["clusters"][0]
+        for citation, result in results.items()
+        if result.get("status") == 200 and result.get("clusters")
     }
+    print(f"🔎 Resolved {len(clusters)} of {len(todo)} citation(s) in {-(-len(todo) // batch_size)} lookup request(s)")
+    return clusters
+
+
+OPINION_HEADINGS = {
+    "majority": "Opinion of the Court",
+    "plurality": "Plurality opinion",
+    "concurrence": "Concurring opinion",
+    "concurrence in part": "Opinion concurring in part and dissenting in part",
+    "dissent": "Dissenting opinion",
+    "addendum": "Addendum",
+}
+
+
+def join_opinions(opinions: List[dict]) -> str:
+    # Majority text first, each separate opinion under a heading naming its kind and author
+    parts = []
+    for opinion in opinions:
+        text = opinion.get("plain_text") or ""
+        if not text.strip():
+            continue
+        kind = opinion_kind(opinion)
+        if kind in OPINION_HEADINGS and len(opinions) > 1:
+            parts.append(f"{OPINION_HEADINGS[kind]} by {opinion_author(opinion)}")
+        parts.append(text)
+    return "\n\n".join(parts) or "No full text available."
+
+
+def fetch_case_by_citation(
+    citation: str,
+    api_key: str,
+    ctx: Optional[CaseContext] = None,
+    cluster: Optional[dict] = None
+) -> dict:
+    client = get_courtlistener_client(api_key)
     try:
-        response = requests.post(
-            "https://www.courtlistener.com/api/rest/v4/citation-lookup/",
-            headers=headers,
-            json={"text": citation}
+        cluster, opinions = fetch_opinions(
+            citation,
+            client,
+            get_opinion_store(),
+            revalidate_after=float(os.getenv("LEX_OPINION_REVALIDATE_DAYS", "30")) * 24 * 3600,
+            cluster=cluster
         )
-        response.raise_for_status()
-        results = response.json()
-        cluster = results[0]["clusters"][0]
-        opinion_data = requests.get(cluster["sub_opinions"][0], headers=headers).json()
         rel_path = cluster.get("absolute_url", "")
         full_url = f"https://www.courtlistener.com{rel_path}"
 
-        return {
+        result = {
             "case_name": cluster.get("case_name", "Unknown Case"),
             "citation": citation,
             "date": cluster.get("date_filed", "Unknown Date"),
@@ -274,17 +945,30 @@ def fetch_case_by_citation(citation: str, api_key: str) -> dict:
             "procedural_history": cluster.get("procedural_history", "..."),
             "attorneys": cluster.get("attorneys", "..."),
             "disposition": cluster.get("disposition", "..."),
-            "full_text": opinion_data.get("plain_text", "No full text available."),
+            "full_text": join_opinions(opinions),
             "court":       cluster.get("court_id", "Unknown Court"),    
             "docket_number": cluster.get("docketNumber", "—"),  
-            "opinion_author": opinion_data.get("author", "Unknown"),    
+            "opinion_author": opinion_author(opinions[0]),
+            "opinions": [
+                {"type": o.get("type"), "kind": opinion_kind(o), "author": opinion_author(o), "joined_by": o.get("joined_by_str") or ""}
+                for o in opinions
+            ],
         }
+        if ctx is not None:
+            ctx.metadata = result
+        return result
     except Exception as e:
         return {"error": f"Error fetching case: {str(e)}"}
 
 # ----------- PDF Fallback -----------
 def parse_pdf_to_text(pdf_path: str) -> str:
-    return "[PDF Parsing Placeholder]"
+    # Page text with "*N" star-page markers, which preprocess() turns into [Page N]
+    workers = os.getenv("LEX_PDF_WORKERS")
+    return extract_pdf_text(
+        pdf_path,
+        workers=int(workers) if workers else None,
+        parallel_min_pages=int(os.getenv("LEX_PDF_PARALLEL_PAGES", "64"))
+    )
 
 def preprocess(text: str) -> str:
     # Normalize stray punctuation and merge line breaks first    
@@ -298,25 +982,522 @@ def preprocess(text: str) -> str:
     return text
 
 
+# ----------- Compaction -----------
+@lru_cache(maxsize=1)
+def get_token_counter() -> TokenCounter:
+    return TokenCounter(
+        tokenizer_file=os.getenv("LEX_TOKENIZER_FILE") or None,
+        chars_per_token=float(os.getenv("LEX_CHARS_PER_TOKEN", "3.5"))
+    )
+
+
+def compaction_budget(mode: str) -> int:
+    # Student briefs are shorter and can work from a tighter slice of the opinion. The other defaults
+    # (12000 tokens, about 42k characters) keep a compacted opinion under LEX_MAP_REDUCE_CHARS
+    default = "8000" if mode == "student" else "12000"
+    return int(os.getenv(f"LEX_COMPACT_BUDGET_{mode.upper()}", default))
+
+
+def compact_case_text(ctx: CaseContext, mode: str) -> bool:
+    # True when the text changed; compacting already-compacted text to a smaller budget only removes more
+    if os.getenv("LEX_COMPACT", "1") == "0":
+        return False
+    compacted, report = compact_opinion(
+        ctx.cleaned_text,
+        compaction_budget(mode),
+        get_token_counter(),
+        footnotes=os.getenv("LEX_COMPACT_FOOTNOTES", "auto").lower(),
+        citations=os.getenv("LEX_COMPACT_CITATIONS", "auto").lower()
+    )
+    changed = compacted != ctx.cleaned_text
+    if changed:
+        ctx.cleaned_text = compacted
+        ctx.passages = None
+    if ctx.compaction:
+        # A second pass (for a mode prompt after the extraction) adds to what the first one saved
+        report.tokens_before = ctx.compaction["tokens_before"]
+        report.steps = list(dict.fromkeys(ctx.compaction["steps"] + report.steps))
+    ctx.compaction = report.to_dict()
+    print(
+        f"🗜️ Compacted opinion: {report.tokens_before:,} → {report.tokens_after:,} tokens "
+        f"(saved {report.tokens_saved:,}; {', '.join(report.steps) or 'nothing to remove'})"
+    )
+    return changed
+
+
+# ----------- Map-Reduce for Long Opinions -----------
+
+_llm_executor = None
+_llm_executor_lock = threading.Lock()
+
+
+def get_llm_executor() -> ThreadPoolExecutor:
+    # Shared pool for fan-out LLM calls, sized to what the model server can run in parallel
+    global _llm_executor
+    with _llm_executor_lock:
+        if _llm_executor is None:
+            _llm_executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("LEX_LLM_WORKERS", "1")),
+                thread_name_prefix="llm"
+            )
+        return _llm_executor
+
+
+@dataclass
+class OpinionChunk:
+    first_page: Optional[str]
+    last_page: Optional[str]
+    text: str
+
+    @property
+    def page_range(self) -> str:
+        if self.last_page is None:
+            return "Pages unknown"
+        if self.first_page is None:
+            return f"Pages up to {self.last_page}"
+        if self.first_page == self.last_page:
+            return f"Page {self.first_page}"
+        return f"Pages {self.first_page}–{self.last_page}"
+
+
+def split_pages(text: str) -> list:
+    # [(page, segment)] where each segment starts at its "[Page N]" marker; leading text has page None
+    pages = []
+    last = 0
+    page = None
+    for m in PAGE_MARKER_RE.finditer(text):
+        if m.start() > last:
+            pages.append((page, text[last:m.start()]))
+        page = m.group(1)
+        last = m.start()
+    pages.append((page, text[last:]))
+    return [(p, seg) for p, seg in pages if seg.strip()]
+
+
+def chunk_opinion(text: str, max_chars: int) -> list:
+    # Greedily packs whole pages into chunks; a page longer than max_chars is split on sentence boundaries
+    chunks = []
+    current = []
+    size = 0
+
+    def flush():
+        nonlocal current, size
+        if current:
+            chunks.append(OpinionChunk(current[0][0], current[-1][0], " ".join(seg.strip() for _, seg in current)))
+        current = []
+        size = 0
+
+    for page, segment in split_pages(text):
+        pieces = [segment]
+        if len(segment) > max_chars:
+            pieces = []
+            piece = ""
+            for sentence in re.split(r"(?<=[.!?])\s+", segment):
+                if piece and len(piece) + len(sentence) + 1 > max_chars:
+                    pieces.append(piece)
+                    piece = ""
+                piece = f"{piece} {sentence}" if piece else sentence
+            if piece:
+                pieces.append(piece)
+        for piece in pieces:
+            if size + len(piece) > max_chars:
+                flush()
+            current.append((page, piece))
+            size += len(piece)
+    flush()
+    return chunks
+
+
+def build_chunk_notes_prompt(chunk: OpinionChunk, case_name: str, citation: str) -> str:
+    return f"""
+You are LexEmetica Clerk, a legal writing assistant.
+
+Below is one consecutive excerpt ({chunk.page_range}) of the U.S. Supreme Court opinion in **{case_name}, {citation}**. Later passes will combine your notes with notes from the rest of the opinion.
+
+Write concise factual notes covering only what this excerpt contains about:
+- the facts and procedural history,
+- the legal questions presented,
+- rules of law, holdings and the Court's reasoning,
+- the disposition,
+- any concurring or dissenting opinions, naming their authors.
+
+End every note with the page it comes from, such as (Page 440). Use only the excerpt below; do not add outside knowledge. Write "No relevant content." if the excerpt contains none of the above.
+
+Excerpt:
+{chunk.text}
+"""
+
+
+def generate_chunk_notes(
+    chunk: OpinionChunk,
+    case_name: str,
+    citation: str,
+    temperature: float,
+    max_tokens: int
+) -> str:
+    try:
+        return _request_generation(build_chunk_notes_prompt(chunk, case_name, citation), temperature, max_tokens).strip()
+    except Exception as e:
+        print(f"Error generating notes for {chunk.page_range}: {e}")
+        return "[ERROR]"
+
+
+def map_opinion_notes(
+    text: str,
+    case_name: str,
+    citation: str,
+    temperature: float,
+    chunk_chars: int,
+    max_tokens: int
+) -> str:
+    # Map step: notes for each page-range chunk in parallel, returned in opinion order with page-range headers
+    chunks = chunk_opinion(text, chunk_chars)
+    print(f"📑 Opinion is long; extracting notes from {len(chunks)} chunks...")
+    executor = get_llm_executor()
+    futures = [
+        submit_in_context(executor, generate_chunk_notes, chunk, case_name, citation, temperature, max_tokens)
+        for chunk in chunks
+    ]
+    notes = [f"[{chunk.page_range}]\n{future.result()}" for chunk, future in zip(chunks, futures)]
+    if any(n.endswith("[ERROR]") for n in notes):
+        raise ValueError("Failed to extract notes from one or more opinion chunks")
+    return "\n\n".join(notes)
+
+
+# ----------- Two-Stage Extraction -----------
+EXTRACTION_KEYS = [
+    "parties", "majority_author", "procedural_history", "facts", "issues",
+    "rules", "holding", "reasoning", "disposition", "dissents"
+]
+
+# Labels used when the extraction is rendered back into notes for the styling pass
+EXTRACTION_LABELS = [
+    ("procedural_history", "Procedural history"),
+    ("facts", "Facts"),
+    ("issues", "Issues"),
+    ("rules", "Rules of law"),
+    ("holding", "Holding"),
+    ("reasoning", "Reasoning"),
+    ("disposition", "Disposition"),
+]
+
+_ANCHORED_POINTS = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"point": {"type": "string"}, "page": {"type": "integer"}},
+        "required": ["point", "page"],
+    },
+}
+
+EXTRACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "parties": {
+            "type": "object",
+            "properties": {"petitioner": {"type": "string"}, "respondent": {"type": "string"}},
+            "required": ["petitioner", "respondent"],
+        },
+        "majority_author": {"type": "string"},
+        **{key: _ANCHORED_POINTS for key, _ in EXTRACTION_LABELS},
+        "dissents": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"author": {"type": "string"}, "points": _ANCHORED_POINTS},
+                "required": ["author", "points"],
+            },
+        },
+    },
+    "required": EXTRACTION_KEYS,
+}
+
+# Static and first, like BRIEF_PROMPT_PREFIX, so the KV cache for it is reused across cases
+EXTRACTION_PROMPT_PREFIX = """
+You are LexEmetica Clerk, a legal research assistant.
+
+You will be given the text of a U.S. Supreme Court opinion, a real and specific legal case. Extract its content as structured data, in the court's own terms, without writing any prose brief. Respond in JSON format like:
+
+{
+    "parties": {"petitioner": "...", "respondent": "..."},
+    "majority_author": "...",
+    "procedural_history": [{"point": "...", "page": 440}],
+    "facts": [{"point": "...", "page": 440}],
+    "issues": [{"point": "...", "page": 440}],
+    "rules": [{"point": "...", "page": 440}],
+    "holding": [{"point": "...", "page": 440}],
+    "reasoning": [{"point": "...", "page": 440}],
+    "disposition": [{"point": "...", "page": 440}],
+    "dissents": [{"author": "...", "points": [{"point": "...", "page": 440}]}]
+}
+
+- ✅ Each point is one complete, specific statement taken from the opinion; "page" is the [Page N] marker it appears under.
+- ✅ Cover every material fact, the question presented, each rule of law applied, the holding, the main steps of the reasoning and the disposition.
+- ✅ List every dissenting justice separately with the main points of their dissent; use an empty list if there is no dissent.
+- ✅ Only use names, cases and doctrines that appear in the opinion text. If uncertain about a point, omit it.
+"""
+
+
+def build_extraction_prompt(
+    text: str,
+    case_name: str,
+    citation: str,
+    from_notes: bool = False,
+    keys: Optional[List[str]] = None
+) -> str:
+    if keys is not None:
+        source = f"The following are the passages of the opinion in **{case_name}, {citation}** most relevant to the fields below, each under its [Page N] marker. Extract only these fields: {', '.join(keys)}.\n\nOpinion Passages:"
+    elif from_notes:
+        source = f"The following are page-cited reading notes from the opinion in **{case_name}, {citation}**. Treat them as the opinion text.\n\nOpinion Notes (by page range):"
+    else:
+        source = f"The following is the full text of the U.S. Supreme Court opinion in **{case_name}, {citation}**.\n\nCourt Opinion:"
+    return f"""{EXTRACTION_PROMPT_PREFIX}
+{source}
+{text}
+"""
+
+
+def extraction_is_complete(extraction: Optional[dict]) -> bool:
+    return (
+        isinstance(extraction, dict)
+        and all(key in extraction for key in EXTRACTION_KEYS)
+        and bool(extraction.get("facts"))
+        and bool(extraction.get("holding"))
+    )
+
+
+def extract_case(
+    text: str,
+    case_name: str,
+    citation: str,
+    temperature: float,
+    stop: Optional[List[str]],
+    from_notes: bool = False
+) -> Optional[dict]:
+    # Stage 1: the expensive, mode-independent pass over the opinion; None when the output is unusable
+    print("⏳ Extracting case structure using Mixtral... (this may take a while)")
+    try:
+        extraction = _request_sections(
+            build_extraction_prompt(text, case_name, citation, from_notes),
+            EXTRACTION_KEYS,
+            temperature,
+            int(os.getenv("LEX_EXTRACT_MAX_TOKENS", "2500")),
+            stop,
+            schema=EXTRACTION_SCHEMA,
+            kind="extract"
+        )
+    except Exception as e:
+        print(f"Error extracting case structure: {e}")
+        return None
+    if not extraction_is_complete(extraction):
+        print("⚠️ Extraction was incomplete; falling back to a single-pass brief")
+        return None
+    return extraction
+
+
+def extract_case_part(
+    text: str,
+    keys: List[str],
+    case_name: str,
+    citation: str,
+    temperature: float,
+    max_tokens: int,
+    stop: Optional[List[str]]
+) -> dict:
+    # The `keys` of the extraction from one section's passages; {} when the request fails
+    schema = {
+        "type": "object",
+        "properties": {key: EXTRACTION_SCHEMA["properties"][key] for key in keys},
+        "required": keys,
+    }
+    try:
+        part = _request_sections(
+            build_extraction_prompt(text, case_name, citation, keys=keys),
+            keys,
+            temperature,
+            max_tokens,
+            stop,
+            schema=schema,
+            kind="extract"
+        )
+    except Exception as e:
+        print(f"Error extracting {', '.join(keys)}: {e}")
+        return {}
+    return {key: part[key] for key in keys if key in part}
+
+
+def extract_case_from_passages(ctx: CaseContext, temperature: float, stop: Optional[List[str]]) -> Optional[dict]:
+    # Stage 1 over retrieved passages: one extraction prompt per brief section, each carrying only that
+    # section's top passages and asking only for its fields, run in parallel and merged into one extraction
+    case_name = ctx.metadata.get("case_name", "")
+    citation = ctx.metadata.get("citation", "")
+    k = int(os.getenv("LEX_SECTION_PASSAGES", "6"))
+    with ctx.timed("retrieve"):
+        index = get_passage_index(ctx)
+        sources = {key: section_passages(index, key, k) for key in SECTION_KEYS}
+    print(f"⏳ Extracting case structure from the top {k} of {len(index.passages)} passages per section...")
+    part_tokens = max(512, int(os.getenv("LEX_EXTRACT_MAX_TOKENS", "2500")) // 2)
+    executor = get_llm_executor()
+    futures = [
+        submit_in_context(
+            executor, extract_case_part, sources[section], keys, case_name, citation, temperature, part_tokens, stop
+        )
+        for section, keys in SECTION_EXTRACTION_KEYS.items()
+    ]
+    extraction = {}
+    for future in futures:
+        for key, value in future.result().items():
+            # Parties and the majority author come from more than one part; the first non-empty answer wins
+            if not extraction.get(key):
+                extraction[key] = value
+    if not extraction_is_complete(extraction):
+        print("⚠️ Extraction was incomplete; falling back to per-section briefs")
+        return None
+    return extraction
+
+
+def _render_points(points) -> list:
+    lines = []
+    for p in points if isinstance(points, list) else []:
+        if isinstance(p, dict) and p.get("point"):
+            lines.append(f"- {p['point']} [Page {p['page']}]" if p.get("page") else f"- {p['point']}")
+        elif isinstance(p, str) and p.strip():
+            lines.append(f"- {p}")
+    return lines
+
+
+# The extraction fields each brief section is written from
+SECTION_EXTRACTION_KEYS = {
+    "Facts": ["parties", "procedural_history", "facts"],
+    "Issue": ["issues"],
+    "Rule of Law": ["rules"],
+    "Holding & Reasoning": ["majority_author", "holding", "reasoning"],
+    "Disposition": ["disposition"],
+    "Dissent": ["dissents"],
+}
+
+
+def render_extraction(extraction: dict, keys: Optional[List[str]] = None) -> str:
+    # Stage 2 input: the extraction (or just `keys` of it, after the parties) as compact page-cited notes
+    parties = extraction.get("parties")
+    if not isinstance(parties, dict):
+        # Without a schema-constrained format, older Ollama builds may return a string or list here
+        parties = {}
+    lines = [
+        f"Parties: {parties.get('petitioner') or 'Unknown'} (petitioner) v. {parties.get('respondent') or 'Unknown'} (respondent)",
+        f"Majority opinion by: {extraction.get('majority_author') or 'Unknown'}",
+    ]
+    for key, label in EXTRACTION_LABELS:
+        if keys is None or key in keys:
+            lines.append(f"\n{label}:")
+            lines.extend(_render_points(extraction.get(key)) or ["- None stated"])
+    if keys is not None and "dissents" not in keys:
+        return "\n".join(lines)
+    dissents = [d for d in extraction.get("dissents") or [] if isinstance(d, dict)]
+    if not dissents:
+        lines.append("\nDissents: none. No justice dissented.")
+    for d in dissents:
+        lines.append(f"\nDissent by {d.get('author') or 'Unknown'}:")
+        lines.extend(_render_points(d.get("points")))
+    return "\n".join(lines)
+
+
+def two_stage_enabled() -> bool:
+    return os.getenv("LEX_TWO_STAGE", "1") != "0"
+
+
 # ----------- Segment Brief -----------
+def opinion_source_text(ctx: CaseContext, temperature: float) -> tuple:
+    # (text, from_notes) for the model; text is None when the map step failed
+    source_text = ctx.cleaned_text
+    if len(source_text) <= int(os.getenv("LEX_MAP_REDUCE_CHARS", "48000")):
+        return source_text, False
+
+    # Opinions too long for one prompt are summarised chunk by chunk, then reduced from the notes
+    with ctx.timed("map"):
+        try:
+            notes = map_opinion_notes(
+                source_text,
+                ctx.metadata.get("case_name", ""),
+                ctx.metadata.get("citation", ""),
+                temperature,
+                chunk_chars=int(os.getenv("LEX_CHUNK_CHARS", "16000")),
+                max_tokens=int(os.getenv("LEX_MAP_MAX_TOKENS", "600"))
+            )
+        except ValueError as e:
+            print(f"Error generating brief: {e}")
+            return None, False
+    return notes, True
+
+
 def segment_case_sections(
-    text: str,
-    metadata: dict,
+    ctx: CaseContext,
     mode: str,
     temperature: float,
     max_tokens: int,
     stop: Optional[List[str]]
 ) -> dict:
-    summary = generate_case_sections_with_mixtral(
-        text,
-        mode=mode,
-        case_name=metadata.get("case_name", ""),
-        citation=metadata.get("citation", ""),
-        temperature=temperature,
-        max_tokens=max_tokens,
-        stop=stop
-    )
-    return {
+    metadata = ctx.metadata
+    case_name = metadata.get("case_name", "")
+    citation = metadata.get("citation", "")
+    summary = None
+    source = None
+
+    # Two-stage: extract once (cached across modes), then style the small extraction for this mode
+    if two_stage_enabled():
+        if ctx.extraction is None and retrieval_enabled():
+            # Each part of the extraction reads only its section's passages, so no prompt carries the
+            # whole opinion and long opinions need no map step
+            with ctx.timed("extract"):
+                ctx.extraction = extract_case_from_passages(ctx, temperature, stop)
+        elif ctx.extraction is None:
+            source = opinion_source_text(ctx, temperature)
+            if source[0] is not None:
+                with ctx.timed("extract"):
+                    ctx.extraction = extract_case(source[0], case_name, citation, temperature, stop, source[1])
+        if ctx.extraction is not None:
+            with ctx.timed("style"):
+                summary = generate_case_sections_with_mixtral(
+                    render_extraction(ctx.extraction),
+                    mode=mode,
+                    case_name=case_name,
+                    citation=citation,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stop=stop,
+                    on_section=ctx.on_section,
+                    from_notes=True,
+                    section_sources={key: render_extraction(ctx.extraction, keys) for key, keys in SECTION_EXTRACTION_KEYS.items()}
+                )
+
+    if summary is None and two_stage_enabled() and ctx.cleaned_text:
+        # The text was compacted for the extraction; the mode-specific prompts below get this mode's budget
+        with ctx.timed("compact"):
+            if compact_case_text(ctx, mode):
+                source = None
+
+    if summary is None and retrieval_enabled():
+        summary = generate_sections_from_passages(ctx, mode, temperature, max_tokens, stop)
+
+    if summary is None:
+        if source is None:
+            source = opinion_source_text(ctx, temperature)
+        source_text, from_notes = source
+        if source_text is None:
+            summary = {k: "[ERROR]" for k in SECTION_KEYS}
+        else:
+            summary = generate_case_sections_with_mixtral(
+                source_text,
+                mode=mode,
+                case_name=case_name,
+                citation=citation,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stop=stop,
+                on_section=ctx.on_section,
+                from_notes=from_notes
+            )
+    ctx.sections = {
         "Court":        metadata.get("court", "Unknown Court"),   
         "Docket Number": metadata.get("docket_number", "—"),       
         "Judges": metadata.get("judges", "Unknown"),
@@ -330,13 +1511,41 @@ def segment_case_sections(
         "Holding & Reasoning": summary.get("Holding & Reasoning", "..."),
         "Dissent": summary.get("Dissent", "...")
     }
+    return ctx.sections
+
 
 # ----------- Export Brief -----------
-def export_brief(brief: dict, fmt: str, out: str):
+@lru_cache(maxsize=1)
+def local_timezone():
+    # tzlocal is imported on first use, by exports and trace records
+    from tzlocal import get_localzone
+    return get_localzone()
+
+
+def _open_text_output(out: Union[str, BinaryIO]):
+    if isinstance(out, str):
+        return open(out, 'w')
+    return io.TextIOWrapper(out, encoding="utf-8", write_through=True)
+
+
+def _close_text_output(f, out: Union[str, BinaryIO]):
+    # Leave caller-owned buffers open
+    if isinstance(out, str):
+        f.close()
+    else:
+        f.flush()
+        f.detach()
+
+
+def export_brief(brief: dict, fmt: str, out: Union[str, BinaryIO], ctx: Optional[CaseContext] = None):
+    # `out` is a path or a binary file-like object such as io.BytesIO
+    if ctx is not None:
+        with ctx.timed("export"):
+            return export_brief(brief, fmt, out)
+
     # Add timestamp and disclosure for JSON and TXT exports
     if fmt in ("json", "txt"):
-        local_timezone = get_localzone()
-        timestamp = datetime.now(local_timezone).strftime("%B %d, %Y at %I:%M %p (%Z)")
+        timestamp = datetime.now(local_timezone()).strftime("%B %d, %Y at %I:%M %p (%Z)")
         generation_note = f"Generated using LexEmetica Clerk on {timestamp}"
         disclosure_text = (
             "This brief was generated with the assistance of an AI system trained to summarize legal opinions based on the provided court text. "
@@ -351,176 +1560,209 @@ def export_brief(brief: dict, fmt: str, out: str):
         output_data = brief.copy()
         output_data["Generation Info"] = generation_note
         output_data["Disclosure"] = disclosure_text
-        with open(out, 'w') as f:
+        f = _open_text_output(out)
+        try:
             json.dump(output_data, f, indent=2)
+        finally:
+            _close_text_output(f, out)
 
     # Plain-text output
     elif fmt == "txt":
-        with open(out, 'w') as f:
+        f = _open_text_output(out)
+        try:
             for k, v in brief.items():
                 f.write(f"{k}:\n{v}\n\n")
             f.write("Generation Info:\n")
             f.write(f"{generation_note}\n\n")
             f.write("Disclosure:\n")
             f.write(f"{disclosure_text}\n")
+        finally:
+            _close_text_output(f, out)
 
-    # PDF output
+    # PDF output; ReportLab is only imported for it
     elif fmt == "pdf":
-        # Create the document
-        doc = SimpleDocTemplate(
-            out,
-            pagesize=LETTER,
-            leftMargin=1 * inch,
-            rightMargin=1 * inch,
-            topMargin=1 * inch,
-            bottomMargin=1 * inch,
-            title="LexEmetica Case Brief"
-        )
+        from pdf_render import write_pdf
+        write_pdf(brief, out, datetime.now(local_timezone()).strftime("%B %d, %Y at %I:%M %p (%Z)"))
+
+    # ZIP of all three
+    elif fmt == "zip":
+        data = bundle_outputs(brief, {f: render_brief(brief, f) for f in OUTPUT_FORMATS})
+        if isinstance(out, str):
+            with open(out, "wb") as f:
+                f.write(data)
+        else:
+            out.write(data)
+
+    else:
+        raise ValueError(f"Unknown export format '{fmt}'")
+
+
+OUTPUT_FORMATS = ("pdf", "json", "txt")
 
-        # Load and configure styles
-        styles = getSampleStyleSheet()
-        styles.add(ParagraphStyle(
-            name="LegalBodyText",
-            parent=styles["Normal"],
-            fontName="Times-Roman",
-            fontSize=11,
-            leading=14,
-            spaceAfter=6
-        ))
-        styles.add(ParagraphStyle(
-            name="CoverMeta",
-            parent=styles["Normal"],
-            fontName="Times-Roman",
-            fontSize=14,
-            leading=18,
-            alignment=1            
-        ))
-        styles.add(ParagraphStyle(
-            name="CoverMetaHeading",
-            parent=styles["Heading3"],
-            fontName="Times-Bold",
-            fontSize=20,
-            spaceAfter=6,
-            textColor=colors.HexColor("#800020"),
-            alignment=1
-        ))
-        styles.add(ParagraphStyle(
-            name="BriefHeading",
-            parent=styles["Heading3"],
-            fontName="Times-Bold",
-            fontSize=13,
-            spaceAfter=6,
-            textColor="navy"
-        ))
-        styles.add(ParagraphStyle(
-            name="TitleText",
-            parent=styles["Normal"],
-            fontName="Times-Bold",
-            fontSize=20,
-            leading=24,
-            textColor=colors.HexColor("#800020"),
-            spaceAfter=10,
-            alignment=1
-        ))
-        styles.add(ParagraphStyle(
-            name="DisclosureText",
-            parent=styles["Normal"],
-            fontName="Times-Italic",
-            fontSize=9,
-            leading=12,
-            textColor=colors.grey,
-            spaceBefore=12,
-            spaceAfter=12
-        ))
-
-        elements = []
-        # 1) Cover Page
-        logo_path = os.path.join(os.path.dirname(__file__), 'logo_transparent.png')
-        elements.extend(build_cover_page(
-            brief=brief,
-            styles=styles,
-            logo_path=logo_path
-        ))
-        
-
-        # --- Generate and Add Title ---
-        case_title = brief.get("Case Name", "Unknown Case")
-        case_year = brief.get("Date Filed", "Unknown Date").split("-")[0]
-        title_text = f"{case_title} ({case_year}) – Case Brief"
-        elements.append(Paragraph(title_text, styles["TitleText"]))
-
-        # Horizontal rule under title
-        elements.append(HRFlowable(
-            width="85%",
-            thickness=2,
-            lineCap='round',
-            color=colors.HexColor("#800020"),
-            spaceBefore=4,
-            spaceAfter=20
-        ))
-
-        # --- Main Brief Content ---
-        for section, content in brief.items():
-            elements.append(Paragraph(f"<b>{section}:</b>", styles["BriefHeading"]))
-            elements.append(Paragraph(content.replace('\n', '<br/>'), styles["LegalBodyText"]))
-
-        # --- Footer with Timestamp & Disclosure ---
-        timestamp = datetime.now(get_localzone()).strftime("%B %d, %Y at %I:%M %p (%Z)")
-        disclosure_full = (
-            f"Generated using LexEmetica Clerk on {timestamp}<br/><br/>"
-            "<b>Disclosure:</b><br/>"
-            "This brief was generated with the assistance of an AI system trained to summarize legal opinions based on the provided court text. "
-            "While efforts have been made to ensure accuracy, this document may contain errors, omissions, or hallucinated content.<br/><br/>"
-            "Users must not rely solely on this brief for legal decision-making, academic work, or court preparation. "
-            "Always cross-check information against the original court opinion and consult with a licensed attorney if applicable.<br/><br/>"
-            "Use of this tool is at your own risk. No liability is assumed by the developer or contributors for any inaccuracies."
-            "<br/><br/>© 2025 LexEmetica Clerk. All rights reserved.<br/>"
-            "Unauthorized copying, reproduction, or distribution of this material, in whole or in part, without the prior written consent of LexEmetica Clerk is strictly prohibited."
-        )
-        elements.append(Spacer(1, 0.5 * inch))
-        elements.append(Paragraph(disclosure_full, styles["DisclosureText"]))
 
-        doc.build(
-          elements,
-          onFirstPage=lambda c, d: None,  # no header on cover
-          onLaterPages=_draw_header      # header starting with page 2
+def bundle_outputs(brief: dict, outputs: dict) -> bytes:
+    # Zips already-rendered {fmt: bytes}; PDFs are already compressed, so they're stored as-is
+    buffer = io.BytesIO()
+    stem = case_file_stem(brief)
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for fmt, data in outputs.items():
+            compress = zipfile.ZIP_STORED if fmt == "pdf" else zipfile.ZIP_DEFLATED
+            zf.writestr(f"{stem}.{fmt}", data, compress_type=compress)
+    return buffer.getvalue()
+
+
+def brief_digest(brief: dict) -> str:
+    # Identifies a brief's content, so identical briefs share rendered outputs
+    return hashlib.sha256(json.dumps(brief, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# ----------- Brief Cache -----------
+_brief_cache = None
+
+
+def get_brief_cache() -> Optional[BriefCache]:
+    global _brief_cache
+    if _brief_cache is None and os.getenv("LEX_CACHE", "1") != "0":
+        _brief_cache = BriefCache(
+            directory=os.getenv("LEX_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "briefs")),
+            max_items=int(os.getenv("LEX_CACHE_MEMORY_ITEMS", "256")),
+            max_bytes=int(float(os.getenv("LEX_CACHE_MAX_MB", "512")) * 1024 * 1024),
+            ttl_seconds=float(os.getenv("LEX_CACHE_TTL_HOURS", "720")) * 3600
         )
+    return _brief_cache
 
-# ----------- CLI -----------
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--case", type=str, help="Case citation number")
-    parser.add_argument("--pdf", type=str, help="Path to PDF")
-    parser.add_argument("--text", type=str, help="Raw case text")
-    parser.add_argument("--mode", type=str, choices=["student", "professional"], default="student")
-    parser.add_argument("--format", type=str, choices=["json", "txt", "pdf"], default="json")
-    parser.add_argument("--output", type=str, default="brief_output.json")
-    parser.add_argument("--temperature", type=float, default=0.3, help="Sampling temperature for generation (0.0–1.0)")
-    parser.add_argument("--max-tokens", type=int, default=1500, help="Maximum number of tokens to generate")
-    parser.add_argument("--stop-sequences", nargs="*", default=None, help="One or more stop sequences (e.g. --stop-sequences '###' '')")
-    args = parser.parse_args()
 
-    full_text = handle_input(args.case, args.pdf, args.text)
-    cleaned_text = preprocess(full_text)
-    brief_sections = segment_case_sections(
-        cleaned_text,
-        case_metadata,
-        args.mode,
-        args.temperature,
-        args.max_tokens,
-        args.stop_sequences
-    )
+def has_cached_brief(
+    case_number: str,
+    mode: str,
+    temperature: float = 0.3,
+    max_tokens: int = 1500,
+    stop: Optional[List[str]] = None
+) -> bool:
+    # Defaults match generate_brief's
+    cache = get_brief_cache()
+    return cache is not None and cache.get(brief_cache_key(case_number, mode, temperature, max_tokens, stop)) is not None
+
+
+def cached_brief(
+    case_number: str,
+    mode: str,
+    ctx: Optional[CaseContext] = None,
+    temperature: float = 0.3,
+    max_tokens: int = 1500,
+    stop: Optional[List[str]] = None
+) -> Optional[dict]:
+    # The cached brief, or None; never fetches or generates
+    if ctx is None:
+        ctx = CaseContext()
+    if load_cached_brief(ctx, brief_cache_key(case_number, mode, temperature, max_tokens, stop)):
+        return ctx.brief
+    return None
+
+
+# ----------- Brief Search Index -----------
+_brief_index = None
+_brief_index_unavailable = False
+_brief_index_lock = threading.Lock()
+
+
+def get_brief_index() -> Optional[BriefIndex]:
+    global _brief_index, _brief_index_unavailable
+    with _brief_index_lock:
+        if _brief_index is None and not _brief_index_unavailable and os.getenv("LEX_SEARCH", "1") != "0":
+            try:
+                _brief_index = BriefIndex(os.getenv(
+                    "LEX_SEARCH_DB",
+                    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "brief_index.sqlite3")
+                ))
+            except sqlite3.OperationalError as e:
+                print(f"⚠️ Brief search disabled (SQLite needs FTS5): {e}")
+                _brief_index_unavailable = True
+        return _brief_index
+
+
+def index_brief(ctx: CaseContext, mode: str, only_missing: bool = False):
+    # Clean briefs with a real citation are searchable by party, justice and doctrine
+    citation = ctx.metadata.get("citation")
+    if not citation or citation == DEFAULT_CASE_METADATA["citation"] or brief_has_errors(ctx.brief):
+        return
+    index = get_brief_index()
+    if index is None:
+        return
+    try:
+        if not (only_missing and index.has(citation, mode)):
+            index.add(ctx.brief, mode, ctx.metadata)
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not index brief for {citation}: {e}")
+
+
+# ----------- Render Service -----------
+def render_brief(brief: dict, fmt: str = "pdf") -> bytes:
+    buffer = io.BytesIO()
+    export_brief(brief, fmt, buffer)
+    return buffer.getvalue()
+
+
+def _warm_render_worker():
+    from pdf_render import warm
+    warm()
+
+
+def _render_task(brief: dict, fmt: str, out: Optional[str]):
+    if out is None:
+        return render_brief(brief, fmt)
+    export_brief(brief, fmt, out)
+    return out
+
+
+class RenderService:
+    """Fans brief rendering out to warm worker processes.
+
+    submit() returns a Future resolving to the rendered bytes, or to `out` when a path is given.
+    With workers=0 rendering happens in the calling thread.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self._pool = None
+        if self.workers > 0:
+            # spawn, not fork: callers are usually multi-threaded
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_render_worker
+            )
+
+    def submit(self, brief: dict, fmt: str = "pdf", out: Optional[str] = None) -> Future:
+        if self._pool is not None:
+            return self._pool.submit(_render_task, brief, fmt, out)
+        future = Future()
+        try:
+            future.set_result(_render_task(brief, fmt, out))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def render(self, brief: dict, fmt: str = "pdf", out: Optional[str] = None):
+        return self.submit(brief, fmt, out).result()
 
-    final_brief = {
+    def shutdown(self, wait: bool = True):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+
+
+# ----------- Engine -----------
+def assemble_final_brief(metadata: dict, brief_sections: dict) -> dict:
+    return {
         # 1) Identifiers
-        "Case Name":      case_metadata["case_name"],
-        "Citation":       case_metadata["citation"],
-        "Date Filed":     case_metadata["date"],          
+        "Case Name":      metadata["case_name"],
+        "Citation":       metadata["citation"],
+        "Date Filed":     metadata["date"],
         "Docket Number":  brief_sections["Docket Number"],
 
         # 2) Context / Metadata
         "Court":              brief_sections["Court"],
-        "Source URL":         case_metadata["url"],
+        "Source URL":         metadata["url"],
         "Judges":             brief_sections["Judges"],
         "Procedural History": brief_sections["Procedural History"],
         "Attorneys":          brief_sections["Attorneys"],
@@ -535,15 +1777,324 @@ if __name__ == "__main__":
     }
 
 
-    if args.format == "pdf" and args.output == "brief_output.json":
-        args.output = f"{final_brief['Case Name'].replace(' ', '_').replace('/', '_')}.pdf"
+def brief_has_errors(brief: dict) -> bool:
+    return any("[ERROR" in str(v) for v in brief.values())
+
+
+def case_file_stem(brief: dict) -> str:
+    return brief['Case Name'].replace(' ', '_').replace('/', '_')
 
-    if any("[ERROR" in v for v in final_brief.values()):
+
+def default_output_path(brief: dict, fmt: str) -> str:
+    if fmt in ("pdf", "zip"):
+        return f"{case_file_stem(brief)}.{fmt}"
+    return "brief_output.json"
+
+
+def generate_brief(
+    case_number: Optional[str] = None,
+    pdf_path: Optional[str] = None,
+    raw_text: Optional[str] = None,
+    mode: str = "student",
+    temperature: float = 0.3,
+    max_tokens: int = 1500,
+    stop: Optional[List[str]] = None,
+    ctx: Optional[CaseContext] = None,
+    use_cache: bool = True,
+    source_url: Optional[str] = None
+) -> dict:
+    # fetch -> preprocess -> segment, returning the assembled brief ready for export_brief.
+    # source_url replaces a PDF's file:// path as the brief's Source URL (e.g. for a temporary upload)
+    if ctx is None:
+        ctx = CaseContext()
+    with active_context(ctx):
+        return _generate_brief(ctx, case_number, pdf_path, raw_text, mode, temperature, max_tokens, stop, use_cache, source_url)
+
+
+def _generate_brief(
+    ctx: CaseContext,
+    case_number: Optional[str],
+    pdf_path: Optional[str],
+    raw_text: Optional[str],
+    mode: str,
+    temperature: float,
+    max_tokens: int,
+    stop: Optional[List[str]],
+    use_cache: bool,
+    source_url: Optional[str] = None
+) -> dict:
+    # Finished briefs for a citation are cached, so a hit skips fetch and generation entirely;
+    # a cached extraction (from any mode) skips the fetch and the expensive pass over the opinion
+    cache_key = None
+    extraction_key = None
+    if use_cache and case_number:
+        cache_key = brief_cache_key(case_number, mode, temperature, max_tokens, stop)
+        if load_cached_brief(ctx, cache_key):
+            index_brief(ctx, mode, only_missing=True)
+            return ctx.brief
+        if two_stage_enabled():
+            extraction_key = extraction_cache_key(case_number, temperature, stop)
+            if load_cached_extraction(ctx, extraction_key):
+                return finish_brief(ctx, mode, temperature, max_tokens, stop, cache_key, extraction_key)
+
+    with ctx.timed("fetch"):
+        full_text = handle_input(case_number, pdf_path, raw_text, ctx, source_url=source_url)
+    with ctx.timed("preprocess"):
+        ctx.cleaned_text = preprocess(full_text)
+    return finish_brief(ctx, mode, temperature, max_tokens, stop, cache_key, extraction_key)
+
+
+def brief_cache_key(
+    case_number: str,
+    mode: str,
+    temperature: float,
+    max_tokens: int,
+    stop: Optional[List[str]]
+) -> str:
+    return make_cache_key(case_number, mode, temperature, max_tokens, stop, MODEL_NAME, PROMPT_VERSION)
+
+
+def load_cached_brief(ctx: CaseContext, cache_key: str) -> bool:
+    cache = get_brief_cache()
+    if cache is None:
+        return False
+    with ctx.timed("cache"):
+        cached = cache.get(cache_key)
+    metrics.CACHE_LOOKUPS.inc(cache="brief", result="miss" if cached is None else "hit")
+    if cached is None:
+        return False
+    ctx.cache_hit = True
+    ctx.metadata = cached["metadata"]
+    ctx.sections = cached["sections"]
+    ctx.brief = assemble_final_brief(ctx.metadata, ctx.sections)
+    if ctx.on_section is not None:
+        for key in SECTION_KEYS:
+            ctx.on_section(key, ctx.sections[key])
+    return True
+
+
+def extraction_cache_key(case_number: str, temperature: float, stop: Optional[List[str]]) -> str:
+    # Mode-independent: every mode of a citation shares one extraction
+    return make_cache_key(
+        case_number, "extract", temperature, int(os.getenv("LEX_EXTRACT_MAX_TOKENS", "2500")), stop,
+        MODEL_NAME, f"extract-{EXTRACTION_VERSION}-{'passages' if retrieval_enabled() else 'full'}"
+    )
+
+
+def load_cached_extraction(ctx: CaseContext, extraction_key: str) -> bool:
+    cache = get_brief_cache()
+    if cache is None:
+        return False
+    with ctx.timed("cache"):
+        cached = cache.get(extraction_key)
+    metrics.CACHE_LOOKUPS.inc(cache="extraction", result="miss" if cached is None else "hit")
+    if cached is None:
+        return False
+    ctx.metadata = cached["metadata"]
+    ctx.extraction = cached["extraction"]
+    return True
+
+
+def finish_brief(
+    ctx: CaseContext,
+    mode: str,
+    temperature: float,
+    max_tokens: int,
+    stop: Optional[List[str]],
+    cache_key: Optional[str] = None,
+    extraction_key: Optional[str] = None
+) -> dict:
+    # LLM half of the pipeline: compact and segment ctx.cleaned_text (or style a cached extraction),
+    # assemble the brief and cache it if it is clean
+    with active_context(ctx):
+        return _finish_brief(ctx, mode, temperature, max_tokens, stop, cache_key, extraction_key)
+
+
+def _finish_brief(
+    ctx: CaseContext,
+    mode: str,
+    temperature: float,
+    max_tokens: int,
+    stop: Optional[List[str]],
+    cache_key: Optional[str],
+    extraction_key: Optional[str]
+) -> dict:
+    had_extraction = ctx.extraction is not None
+    if not had_extraction:
+        with ctx.timed("compact"):
+            # The extraction is shared by every mode, so it gets the mode-independent budget; a mode
+            # that falls back to its own prompt is compacted again to its budget in segment_case_sections
+            compact_case_text(ctx, "extract" if two_stage_enabled() else mode)
+    with ctx.timed("generate"):
+        brief_sections = segment_case_sections(
+            ctx,
+            mode,
+            temperature,
+            max_tokens,
+            stop
+        )
+    ctx.brief = assemble_final_brief(ctx.metadata, brief_sections)
+
+    cache = get_brief_cache() if cache_key or extraction_key else None
+    metadata = {k: v for k, v in ctx.metadata.items() if k != "full_text"}
+    if cache is not None and extraction_key and ctx.extraction is not None and not had_extraction:
+        cache.put(extraction_key, {"metadata": metadata, "extraction": ctx.extraction})
+    if cache is not None and cache_key and not brief_has_errors(ctx.brief):
+        cache.put(cache_key, {"metadata": metadata, "sections": brief_sections})
+    index_brief(ctx, mode)
+    return ctx.brief
+
+
+_trace_lock = threading.Lock()
+
+
+def record_brief_outcome(ctx: CaseContext, citation: Optional[str], mode: str, status: str, error: Optional[str] = None):
+    # status: "done", "hallucination" or "failed"; counted in the metrics and, with LEX_TRACE_LOG set,
+    # written as one JSON line with the brief's stage spans and model requests
+    metrics.BRIEFS.inc(outcome=status)
+    path = os.getenv("LEX_TRACE_LOG")
+    if not path:
+        return
+    record = {
+        "trace_id": uuid.uuid4().hex,
+        "timestamp": datetime.now(local_timezone()).isoformat(timespec="seconds"),
+        "citation": citation,
+        "case_name": ctx.metadata.get("case_name"),
+        "mode": mode,
+        "status": status,
+        "error": error,
+        "cache_hit": ctx.cache_hit,
+        "seconds": round(time.perf_counter() - ctx.started, 4),
+        "timings": {stage: round(t, 4) for stage, t in ctx.timings.items()},
+        "spans": ctx.spans,
+        "llm_calls": ctx.llm_calls,
+        "compaction": ctx.compaction,
+    }
+    try:
+        with _trace_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        print(f"⚠️ Could not write trace log '{path}': {e}")
+
+
+# ----------- CLI -----------
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="pipeline.py")
+    parser.add_argument("--case", type=str, help="Case citation number")
+    parser.add_argument("--pdf", type=str, help="Path to PDF")
+    parser.add_argument("--text", type=str, help="Raw case text")
+    parser.add_argument("--mode", type=str, choices=["student", "professional"], default="student")
+    parser.add_argument("--format", type=str, choices=["json", "txt", "pdf", "zip"], default="json")
+    parser.add_argument("--output", type=str, default="brief_output.json")
+    parser.add_argument("--temperature", type=float, default=0.3, help="Sampling temperature for generation (0.0–1.0)")
+    parser.add_argument("--max-tokens", type=int, default=1500, help="Maximum number of tokens to generate")
+    parser.add_argument("--stop-sequences", nargs="*", default=None, help="One or more stop sequences (e.g. --stop-sequences '###' '')")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached briefs and regenerate")
+    parser.add_argument("--batch", type=str, help="File of citations (.txt one per line, .csv with a 'citation' column, or .jsonl)")
+    parser.add_argument("--output-dir", type=str, default="briefs", help="Batch output directory (holds manifest.jsonl)")
+    parser.add_argument("--fetch-workers", type=int, default=8, help="Concurrent CourtListener fetches in batch mode")
+    parser.add_argument("--llm-workers", type=int, default=int(os.getenv("LEX_LLM_WORKERS", "1")), help="Concurrent generations in batch mode")
+    parser.add_argument("--render-workers", type=int, default=None, help="PDF render processes in batch mode (default: CPU count)")
+    parser.add_argument("--no-resume", action="store_true", help="Regenerate items already recorded as done in the batch manifest")
+    parser.add_argument("--ingest", type=str, help="CourtListener bulk-data directory (opinion-clusters-, opinions- and citations-*.csv.bz2) to load into the opinion store")
+    parser.add_argument("--ingest-reporter", action="append", default=None, help="Only ingest clusters cited in this reporter, e.g. 'U.S.' (repeatable)")
+    parser.add_argument("--ingest-cases", type=str, help="Only ingest the citations in this file (same formats as --batch)")
+    return parser
+
+
+# Read once, when the clients, pools, stores and caches below are first built. A daemon that warmed up
+# with other values can't apply a command's own, so daemon.py runs such a command in the client instead
+WARM_ENV = (
+    "LEX_OLLAMA_URLS", "OLLAMA_HOST", "LEX_OLLAMA_NUM_CTX", "LEX_OLLAMA_KEEP_ALIVE", "LEX_OLLAMA_POOL_SIZE",
+    "LEX_OLLAMA_EJECT_AFTER", "LEX_OLLAMA_HEALTH_INTERVAL", "LEX_LLM_WORKERS",
+    "CL_BASE_URL", "CL_POOL_SIZE", "LEX_OPINION_STORE", "LEX_OPINION_DB",
+    "LEX_CACHE", "LEX_CACHE_DIR", "LEX_CACHE_MEMORY_ITEMS", "LEX_CACHE_MAX_MB", "LEX_CACHE_TTL_HOURS",
+    "LEX_SEARCH", "LEX_SEARCH_DB", "LEX_TOKENIZER_FILE", "LEX_CHARS_PER_TOKEN", "TZ",
+)
+
+
+def warm_up():
+    # Opens what a long-lived process reuses across briefs: model and CourtListener sessions, the
+    # caches and stores, the token counter and the PDF render resources
+    get_llm_client()
+    get_courtlistener_client(os.getenv("CL_API_KEY"))
+    get_opinion_store()
+    get_brief_cache()
+    get_brief_index()
+    get_token_counter()
+    _warm_render_worker()
+
+
+def run_cli(argv: Optional[List[str]] = None) -> int:
+    # Runs one command line and returns its exit status; the daemon calls this for each client
+    args = build_arg_parser().parse_args(argv)
+
+    if args.ingest:
+        from corpus import find_export_files, ingest_bulk_export
+        store = get_opinion_store()
+        if store is None:
+            raise SystemExit("❌ The opinion store is disabled (LEX_OPINION_STORE=0)")
+        cases = None
+        if args.ingest_cases:
+            from batch import read_batch_file
+            cases = [item["citation"] for item in read_batch_file(args.ingest_cases)]
+        ingest_bulk_export(
+            find_export_files(args.ingest),
+            store,
+            reporters=args.ingest_reporter,
+            citations=cases,
+            base_url=os.getenv("CL_BASE_URL", "https://www.courtlistener.com")
+        )
+        return 0
+
+    if args.batch:
+        from batch import read_batch_file, run_batch
+        stats = run_batch(
+            read_batch_file(args.batch),
+            args.output_dir,
+            fmt=args.format,
+            mode=args.mode,
+            temperature=args.temperature,
+            max_tokens=args.max_tokens,
+            stop=args.stop_sequences,
+            fetch_workers=args.fetch_workers,
+            llm_workers=args.llm_workers,
+            render_workers=args.render_workers,
+            resume=not args.no_resume,
+            use_cache=not args.no_cache
+        )
+        print(f"📦 Batch finished: {stats['done']} done, {stats['failed']} failed, {stats['skipped']} skipped")
+        return 1 if stats["failed"] else 0
+
+    ctx = CaseContext()
+    final_brief = generate_brief(
+        args.case,
+        args.pdf,
+        args.text,
+        args.mode,
+        args.temperature,
+        args.max_tokens,
+        args.stop_sequences,
+        ctx=ctx,
+        use_cache=not args.no_cache
+    )
+
+    if args.format in ("pdf", "zip") and args.output == "brief_output.json":
+        args.output = default_output_path(final_brief, args.format)
+
+    if brief_has_errors(final_brief):
+        record_brief_outcome(ctx, args.case, args.mode, "hallucination")
         print("❌ Brief generation failed due to hallucination. Nothing was saved.")
     else:
-        if args.format == "pdf":
+        if args.format in ("pdf", "zip"):
             args.output = make_unique_path(args.output)
 
-        export_brief(final_brief, args.format, args.output)
+        export_brief(final_brief, args.format, args.output, ctx)
+        record_brief_outcome(ctx, args.case, args.mode, "done")
         print(f"✅ Brief saved to {args.output}")
-        print(args.output)
\ No newline at end of file
+        print(args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(run_cli())
@@ -0,0 +1,96 @@
+# --- prebrief.py (Generates briefs for a case list while the model is idle) ---
+
+from collections import deque
+from typing import Callable, List, Optional
+import threading
+import time
+
+from jobs import Job, QueueFullError
+
+
+class PrebriefScheduler:
+    """Background thread that works through (citation, mode) pairs, one low-priority job at a time.
+
+    A job is submitted only after the queue has had no other work for `idle_seconds`. `busy()` reports
+    how many jobs are queued or running, and `is_done(citation, mode)` skips pairs whose brief is
+    already cached, so a restart picks up where the last run stopped. `submit(citation, mode)`
+    queues the job; user requests for the same brief join it.
+    """
+
+    def __init__(
+        self,
+        pairs: List[tuple],
+        submit: Callable[[str, str], Job],
+        busy: Callable[[], int],
+        is_done: Callable[[str, str], bool],
+        idle_seconds: float = 30.0,
+        poll_seconds: float = 5.0
+    ):
+        self.submit = submit
+        self.busy = busy
+        self.is_done = is_done
+        self.idle_seconds = idle_seconds
+        self.poll_seconds = poll_seconds
+        self._todo = deque(pairs)
+        self._current: Optional[Job] = None
+        self._stats = {"total": len(pairs), "done": 0, "cached": 0, "failed": 0}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="prebrief", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                self._stats,
+                remaining=len(self._todo),
+                current=self._current.params.get("citation") if self._current else None
+            )
+
+    def _run(self):
+        idle_since = time.monotonic()
+        while not self._stop.wait(self.poll_seconds):
+            current = self._current
+            if current is not None:
+                if current.status not in ("done", "failed"):
+                    if self.busy() > 1:
+                        idle_since = time.monotonic()
+                    continue
+                with self._lock:
+                    self._stats["done" if current.status == "done" else "failed"] += 1
+                    self._current = None
+                if current.status == "failed":
+                    print(f"⚠️ Pre-brief of {current.params.get('citation')} failed: {current.error}")
+            # Our own finished job doesn't count as activity; anything else restarts the idle clock
+            if self.busy() > 0:
+                idle_since = time.monotonic()
+                continue
+            if time.monotonic() - idle_since < self.idle_seconds:
+                continue
+            if not self._submit_next():
+                print(f"📚 Pre-briefing finished: {self.stats()}")
+                return
+
+    def _submit_next(self) -> bool:
+        # False once the list is exhausted
+        while self._todo:
+            citation, mode = self._todo[0]
+            try:
+                if self.is_done(citation, mode):
+                    with self._lock:
+                        self._todo.popleft()
+                        self._stats["cached"] += 1
+                    continue
+                job = self.submit(citation, mode)
+            except QueueFullError:
+                return True
+            with self._lock:
+                self._todo.popleft()
+                self._current = job
+            return True
+        return False
@@ -0,0 +1,131 @@
+# --- retrieval.py (Page-anchored passages and a BM25 index over one opinion) ---
+
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+import math
+import re
+
+PAGE_MARKER_RE = re.compile(r"\[Page (\d+)\]")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[A-Z])")
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be been but by for from had has have he her his if in into is it its of on or that the "
+    "their them there these they this those to was were which who will with would not no".split()
+)
+
+
+@dataclass
+class Passage:
+    index: int              # position in the opinion
+    page: Optional[str]     # page the passage starts on
+    kind: str               # opinion it belongs to: majority, concurrence, dissent, ...
+    text: str
+
+    def render(self) -> str:
+        return f"[Page {self.page}] {self.text}" if self.page else self.text
+
+
+def tokenize(text: str) -> List[str]:
+    # Lower-cased words without stopwords, with plural and -ed/-ing endings folded so "arrested" matches "arrest"
+    tokens = []
+    for word in WORD_RE.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        for suffix in ("ing", "ed", "es", "s"):
+            if len(word) > len(suffix) + 3 and word.endswith(suffix):
+                word = word[:-len(suffix)]
+                break
+        tokens.append(word)
+    return tokens
+
+
+def split_passages(text: str, headings: dict, max_chars: int = 900) -> List[Passage]:
+    """Splits preprocessed opinion text into passages of whole sentences, at most `max_chars` long
+    (longer sentences stand alone), that never span a page or an opinion boundary.
+
+    `headings` maps each separate-opinion heading (e.g. "Dissenting opinion") to its kind; text
+    before the first heading belongs to the majority. Each passage keeps the page it starts on.
+    """
+    heading_re = re.compile("(" + "|".join(map(re.escape, headings)) + r") by ") if headings else None
+    # Boundaries: (offset, new page or None, new kind or None)
+    marks = [(m.start(), m.group(1), None) for m in PAGE_MARKER_RE.finditer(text)]
+    if heading_re is not None:
+        marks += [(m.start(), None, headings[m.group(1)]) for m in heading_re.finditer(text)]
+    marks.sort(key=lambda mark: mark[0])
+
+    passages = []
+    page, kind = None, "majority"
+
+    def add(segment: str):
+        current = ""
+        for sentence in SENTENCE_RE.split(segment):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            if current and len(current) + len(sentence) + 1 > max_chars:
+                passages.append(Passage(len(passages), page, kind, current))
+                current = ""
+            current = f"{current} {sentence}" if current else sentence
+        if current:
+            passages.append(Passage(len(passages), page, kind, current))
+
+    last = 0
+    for offset, new_page, new_kind in marks:
+        add(PAGE_MARKER_RE.sub("", text[last:offset]))
+        if new_page is not None:
+            page = new_page
+        if new_kind is not None:
+            kind = new_kind
+        last = offset
+    add(PAGE_MARKER_RE.sub("", text[last:]))
+    return passages
+
+
+class PassageIndex:
+    """Okapi BM25 over one opinion's passages, built once and queried once per brief section."""
+
+    def __init__(self, passages: List[Passage], k1: float = 1.2, b: float = 0.75):
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+        self._terms = [Counter(tokenize(p.text)) for p in passages]
+        self._lengths = [sum(terms.values()) for terms in self._terms]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if passages else 0.0
+        df = Counter()
+        for terms in self._terms:
+            df.update(terms.keys())
+        n = len(passages)
+        self._idf = {term: math.log(1 + (n - count + 0.5) / (count + 0.5)) for term, count in df.items()}
+
+    def score(self, query_terms: List[str], i: int) -> float:
+        terms = self._terms[i]
+        norm = self.k1 * (1 - self.b + self.b * self._lengths[i] / (self._avg_length or 1))
+        total = 0.0
+        for term in query_terms:
+            tf = terms.get(term)
+            if tf:
+                total += self._idf[term] * tf * (self.k1 + 1) / (tf + norm)
+        return total
+
+    def search(
+        self,
+        query: str,
+        k: int,
+        where: Optional[Callable[[Passage], bool]] = None,
+        pinned: Optional[List[int]] = None
+    ) -> List[Passage]:
+        # The `pinned` passages plus the best-scoring others (restricted by `where`), up to k, in opinion order
+        query_terms = tokenize(query)
+        chosen = dict.fromkeys(i for i in pinned or [] if 0 <= i < len(self.passages))
+        ranked = sorted(
+            (i for i, p in enumerate(self.passages) if i not in chosen and (where is None or where(p))),
+            key=lambda i: self.score(query_terms, i),
+            reverse=True
+        )
+        for i in ranked:
+            if len(chosen) >= k:
+                break
+            chosen[i] = None
+        return [self.passages[i] for i in sorted(chosen)]
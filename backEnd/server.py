@@ -1,30 +1,76 @@
 # --- server.py (FastAPI Backend) ---
 
+from contextlib import asynccontextmanager
+from typing import Optional
+from urllib.parse import quote
 import subprocess
+import threading
+import asyncio
 import shlex
+import json
 import os
 
-from fastapi import FastAPI, HTTPException, Form
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, Form, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+
+import pipeline
+import metrics
+from jobs import Job, JobQueue, QueueFullError
+from uploads import receive_upload
+from pdf_ingest import pdf_support_available
+from artifacts import ArtifactStore
+from prebrief import PrebriefScheduler
+
+# "inprocess" (default) calls the warm pipeline engine directly; "subprocess" shells out to pipeline.py
+PIPELINE_BACKEND = os.getenv("LEX_PIPELINE_BACKEND", "inprocess").lower()
+
+# Uploaded slip opinions are streamed here and deleted once their brief is done
+UPLOAD_DIR = os.getenv("LEX_UPLOAD_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "uploads"))
+UPLOAD_MAX_BYTES = int(float(os.getenv("LEX_UPLOAD_MAX_MB", "100")) * 1024 * 1024)
+
+OUTPUT_MEDIA_TYPES = {
+    "pdf": "application/pdf",
+    "json": "application/json",
+    "txt": "text/plain; charset=utf-8",
+    "zip": "application/zip",
+}
+
+# Rendered outputs are served from memory; LEX_ARTIFACT_DIR also keeps them on disk until retention expires
+artifact_store = ArtifactStore(
+    os.getenv("LEX_ARTIFACT_DIR") or None,
+    retention_seconds=float(os.getenv("LEX_ARTIFACT_RETENTION_SECONDS", "3600")),
+    max_memory_bytes=int(float(os.getenv("LEX_ARTIFACT_MEMORY_MB", "64")) * 1024 * 1024)
+)
+
+# Case list pre-generated in the background while no one is waiting on the model
+PREBRIEF_CASES = os.getenv("LEX_PREBRIEF_CASES")
+PREBRIEF_MODES = [m.strip() for m in os.getenv("LEX_PREBRIEF_MODES", "professional").split(",") if m.strip()]
+PREBRIEF_IDLE_SECONDS = float(os.getenv("LEX_PREBRIEF_IDLE_SECONDS", "30"))
+prebrief_scheduler = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the model at startup so the first brief doesn't pay for it; runs in the background so startup isn't blocked
+    if os.getenv("LEX_OLLAMA_PRELOAD", "1") != "0":
+        threading.Thread(target=pipeline.preload_model, name="ollama-preload", daemon=True).start()
+    if PREBRIEF_CASES:
+        _start_prebrief(PREBRIEF_CASES)
+    yield
+    if prebrief_scheduler is not None:
+        prebrief_scheduler.stop()
+
 
 app = FastAPI(
     title="LexEmetica-Clerk Server",
     description="Proxy to pipeline.py for PDF case briefs",
-    version="1.0"
+    version="1.0",
+    lifespan=lifespan
 )
 
-@app.post("/api/brief/by-citation")
-async def brief_by_citation(
-    citation: str = Form(...),
-    mode:     str = Form("professional"),
-    fmt:      str = Form("pdf")
-):
-    # Validate inputs
-    if not citation.strip():
-        raise HTTPException(400, "Citation cannot be empty")
-    if fmt.lower() != "pdf":
-        raise HTTPException(400, "This endpoint only supports PDF")
 
+def _run_pipeline_subprocess(citation: str, mode: str) -> str:
     # Build the safe shell command
     cmd = (
         f"python3 pipeline.py "
@@ -50,8 +96,227 @@ async def brief_by_citation(
     lines = proc.stdout.strip().splitlines()
     if not lines:
         raise HTTPException(500, "Pipeline did not report an output file")
-    output_file = lines[-1]
+    return lines[-1]
+
+
+class HallucinationError(RuntimeError):
+    pass
+
+
+def render_output(brief: dict, fmt: str) -> bytes:
+    # Each format is rendered once per brief content; a ZIP reuses the individual renders
+    key = pipeline.brief_digest(brief)
+    data = artifact_store.get(key, fmt)
+    if data is None:
+        if fmt == "zip":
+            data = pipeline.bundle_outputs(brief, {f: render_output(brief, f) for f in pipeline.OUTPUT_FORMATS})
+        else:
+            data = pipeline.render_brief(brief, fmt)
+        artifact_store.put(key, fmt, data)
+    return data
+
+
+def _build_brief(job: Job) -> dict:
+    # Job handler: the ctx shares the job's timings dict so stage times are visible while it runs
+    metrics.STAGE_SECONDS.observe(job.timings.get("queued", 0.0), stage="queued")
+    ctx = pipeline.CaseContext(
+        timings=job.timings,
+        on_section=lambda section, content: job.publish({"event": "section", "section": section, "content": content})
+    )
+    citation, mode = job.params["citation"], job.params["mode"]
+    pdf_path = job.params.get("pdf_path")
+    try:
+        if pdf_path:
+            # Uploaded opinion: the form supplies what CourtListener would have
+            ctx.metadata.update({k: v for k, v in job.params.get("metadata", {}).items() if v})
+            try:
+                # The spooled file is deleted below, so the brief names the client's file instead
+                final_brief = pipeline.generate_brief(
+                    pdf_path=pdf_path, mode=mode, ctx=ctx, source_url=job.params.get("filename") or "N/A"
+                )
+            finally:
+                os.remove(pdf_path)
+        else:
+            final_brief = pipeline.generate_brief(case_number=citation, mode=mode, ctx=ctx)
+        if pipeline.brief_has_errors(final_brief):
+            pipeline.record_brief_outcome(ctx, citation, mode, "hallucination")
+            raise HallucinationError("Brief generation failed due to hallucination")
+
+        # Any format can be fetched from the finished job; the one asked for first is rendered up front
+        if job.params.get("fmt"):
+            with ctx.timed("export"):
+                render_output(final_brief, job.params["fmt"])
+    except HallucinationError:
+        raise
+    except Exception as e:
+        pipeline.record_brief_outcome(ctx, citation, mode, "failed", str(e))
+        raise
+    pipeline.record_brief_outcome(ctx, citation, mode, "done")
+    return final_brief
+
+
+# Size LEX_LLM_WORKERS to the number of generations the Ollama backend can run in parallel
+job_queue = JobQueue(
+    _build_brief,
+    workers=int(os.getenv("LEX_LLM_WORKERS", "1")),
+    max_queued=int(os.getenv("LEX_QUEUE_MAX", "100")),
+    retention_seconds=float(os.getenv("LEX_JOB_RETENTION_SECONDS", "3600"))
+)
+
+
+QUEUE_JOBS = metrics.gauge("lex_queue_jobs", "Brief jobs by state", ("state",))
+QUEUE_COALESCED = metrics.counter("lex_queue_coalesced_total", "Requests that joined an identical in-flight job")
+
+
+def _collect_queue_metrics():
+    stats = job_queue.stats()
+    for state in ("queued", "running"):
+        QUEUE_JOBS.set(stats[state], state=state)
+    QUEUE_COALESCED.set_total(stats["coalesced"])
+
+
+metrics.REGISTRY.add_collector(_collect_queue_metrics)
+
+
+def _job_key(params: dict) -> str:
+    # Identical requests while a brief is queued or generating share one job, whatever format they want
+    key = {k: v for k, v in params.items() if k != "fmt"}
+    return json.dumps(dict(key, citation=" ".join(params["citation"].split()).upper()), sort_keys=True)
+
+
+def _submit_job(citation: str, mode: str, fmt: str = "pdf") -> Job:
+    params = {"citation": citation, "mode": mode, "fmt": fmt}
+    try:
+        return job_queue.submit(params, key=_job_key(params))
+    except QueueFullError as e:
+        raise HTTPException(503, str(e), headers={"Retry-After": "30"})
+
+
+def _start_prebrief(path: str):
+    global prebrief_scheduler
+    from batch import read_batch_file
+    if pipeline.get_brief_cache() is None:
+        print("⚠️ Pre-briefing needs the brief cache (LEX_CACHE=0); not started")
+        return
+    # A row's own "mode" column overrides LEX_PREBRIEF_MODES
+    pairs = [
+        (item["citation"], mode)
+        for item in read_batch_file(path)
+        for mode in ([item["mode"]] if item.get("mode") else PREBRIEF_MODES)
+    ]
+
+    def submit(citation: str, mode: str) -> Job:
+        # No format: nothing is rendered until someone asks for it
+        params = {"citation": citation, "mode": mode, "fmt": None}
+        return job_queue.submit(params, key=_job_key(params), background=True)
+
+    def busy() -> int:
+        stats = job_queue.stats()
+        return stats["running"] + stats["queued"]
+
+    prebrief_scheduler = PrebriefScheduler(
+        pairs, submit, busy, pipeline.has_cached_brief, idle_seconds=PREBRIEF_IDLE_SECONDS
+    )
+    prebrief_scheduler.start()
+    print(f"📚 Pre-briefing {len(pairs)} brief(s) from {path} when idle for {PREBRIEF_IDLE_SECONDS:.0f}s")
+
+
+def _submit_upload_job(upload, mode: str, fmt: str = "pdf") -> Job:
+    # Re-uploads of the same file while its brief is in flight share the job (and its copy of the file)
+    metadata = {k: upload.fields.get(k, "").strip() for k in ("case_name", "citation", "date", "judges")}
+    params = {"citation": metadata["citation"] or upload.filename, "mode": mode, "fmt": fmt}
+    key = json.dumps(dict(params, citation=upload.sha256, metadata=metadata, fmt=None), sort_keys=True)
+    try:
+        job = job_queue.submit(dict(params, pdf_path=upload.path, filename=upload.filename, metadata=metadata), key=key)
+    except QueueFullError as e:
+        upload.discard()
+        raise HTTPException(503, str(e), headers={"Retry-After": "30"})
+    if job.params.get("pdf_path") != upload.path:
+        upload.discard()
+    return job
+
+
+def _job_status(job: Job) -> dict:
+    status = job.to_dict()
+    status["params"] = {k: v for k, v in job.params.items() if k != "pdf_path"}
+    status["position"] = job_queue.position(job)
+    status["queue"] = job_queue.stats()
+    return status
+
+
+def _negotiate_format(fmt: Optional[str], accept: Optional[str] = None) -> str:
+    # An explicit fmt wins, then the Accept header by q-value, then PDF
+    if fmt:
+        fmt = fmt.lower()
+        if fmt not in OUTPUT_MEDIA_TYPES:
+            raise HTTPException(400, f"Unsupported format '{fmt}' (use pdf, json, txt or zip)")
+        return fmt
+    if not accept:
+        return "pdf"
+    ranges = []
+    for i, part in enumerate(accept.split(",")):
+        media, _, params = part.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        ranges.append((-q, i, media.strip().lower()))
+    for neg_q, _, media in sorted(ranges):
+        if neg_q >= 0:
+            break
+        if media in ("*/*", "application/*"):
+            return "pdf"
+        if media == "text/*":
+            return "txt"
+        for name, media_type in OUTPUT_MEDIA_TYPES.items():
+            if media == media_type.split(";")[0]:
+                return name
+    raise HTTPException(406, "Available formats: application/pdf, application/json, text/plain, application/zip")
+
+
+def _output_response(brief: dict, fmt: str, data: bytes) -> Response:
+    stem = pipeline.case_file_stem(brief)
+    filename = f"{stem}.{fmt}"
+    if quote(filename) == filename:
+        disposition = f'attachment; filename="{filename}"'
+    else:
+        disposition = f"attachment; filename*=utf-8''{quote(filename)}"
+    return Response(
+        data,
+        media_type=OUTPUT_MEDIA_TYPES[fmt],
+        headers={
+            "Content-Disposition": disposition,
+            "X-Case-Name": stem.replace('_', ' ').replace('.', '').strip(),
+            "Vary": "Accept",
+        }
+    )
+
+
+def _resolve(future: asyncio.Future):
+    # The waiting request may have been cancelled (client gone) before the job finished
+    if not future.done():
+        future.set_result(None)
 
+
+async def _wait_for_job(job: Job):
+    # The worker resolves a Future on this loop, so a waiting request holds no threadpool thread
+    # however many requests are coalesced onto the job
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+    job.add_done_callback(lambda _: loop.call_soon_threadsafe(_resolve, done))
+    await done
+
+
+async def _job_output(job: Job, fmt: str) -> Response:
+    data = await run_in_threadpool(render_output, job.result, fmt)
+    return _output_response(job.result, fmt, data)
+
+
+def _pdf_response(output_file: str) -> FileResponse:
     # Confirm it exists
     if not os.path.isfile(output_file):
         raise HTTPException(500, f"Pipeline reported file '{output_file}' but it was not found")
@@ -66,4 +331,195 @@ async def brief_by_citation(
         media_type='application/pdf'
     )
     response.headers["X-Case-Name"] = clean_case_name
-    return response
\ No newline at end of file
+    return response
+
+
+@app.post("/api/brief/by-citation")
+async def brief_by_citation(
+    request:  Request,
+    citation: str = Form(...),
+    mode:     str = Form("professional"),
+    fmt:      Optional[str] = Form(None)
+):
+    # Validate inputs
+    if not citation.strip():
+        raise HTTPException(400, "Citation cannot be empty")
+    fmt = _negotiate_format(fmt, request.headers.get("accept"))
+
+    # Run off the event loop so one slow brief doesn't stall other requests
+    if PIPELINE_BACKEND == "subprocess":
+        if fmt != "pdf":
+            raise HTTPException(400, "The subprocess backend only supports PDF")
+        output_file = await run_in_threadpool(_run_pipeline_subprocess, citation, mode)
+        return _pdf_response(output_file)
+
+    # Cached (e.g. pre-briefed) cases are answered directly instead of waiting behind generations in the queue
+    ctx = pipeline.CaseContext()
+    brief = await run_in_threadpool(pipeline.cached_brief, citation, mode, ctx)
+    if brief is not None:
+        pipeline.record_brief_outcome(ctx, citation, mode, "done")
+        data = await run_in_threadpool(render_output, brief, fmt)
+        return _output_response(brief, fmt, data)
+
+    job = _submit_job(citation, mode, fmt)
+    await _wait_for_job(job)
+    if job.status == "failed":
+        raise HTTPException(500, f"Pipeline error:\n{job.error}")
+    return await _job_output(job, fmt)
+
+
+# ----------- Asynchronous Job API -----------
+@app.post("/api/briefs", status_code=202)
+async def submit_brief(
+    citation: str = Form(...),
+    mode:     str = Form("professional"),
+    fmt:      str = Form("pdf")
+):
+    if not citation.strip():
+        raise HTTPException(400, "Citation cannot be empty")
+
+    job = _submit_job(citation, mode, _negotiate_format(fmt))
+    return JSONResponse(_job_status(job), status_code=202, headers={"Location": f"/api/briefs/{job.id}"})
+
+
+@app.post("/api/briefs/upload", status_code=202)
+async def submit_upload(request: Request):
+    # multipart/form-data: "file" (the opinion PDF) plus optional mode, case_name, citation, date and judges.
+    # The body is parsed as it streams in and the PDF written straight to disk.
+    if not pdf_support_available():
+        raise HTTPException(501, "PDF uploads need the 'pymupdf' package on the server (pip install pymupdf)")
+    upload = await receive_upload(request, UPLOAD_DIR, UPLOAD_MAX_BYTES, suffix=".pdf")
+    mode = upload.fields.get("mode", "professional")
+    with open(upload.path, "rb") as f:
+        is_pdf = b"%PDF-" in f.read(1024)
+    try:
+        if not is_pdf:
+            raise HTTPException(415, "Uploaded file is not a PDF")
+        fmt = _negotiate_format(upload.fields.get("fmt", "pdf"))
+    except HTTPException:
+        upload.discard()
+        raise
+
+    job = _submit_upload_job(upload, mode, fmt)
+    return JSONResponse(_job_status(job), status_code=202, headers={"Location": f"/api/briefs/{job.id}"})
+
+
+@app.get("/api/queue")
+async def queue_stats():
+    stats = job_queue.stats()
+    if prebrief_scheduler is not None:
+        stats["prebrief"] = prebrief_scheduler.stats()
+    return stats
+
+
+@app.get("/api/briefs/search")
+async def search_briefs(
+    q:        Optional[str] = None,
+    party:    Optional[str] = None,
+    justice:  Optional[str] = None,
+    doctrine: Optional[str] = None,
+    mode:     Optional[str] = None,
+    limit:    int = 20,
+    offset:   int = 0
+):
+    # Full-text search over briefs already generated; nothing is generated here
+    index = pipeline.get_brief_index()
+    if index is None:
+        raise HTTPException(503, "Brief search is disabled")
+    try:
+        results = await run_in_threadpool(
+            index.search, q, party, justice, doctrine, mode, max(1, min(limit, 100)), max(0, offset)
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {"results": results, "count": len(results)}
+
+
+@app.get("/api/stats/llm")
+async def llm_stats():
+    # Token counts and throughput reported by Ollama since the server started
+    return pipeline.get_llm_client().stats()
+
+
+@app.get("/api/stats/sections")
+async def section_stats():
+    # Per-section validation outcomes since the server started
+    return pipeline.get_section_stats()
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    # Prometheus text exposition: stage timings, model tokens and latency, cache and validation counters, queue depth
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/briefs/{job_id}")
+async def brief_status(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Unknown job id")
+    return _job_status(job)
+
+
+async def _job_event_stream(job: Job):
+    # Server-sent events: replays everything published so far, then follows the job until it finishes.
+    # The publishing thread sets an asyncio.Event on this loop, so an open stream holds no thread.
+    loop = asyncio.get_running_loop()
+    published = asyncio.Event()
+    remove_listener = job.add_listener(lambda: loop.call_soon_threadsafe(published.set))
+    index = 0
+    try:
+        while True:
+            published.clear()
+            events = job.events_since(index, 0)
+            if not events:
+                try:
+                    await asyncio.wait_for(published.wait(), 15.0)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                continue
+            for event in events:
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+                if event["event"] == "status" and event.get("status") in ("done", "failed"):
+                    return
+            index += len(events)
+    finally:
+        remove_listener()
+
+
+def _sse_response(job: Job) -> StreamingResponse:
+    return StreamingResponse(
+        _job_event_stream(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Job-Id": job.id}
+    )
+
+
+@app.get("/api/briefs/{job_id}/events")
+async def brief_events(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Unknown job id")
+    return _sse_response(job)
+
+
+@app.get("/api/brief/stream")
+async def brief_stream(citation: str, mode: str = "professional"):
+    # EventSource-friendly shortcut: queue a brief and stream its sections as they are generated
+    if not citation.strip():
+        raise HTTPException(400, "Citation cannot be empty")
+    return _sse_response(_submit_job(citation, mode))
+
+
+@app.get("/api/briefs/{job_id}/result")
+async def brief_result(request: Request, job_id: str, format: Optional[str] = None):
+    # ?format=pdf|json|txt|zip, else the Accept header; every format comes from the same generation
+    fmt = _negotiate_format(format, request.headers.get("accept"))
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Unknown job id")
+    if job.status == "failed":
+        raise HTTPException(500, f"Pipeline error:\n{job.error}")
+    if job.status != "done":
+        raise HTTPException(409, f"Job is still {job.status}")
+    return await _job_output(job, fmt)
@@ -0,0 +1,5 @@
+# Tests import the backEnd modules the way the CLI and server do: flat, from the backEnd directory
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,95 @@
+# --- Batch manifest: resuming skips finished citations and retries the rest ---
+
+import json
+import os
+
+import pytest
+
+import batch
+import pipeline
+
+
+def _entry(citation, status, output=None, mode="student", fmt="json"):
+    return json.dumps({"citation": citation, "mode": mode, "format": fmt, "status": status, "output": output})
+
+
+def test_load_completed_keeps_the_last_outcome(tmp_path):
+    done = tmp_path / "Miranda_v._Arizona.json"
+    done.write_text("{}")
+    manifest = tmp_path / batch.MANIFEST_NAME
+    manifest.write_text("\n".join([
+        _entry("384 U.S. 436", "done", str(done)),
+        _entry("372 U.S. 335", "done", str(done)),
+        _entry("372 U.S. 335", "failed"),
+        _entry("347 U.S. 483", "failed"),
+        _entry("347 U.S. 483", "done", str(done)),
+        _entry("410 U.S. 113", "done", str(tmp_path / "deleted.json")),
+        '{"citation": "5 U.S. 137", "mode": "stu',  # torn by a crash mid-write
+    ]) + "\n")
+    completed = batch.load_completed(str(manifest))
+    assert completed == {"384 U.S. 436|student|json": str(done), "347 U.S. 483|student|json": str(done)}
+    assert batch.load_completed(str(tmp_path / "missing.jsonl")) == {}
+
+
+@pytest.fixture
+def fake_pipeline(monkeypatch):
+    # Fetches succeed except for citations in `failing`; briefs are named after their citation
+    state = {"fetched": [], "failing": set()}
+
+    def handle_input(citation, ctx=None, cluster=None):
+        state["fetched"].append(citation)
+        if citation in state["failing"]:
+            raise RuntimeError(f"No opinion found for {citation}")
+        return f"[Page 1] Opinion in {citation}."
+
+    def finish_brief(ctx, mode, *args):
+        ctx.brief = {"Case Name": f"Case {ctx.cleaned_text.split()[-1].rstrip('.')}", "Citation": mode}
+
+    monkeypatch.setattr(pipeline, "resolve_citations", lambda citations, api_key: {})
+    monkeypatch.setattr(pipeline, "handle_input", handle_input)
+    monkeypatch.setattr(pipeline, "finish_brief", finish_brief)
+    monkeypatch.setattr(pipeline, "brief_has_errors", lambda brief: False)
+    return state
+
+
+def _run(items, output_dir):
+    return batch.run_batch([{"citation": c} for c in items], str(output_dir), fmt="json", use_cache=False)
+
+
+def test_rerun_skips_done_citations_and_retries_failed_ones(fake_pipeline, tmp_path):
+    fake_pipeline["failing"] = {"372 U.S. 335"}
+    assert _run(["384 U.S. 436", "372 U.S. 335"], tmp_path) == {"done": 1, "failed": 1, "skipped": 0}
+
+    fake_pipeline["failing"] = set()
+    fake_pipeline["fetched"] = []
+    # The same citation written differently is still the finished item
+    assert _run(["384  u.s. 436", "372 U.S. 335"], tmp_path) == {"done": 1, "failed": 0, "skipped": 1}
+    assert fake_pipeline["fetched"] == ["372 U.S. 335"]
+
+    fake_pipeline["fetched"] = []
+    assert _run(["384 U.S. 436", "372 U.S. 335"], tmp_path) == {"done": 0, "failed": 0, "skipped": 2}
+    assert fake_pipeline["fetched"] == []
+
+    entries = [json.loads(line) for line in open(tmp_path / batch.MANIFEST_NAME)]
+    # The first run's two items finish in either order; the retry is appended after them
+    statuses = [(e["citation"], e["status"]) for e in entries]
+    assert sorted(statuses[:2]) == [("372 U.S. 335", "failed"), ("384 U.S. 436", "done")]
+    assert statuses[2:] == [("372 U.S. 335", "done")]
+
+
+def test_deleted_output_or_another_mode_is_generated_again(fake_pipeline, tmp_path):
+    assert _run(["384 U.S. 436"], tmp_path)["done"] == 1
+    output = batch.load_completed(str(tmp_path / batch.MANIFEST_NAME))["384 U.S. 436|student|json"]
+
+    stats = batch.run_batch([{"citation": "384 U.S. 436", "mode": "professional"}], str(tmp_path), fmt="json", use_cache=False)
+    assert stats == {"done": 1, "failed": 0, "skipped": 0}
+
+    os.remove(output)
+    fake_pipeline["fetched"] = []
+    assert _run(["384 U.S. 436"], tmp_path) == {"done": 1, "failed": 0, "skipped": 0}
+    assert fake_pipeline["fetched"] == ["384 U.S. 436"]
+
+    # Without resume everything runs again
+    fake_pipeline["fetched"] = []
+    stats = batch.run_batch([{"citation": "384 U.S. 436"}], str(tmp_path), fmt="json", resume=False, use_cache=False)
+    assert stats["skipped"] == 0 and fake_pipeline["fetched"] == ["384 U.S. 436"]
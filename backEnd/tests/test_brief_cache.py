@@ -0,0 +1,89 @@
+# --- BriefCache: TTL expiry, size-bounded disk eviction and promotion from disk into the memory LRU ---
+
+import os
+import time
+
+from brief_cache import BriefCache, make_cache_key
+
+
+def _key(citation: str) -> str:
+    return make_cache_key(citation, "student", 0.3, 1500, None, "mixtral", "1")
+
+
+def _value(n: int) -> dict:
+    return {"sections": {"Facts": "x" * 1000}, "n": n}
+
+
+def test_key_covers_generation_settings():
+    assert _key("384 U.S. 436") == _key(" 384  u.s. 436 ")
+    assert _key("384 U.S. 436") != make_cache_key("384 U.S. 436", "professional", 0.3, 1500, None, "mixtral", "1")
+    assert _key("384 U.S. 436") != make_cache_key("384 U.S. 436", "student", 0.3, 1500, None, "mixtral", "2")
+
+
+def test_entries_expire_in_both_tiers(tmp_path):
+    cache = BriefCache(str(tmp_path), ttl_seconds=0.2)
+    key = _key("384 U.S. 436")
+    cache.put(key, _value(1))
+    assert cache.get(key) == _value(1)
+    assert BriefCache(str(tmp_path), ttl_seconds=0.2).get(key) == _value(1)
+
+    time.sleep(0.3)
+    assert cache.get(key) is None
+    # The expired file is removed when it is read
+    assert not os.path.exists(cache._path(key))
+
+
+def test_disk_hit_keeps_its_original_age(tmp_path):
+    key = _key("384 U.S. 436")
+    BriefCache(str(tmp_path)).put(key, _value(1))
+    path = BriefCache(str(tmp_path))._path(key)
+    stored_at = time.time() - 0.9
+    os.utime(path, (stored_at, stored_at))
+
+    cache = BriefCache(str(tmp_path), ttl_seconds=1.0)
+    assert cache.get(key) == _value(1)
+    time.sleep(0.2)
+    # Promoted into memory with the file's age, not a fresh lifetime
+    assert cache.get(key) is None
+
+
+def test_disk_hits_are_promoted_into_the_memory_lru(tmp_path):
+    cache = BriefCache(str(tmp_path), max_items=2)
+    keys = [_key(f"{n} U.S. 1") for n in range(3)]
+    for n, key in enumerate(keys):
+        cache.put(key, _value(n))
+    assert list(cache._memory) == keys[1:]
+
+    assert cache.get(keys[0]) == _value(0)
+    assert list(cache._memory) == [keys[2], keys[0]]
+    # A memory hit moves the entry to the most recently used end
+    cache.get(keys[2])
+    assert list(cache._memory) == [keys[0], keys[2]]
+
+
+def test_disk_is_trimmed_least_recently_used_first(tmp_path):
+    cache = BriefCache(str(tmp_path), max_items=1, max_bytes=2500)
+    a, b, c = (_key(f"{n} U.S. 1") for n in "abc")
+    cache.put(a, _value(1))
+    cache.put(b, _value(2))
+    past = time.time() - 60
+    os.utime(cache._path(a), (past, past))
+    os.utime(cache._path(b), (past + 10, past + 10))
+
+    # Reading a from disk marks it as recently used, so b is the one to go
+    assert cache.get(a) == _value(1)
+    cache.put(c, _value(3))
+    assert os.path.exists(cache._path(a))
+    assert not os.path.exists(cache._path(b))
+    assert os.path.exists(cache._path(c))
+    assert cache._disk_bytes <= 2500
+    assert cache._disk_bytes == sum(os.path.getsize(cache._path(k)) for k in (a, c))
+
+
+def test_clear_empties_both_tiers(tmp_path):
+    cache = BriefCache(str(tmp_path))
+    key = _key("384 U.S. 436")
+    cache.put(key, _value(1))
+    cache.clear()
+    assert cache.get(key) is None
+    assert cache._disk_bytes == 0
@@ -0,0 +1,81 @@
+# --- Opinion compaction: page markers, the savings report, and the budgets the pipeline compacts to ---
+
+import pytest
+
+import fake_services
+import pipeline
+from compaction import PAGE_MARKER_RE, TokenCounter, compact_opinion
+
+
+@pytest.fixture
+def env(monkeypatch):
+    for name in ("LEX_COMPACT", "LEX_COMPACT_BUDGET_EXTRACT", "LEX_COMPACT_BUDGET_STUDENT", "LEX_COMPACT_BUDGET_PROFESSIONAL",
+                 "LEX_COMPACT_FOOTNOTES", "LEX_COMPACT_CITATIONS", "LEX_MAP_REDUCE_CHARS", "LEX_TWO_STAGE", "LEX_SECTION_RETRIEVAL"):
+        monkeypatch.delenv(name, raising=False)
+    return monkeypatch
+
+
+def _opinion(pages: int) -> str:
+    return pipeline.preprocess(fake_services.make_opinion_text(pages, 450, seed=3))
+
+
+def test_page_markers_survive_every_step():
+    text = _opinion(8)
+    compacted, report = compact_opinion(text, 1000, TokenCounter(), footnotes="strip", citations="strip")
+    assert report.steps == ["boilerplate", "syllabus", "citations", "footnotes:strip"]
+    assert PAGE_MARKER_RE.findall(compacted) == PAGE_MARKER_RE.findall(text)
+    assert "378 U. S. 478" not in compacted
+
+
+def test_report_counts_what_was_saved():
+    counter = TokenCounter()
+    text = _opinion(8)
+    compacted, report = compact_opinion(text, 12000, counter)
+    assert report.tokens_before == counter.count(text)
+    assert report.tokens_after == counter.count(compacted)
+    assert 0 < report.tokens_saved == report.tokens_before - report.tokens_after
+    assert report.to_dict()["tokens_saved"] == report.tokens_saved
+    # Under budget once the boilerplate is gone, so citations and footnotes are kept
+    assert report.steps == ["boilerplate", "syllabus"]
+    assert "378 U. S. 478" in compacted
+
+
+def test_default_budgets_stay_under_the_map_reduce_threshold(env):
+    threshold = 48000
+    for mode in ("extract", "professional", "student"):
+        assert pipeline.compaction_budget(mode) * TokenCounter().chars_per_token < threshold
+
+    # Too long for one prompt before compaction, short enough after, so no map step runs
+    ctx = pipeline.CaseContext(cleaned_text=_opinion(12))
+    assert len(ctx.cleaned_text) > threshold
+    assert pipeline.compact_case_text(ctx, "extract")
+    assert pipeline.opinion_source_text(ctx, 0.3) == (ctx.cleaned_text, False)
+
+
+def test_mode_prompts_get_the_mode_budget(env):
+    # An 8-page opinion fits the extraction budget after boilerplate removal but not the student one
+    seen = {}
+
+    def generate_sections_from_passages(ctx, mode, *args):
+        seen["text"] = ctx.cleaned_text
+        seen["passages"] = ctx.passages
+        return {key: "x" for key in pipeline.SECTION_KEYS}
+
+    env.setattr(pipeline, "extract_case_from_passages", lambda *args: None)
+    env.setattr(pipeline, "generate_sections_from_passages", generate_sections_from_passages)
+
+    ctx = pipeline.CaseContext(cleaned_text=_opinion(8))
+    first_pass = ctx.cleaned_text
+    pipeline.compact_case_text(ctx, "extract")
+    extracted = ctx.cleaned_text
+    tokens_before = ctx.compaction["tokens_before"]
+    pipeline.get_passage_index(ctx)
+
+    pipeline.segment_case_sections(ctx, "student", 0.3, 100, None)
+    assert len(seen["text"]) < len(extracted) < len(first_pass)
+    # The index over the extraction's text is rebuilt for the smaller one
+    assert seen["passages"] is None
+    assert ctx.compaction["budget"] == pipeline.compaction_budget("student")
+    assert ctx.compaction["tokens_before"] == tokens_before
+    assert ctx.compaction["steps"][:2] == ["boilerplate", "syllabus"] and "citations" in ctx.compaction["steps"]
+    assert PAGE_MARKER_RE.findall(seen["text"]) == PAGE_MARKER_RE.findall(first_pass)
@@ -0,0 +1,122 @@
+# --- Warm daemon: command round trip, per-command env/cwd, output scoping and the in-process fallback ---
+
+import os
+import socket
+import subprocess
+import sys
+import textwrap
+import time
+
+import pytest
+
+import daemon
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="the daemon needs Unix domain sockets")
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# A stand-in for pipeline.run_cli that reports what it sees, prints from a worker that inherits the
+# command's context and from a background thread that doesn't, and exits with argv[0]
+SERVER = textwrap.dedent("""
+    import os, sys, threading
+    from concurrent.futures import ThreadPoolExecutor
+    import daemon, pipeline
+
+    pool = ThreadPoolExecutor(1)
+
+    def run(argv):
+        if argv[0] == "raise":
+            raise ValueError("boom")
+        print(f"cwd={os.getcwd()} value={os.environ.get('LEX_TEST_VALUE')}")
+        pipeline.submit_in_context(pool, print, "from a worker").result()
+        noise = threading.Thread(target=print, args=("background noise",))
+        noise.start()
+        noise.join()
+        print("to stderr", file=sys.stderr)
+        return int(argv[0])
+
+    daemon.PipelineDaemon(run, sys.argv[1], warm_env=("CL_BASE_URL",)).serve_forever()
+""")
+
+
+@pytest.fixture
+def served(tmp_path, monkeypatch):
+    # The daemon runs in its own process, as it does for real, since it takes over sys.stdout
+    monkeypatch.delenv("LEX_DAEMON", raising=False)
+    monkeypatch.delenv("LEX_TEST_VALUE", raising=False)
+    monkeypatch.setenv("CL_BASE_URL", "http://courtlistener.test")
+    path = str(tmp_path / "d.sock")
+    script = tmp_path / "serve.py"
+    script.write_text(SERVER)
+    log = tmp_path / "daemon.log"
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, PYTHONUNBUFFERED="1")
+    with open(log, "w") as f:
+        proc = subprocess.Popen([sys.executable, str(script), path], cwd=BACKEND_DIR, env=env, stdout=f, stderr=subprocess.STDOUT)
+    deadline = time.time() + 30
+    while daemon._connect(path) is None:
+        assert proc.poll() is None, log.read_text()
+        assert time.time() < deadline, "daemon did not start"
+        time.sleep(0.05)
+    yield path, log
+    daemon.request("stop", path)
+    try:
+        proc.wait(10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def test_round_trip_in_the_callers_env_and_cwd(served, tmp_path, monkeypatch, capsys):
+    path, _ = served
+    work = tmp_path / "work"
+    work.mkdir()
+    monkeypatch.chdir(work)
+    monkeypatch.setenv("LEX_TEST_VALUE", "first")
+    assert daemon.run_remote(["3"], path) == 3
+    out, err = capsys.readouterr()
+    assert out.splitlines()[0] == f"cwd={work} value=first"
+    assert err == "to stderr\n"
+
+    # Each command gets its own caller's environment, not the previous one's
+    monkeypatch.delenv("LEX_TEST_VALUE")
+    monkeypatch.chdir(tmp_path)
+    assert daemon.run_remote(["0"], path) == 0
+    assert capsys.readouterr().out.splitlines()[0] == f"cwd={tmp_path} value=None"
+
+    assert daemon.run_remote(["raise"], path) == 1
+    assert "ValueError: boom" in capsys.readouterr().err
+    status = daemon.request("status", path)
+    assert (status["commands"], status["failed"], status["running"]) == (3, 2, None)
+
+
+def test_output_is_scoped_to_the_command(served, capsys):
+    path, log = served
+    assert daemon.run_remote(["0"], path) == 0
+    out = capsys.readouterr().out
+    assert "from a worker" in out
+    assert "background noise" not in out
+    deadline = time.time() + 10
+    while "background noise" not in log.read_text():
+        assert time.time() < deadline
+        time.sleep(0.05)
+    assert "from a worker" not in log.read_text()
+
+
+def test_client_runs_the_command_itself_without_a_usable_daemon(served, tmp_path, monkeypatch, capsys):
+    path, _ = served
+    # A warm setting the daemon was started with differs from the caller's
+    monkeypatch.setenv("CL_BASE_URL", "http://elsewhere.test")
+    assert daemon.run_remote(["0"], path) is None
+    assert "CL_BASE_URL; running here" in capsys.readouterr().err
+    assert daemon.request("status", path)["commands"] == 0
+
+    monkeypatch.setenv("CL_BASE_URL", "http://courtlistener.test")
+    monkeypatch.setenv("LEX_DAEMON", "0")
+    assert daemon.run_remote(["0"], path) is None
+    monkeypatch.delenv("LEX_DAEMON")
+
+    # Nothing listening, including a socket file left behind by a killed daemon
+    assert daemon.run_remote(["0"], str(tmp_path / "missing.sock")) is None
+    stale = tmp_path / "stale.sock"
+    stale.write_text("")
+    assert daemon.run_remote(["0"], str(stale)) is None
+    assert daemon.request("status", str(stale)) is None
@@ -0,0 +1,39 @@
+# --- Rendering the two-stage extraction when the model's JSON doesn't follow the schema ---
+
+import pytest
+
+from pipeline import SECTION_EXTRACTION_KEYS, render_extraction
+
+EXTRACTION = {
+    "parties": {"petitioner": "Miranda", "respondent": "Arizona"},
+    "majority_author": "Warren",
+    "facts": [{"point": "Miranda was questioned without warnings", "page": 491}],
+    "holding": [{"point": "The statements were inadmissible", "page": 444}],
+    "dissents": [{"author": "Harlan", "points": [{"point": "The rule is unwise", "page": 504}]}],
+}
+
+
+def test_renders_page_cited_notes():
+    notes = render_extraction(EXTRACTION)
+    assert notes.startswith("Parties: Miranda (petitioner) v. Arizona (respondent)\nMajority opinion by: Warren")
+    assert "- Miranda was questioned without warnings [Page 491]" in notes
+    assert "Dissent by Harlan:\n- The rule is unwise [Page 504]" in notes
+
+
+@pytest.mark.parametrize("parties", ["Miranda v. Arizona", ["Miranda", "Arizona"], None, {"petitioner": None}])
+def test_malformed_parties_fall_back_to_unknown(parties):
+    notes = render_extraction(dict(EXTRACTION, parties=parties))
+    assert notes.startswith("Parties: Unknown (petitioner) v. Unknown (respondent)")
+    assert "[Page 491]" in notes
+
+
+def test_malformed_points_and_dissents_are_skipped():
+    notes = render_extraction(dict(EXTRACTION, facts="just a string", dissents="none"))
+    assert "Facts:\n- None stated" in notes
+    assert "Dissents: none. No justice dissented." in notes
+
+
+def test_section_keys_limit_the_notes():
+    notes = render_extraction(EXTRACTION, SECTION_EXTRACTION_KEYS["Issue"])
+    assert "Issues:\n- None stated" in notes
+    assert "Facts:" not in notes and "Dissent" not in notes
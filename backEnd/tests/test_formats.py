@@ -0,0 +1,116 @@
+# --- Output format negotiation and rendered-artifact reuse on the brief endpoints ---
+
+import io
+import json
+import zipfile
+
+import pytest
+
+pytest.importorskip("httpx")  # fastapi's TestClient runs on httpx
+from fastapi.testclient import TestClient
+
+import pipeline
+import server
+from artifacts import ArtifactStore
+
+BRIEF = {
+    "Case Name": "Miranda v. Arizona",
+    "Citation": "384 U.S. 436",
+    "Date Filed": "1966-06-13",
+    "Docket Number": "759",
+    **{key: f"{key} of the brief [Page 436]." for key in pipeline.SECTION_KEYS},
+}
+
+
+@pytest.fixture
+def renders(monkeypatch, tmp_path):
+    # Formats rendered from scratch, in order; the brief is always answered from the cache
+    rendered = []
+    render_brief = pipeline.render_brief
+
+    def counting_render(brief, fmt="pdf"):
+        rendered.append(fmt)
+        return render_brief(brief, fmt)
+
+    monkeypatch.setattr(pipeline, "render_brief", counting_render)
+    monkeypatch.setattr(pipeline, "cached_brief", lambda citation, mode, ctx: dict(BRIEF))
+    monkeypatch.setattr(server, "artifact_store", ArtifactStore(str(tmp_path)))
+    monkeypatch.setattr(server, "PIPELINE_BACKEND", "inprocess")
+    return rendered
+
+
+@pytest.fixture
+def client(renders):
+    return TestClient(server.app)
+
+
+def _post(client, accept=None, **form):
+    headers = {"Accept": accept} if accept is not None else {}
+    return client.post("/api/brief/by-citation", data={"citation": "384 U.S. 436", **form}, headers=headers)
+
+
+@pytest.mark.parametrize("accept, fmt", [
+    ("application/pdf", "pdf"),
+    ("application/json", "json"),
+    ("text/plain", "txt"),
+    ("application/zip", "zip"),
+    ("*/*", "pdf"),
+    ("text/*", "txt"),
+    ("text/html, application/json;q=0.5, text/plain;q=0.9", "txt"),
+    ("application/pdf;q=0, application/*;q=0.2, application/json;q=0.4", "json"),
+    ("image/png, application/zip;q=0.1", "zip"),
+])
+def test_accept_header_picks_the_format(client, accept, fmt):
+    response = _post(client, accept)
+    assert response.status_code == 200
+    assert response.headers["content-type"].split(";")[0] == server.OUTPUT_MEDIA_TYPES[fmt].split(";")[0]
+    assert response.headers["content-disposition"] == f'attachment; filename="Miranda_v._Arizona.{fmt}"'
+    assert response.headers["vary"] == "Accept"
+    body = response.content
+    if fmt == "pdf":
+        assert body.startswith(b"%PDF")
+    elif fmt == "json":
+        assert json.loads(body)["Case Name"] == "Miranda v. Arizona"
+    elif fmt == "zip":
+        names = zipfile.ZipFile(io.BytesIO(body)).namelist()
+        assert sorted(names) == [f"Miranda_v._Arizona.{f}" for f in ("json", "pdf", "txt")]
+    else:
+        assert "Miranda v. Arizona" in body.decode("utf-8")
+
+
+def test_explicit_format_wins_over_accept(client):
+    response = _post(client, "application/pdf", fmt="TXT")
+    assert response.headers["content-type"].startswith("text/plain")
+    assert _post(client, "application/pdf", fmt="docx").status_code == 400
+
+
+@pytest.mark.parametrize("accept", ["image/png", "text/html, application/xml", "application/json;q=0, text/plain;q=0"])
+def test_unsupported_accept_is_406(client, renders, accept):
+    response = _post(client, accept)
+    assert response.status_code == 406
+    assert "application/pdf" in response.json()["detail"]
+    assert renders == []
+
+    response = client.get("/api/briefs/no-such-job/result", headers={"Accept": accept})
+    assert response.status_code == 406
+
+
+def test_each_format_is_rendered_once(client, renders, tmp_path, monkeypatch):
+    first = _post(client, "application/json").content
+    assert _post(client, "application/json").content == first
+    assert renders == ["json"]
+
+    # The bundle reuses the JSON already rendered and renders only the other two
+    _post(client, "application/zip")
+    _post(client, "application/zip")
+    assert sorted(renders) == ["json", "pdf", "txt"]
+
+    # A new store over the same directory (a restart) serves from disk
+    monkeypatch.setattr(server, "artifact_store", ArtifactStore(str(tmp_path)))
+    assert _post(client, "application/json").content == first
+    assert sorted(renders) == ["json", "pdf", "txt"]
+
+    # A different brief is rendered afresh
+    monkeypatch.setattr(pipeline, "cached_brief", lambda citation, mode, ctx: dict(BRIEF, Citation="384 U.S. 437"))
+    _post(client, "application/json")
+    assert renders.count("json") == 2
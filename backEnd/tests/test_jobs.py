@@ -0,0 +1,133 @@
+# --- JobQueue coalescing, background line and completion callbacks ---
+
+import threading
+
+import pytest
+
+from jobs import JobQueue, QueueFullError
+
+
+class _Gate:
+    # Handler that records the jobs it runs and holds each one until released
+    def __init__(self):
+        self.started = []
+        self.release = threading.Event()
+        self.running = threading.Event()
+
+    def __call__(self, job):
+        self.started.append(job.params["name"])
+        self.running.set()
+        if not self.release.wait(5):
+            raise TimeoutError("gate never released")
+        return job.params["name"].upper()
+
+
+@pytest.fixture
+def gate():
+    return _Gate()
+
+
+@pytest.fixture
+def queue(gate):
+    queue = JobQueue(gate, workers=1, max_queued=2)
+    yield queue
+    gate.release.set()
+    queue.shutdown()
+
+
+def _busy(queue, gate):
+    # Occupies the only worker so later submissions stay queued
+    job = queue.submit({"name": "first"})
+    assert gate.running.wait(5)
+    return job
+
+
+def test_identical_submissions_share_one_job(queue, gate):
+    first = queue.submit({"name": "miranda"}, key="384 U.S. 436|student|pdf")
+    again = queue.submit({"name": "miranda"}, key="384 U.S. 436|student|pdf")
+    other = queue.submit({"name": "gideon"}, key="372 U.S. 335|student|pdf")
+    assert again is first and other is not first
+    assert first.subscribers == 2
+    assert queue.stats()["coalesced"] == 1
+
+    gate.release.set()
+    assert first.wait(5) and other.wait(5)
+    assert first.result == "MIRANDA"
+    assert gate.started.count("miranda") == 1
+
+
+def test_finished_key_starts_a_fresh_job(queue, gate):
+    gate.release.set()
+    first = queue.submit({"name": "miranda"}, key="k")
+    assert first.wait(5)
+    second = queue.submit({"name": "miranda"}, key="k")
+    assert second is not first
+    assert second.wait(5)
+    assert gate.started == ["miranda", "miranda"]
+
+
+def test_background_jobs_wait_for_the_main_line(queue, gate):
+    _busy(queue, gate)
+    background = queue.submit({"name": "prebrief"}, key="pre", background=True)
+    user = queue.submit({"name": "user"})
+    assert queue.position(user) == 0
+    assert queue.position(background) == 1
+
+    gate.release.set()
+    assert background.wait(5)
+    assert gate.started == ["first", "user", "prebrief"]
+
+
+def test_request_for_a_queued_prebrief_moves_it_to_the_main_line(queue, gate):
+    _busy(queue, gate)
+    background = queue.submit({"name": "prebrief"}, key="pre", background=True)
+    queue.submit({"name": "other"}, background=True)
+    joined = queue.submit({"name": "prebrief"}, key="pre")
+    assert joined is background
+    assert not joined.background
+    assert queue.position(joined) == 0
+    assert queue.stats()["background"] == 1
+
+
+def test_background_jobs_do_not_count_against_the_limit(queue, gate):
+    _busy(queue, gate)
+    for i in range(5):
+        queue.submit({"name": f"pre{i}"}, background=True)
+    queue.submit({"name": "a"})
+    queue.submit({"name": "b"})
+    with pytest.raises(QueueFullError):
+        queue.submit({"name": "c"})
+
+
+def test_done_callbacks_and_listeners(queue, gate):
+    job = _busy(queue, gate)
+    finished, published = [], []
+    job.add_done_callback(finished.append)
+    remove = job.add_listener(lambda: published.append(len(job.events)))
+
+    gate.release.set()
+    assert job.wait(5)
+    assert finished == [job]
+    # Published after the callbacks ran; wait for the final status event to land
+    job.events_since(1, 5)
+    assert published and published[-1] == len(job.events)
+    assert job.events[-1]["status"] == "done"
+
+    late = []
+    job.add_done_callback(late.append)
+    assert late == [job]
+    remove()
+
+
+def test_failed_handler_marks_the_job_failed():
+    def handler(job):
+        raise ValueError("no opinion text")
+
+    queue = JobQueue(handler)
+    try:
+        job = queue.submit({"name": "x"}, key="k")
+        assert job.wait(5)
+        assert job.status == "failed" and job.error == "no opinion text"
+        assert queue.submit({"name": "x"}, key="k") is not job
+    finally:
+        queue.shutdown()
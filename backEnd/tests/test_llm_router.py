@@ -0,0 +1,123 @@
+# --- OllamaRouter ejection, retry and re-admission against fake Ollama servers ---
+
+import threading
+
+import pytest
+
+from fake_services import start_fake_ollama
+from llm_client import OllamaRouter
+
+
+def _restart(server):
+    # Serve the same handler on the port the server had, as an Ollama that comes back up would
+    host, port = server.httpd.server_address
+    server.httpd = type(server.httpd)((host, port), server.httpd.RequestHandlerClass)
+    server._thread = threading.Thread(target=server.httpd.serve_forever, daemon=True)
+    server._thread.start()
+
+
+@pytest.fixture
+def backends():
+    servers = [start_fake_ollama(tokens_per_second=10000), start_fake_ollama(tokens_per_second=10000)]
+    yield servers
+    for server in servers:
+        server.close()
+
+
+@pytest.fixture
+def router(backends):
+    # health_interval=0: no probe thread, the tests call check_health() themselves
+    router = OllamaRouter([s.url for s in backends], eject_after=1, health_interval=0, timeout=5)
+    yield router
+    router.close()
+
+
+def _backend(router, url):
+    return next(b for b in router.stats()["backends"] if b["url"] == url)
+
+
+def test_spreads_requests_over_healthy_backends(router, backends):
+    for _ in range(4):
+        router.generate("Summarize the opinion.", max_tokens=8)
+    assert [s.state["requests"] for s in backends] == [2, 2]
+    assert router.stats()["calls"] == 4
+
+
+def test_failed_backend_is_retried_elsewhere_and_ejected(router, backends):
+    down, up = backends
+    down.close()
+    results = [router.generate("Summarize the opinion.", max_tokens=8) for _ in range(3)]
+    assert {r.backend for r in results} == {up.url}
+    stats = router.stats()
+    # Only the first request hit the dead server; after that it was out of rotation
+    assert stats["retries"] == 1
+    assert _backend(router, down.url)["healthy"] is False
+    assert _backend(router, up.url)["calls"] == 3
+
+
+def test_streamed_request_is_not_retried_after_tokens_arrive(router, backends):
+    tokens = []
+
+    def on_token(token):
+        tokens.append(token)
+        raise RuntimeError("caller gave up")
+
+    with pytest.raises(RuntimeError):
+        router.generate("Summarize the opinion.", max_tokens=8, on_token=on_token)
+    # Retrying would replay tokens the caller already saw
+    assert len(tokens) == 1
+    assert router.stats()["retries"] == 0
+
+
+def test_health_check_readmits_a_recovered_backend(router, backends):
+    down, up = backends
+    down.close()
+    router.check_health()
+    assert _backend(router, down.url)["healthy"] is False
+    router.generate("Summarize the opinion.", max_tokens=8)
+    assert up.state["requests"] == 1
+
+    _restart(down)
+    router.check_health()
+    assert _backend(router, down.url)["healthy"] is True
+    for _ in range(2):
+        router.generate("Summarize the opinion.", max_tokens=8)
+    assert down.state["requests"] == 1
+
+
+def test_all_backends_down_raises(router, backends):
+    for server in backends:
+        server.close()
+    with pytest.raises(Exception):
+        router.generate("Summarize the opinion.", max_tokens=8)
+    assert all(not b["healthy"] for b in router.stats()["backends"])
+
+
+def test_stream_stopped_early_is_counted_from_its_chunks(router, backends, monkeypatch):
+    import metrics
+    import pipeline
+
+    tokens = []
+
+    def on_token(token):
+        tokens.append(token)
+        return len(tokens) == 5
+
+    result = router.generate("Summarize the opinion.", max_tokens=50, on_token=on_token)
+    # No closing chunk arrives, so the output is counted per chunk and the prompt is not reported
+    assert result.stopped_early
+    assert result.eval_count == 5 and result.eval_duration > 0
+    assert result.prompt_eval_count == 0
+
+    full = router.generate("Summarize the opinion.", max_tokens=8, on_token=lambda token: None)
+    assert not full.stopped_early and full.eval_count == 8 and full.prompt_eval_count > 0
+
+    stats = router.stats()
+    assert (stats["calls"], stats["stopped_early"], stats["eval_count"]) == (2, 1, 13)
+    assert _backend(router, result.backend)["stopped_early"] == 1
+
+    monkeypatch.setattr(pipeline, "_llm_client", router)
+    exposition = metrics.REGISTRY.render()
+    assert f'lex_llm_stopped_early_total{{backend="{result.backend}"}} 1' in exposition
+    output_tokens = sum(r.eval_count for r in (result, full) if r.backend == result.backend)
+    assert f'lex_llm_tokens_total{{backend="{result.backend}",kind="output"}} {output_tokens}' in exposition
@@ -0,0 +1,27 @@
+# --- Map step for long opinions: page-range chunks and page-cite validation of sections written from notes ---
+
+import pipeline
+
+
+def test_chunks_pack_whole_pages_and_name_their_range():
+    text = "[Page 436] First page. [Page 437] Second page. [Page 438] Third page."
+    chunks = pipeline.chunk_opinion(text, 50)
+    assert [c.page_range for c in chunks] == ["Pages 436–437", "Page 438"]
+    assert chunks[0].text == "[Page 436] First page. [Page 437] Second page."
+    assert pipeline.chunk_opinion("Unpaged text.", 30)[0].page_range == "Pages unknown"
+
+
+def test_sections_from_notes_must_cite_pages(monkeypatch):
+    monkeypatch.setattr(pipeline, "_request_generation", lambda prompt, *args: "Miranda was questioned (Page 101).")
+    text = " ".join(f"[Page {n}] Page {n} of the opinion." for n in range(100, 104))
+    notes = pipeline.map_opinion_notes(text, "Miranda v. Arizona", "384 U.S. 436", 0.3, chunk_chars=80, max_tokens=100)
+    assert [line for line in notes.splitlines() if line.startswith("[")] == ["[Pages 100–101]", "[Pages 102–103]"]
+    assert pipeline.PAGE_MARKER_RE.search(notes) is None
+
+    # The notes carry page-range headers instead of [Page N] markers; both make the page check apply
+    case_name = "Miranda v. Arizona"
+    assert pipeline.validate_section("Facts", "Miranda was questioned without warnings.", case_name, notes) == ["missing_page"]
+    assert pipeline.validate_section("Facts", "Miranda was questioned without warnings (Page 101).", case_name, notes) == []
+    assert pipeline.validate_section("Facts", "Miranda was questioned.", case_name, "[Page 101] Miranda was questioned.") == ["missing_page"]
+    assert pipeline.validate_section("Facts", "Miranda was questioned.", case_name, "[Pages unknown]\nMiranda was questioned.") == []
+    assert pipeline.validate_section("Dissent", "There was no dissent.", case_name, notes) == []
@@ -0,0 +1,131 @@
+# --- CourtListenerClient and fetch_opinions against the fake CourtListener, with and without the store ---
+
+import time
+
+import pytest
+import requests
+
+from fake_services import start_fake_courtlistener
+from opinion_store import CourtListenerClient, OpinionStore, fetch_opinions
+
+CITATION = "12 U.S. 345"
+
+
+@pytest.fixture
+def courtlistener():
+    server = start_fake_courtlistener()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def client(courtlistener):
+    client = CourtListenerClient(None, base_url=courtlistener.url, backoff_factor=0.01, timeout=5)
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = OpinionStore(str(tmp_path / "opinions.sqlite3"))
+    yield store
+    store.close()
+
+
+def test_first_fetch_stores_every_sub_opinion_majority_first(client, store, courtlistener):
+    cluster, opinions = fetch_opinions(CITATION, client, store)
+    assert cluster["case_name"] == "Petitioner345 v. State"
+    assert [o["type"] for o in opinions] == ["020lead", "040dissent"]
+    # One lookup and one GET per sub-opinion
+    assert courtlistener.state["requests"] == 3
+    stored = store.get(CITATION)
+    assert {e["etag"] for e in stored["opinions"]} == {'"12-345"', '"12-345-dissent"'}
+
+
+def test_fresh_store_hit_needs_no_request(client, store, courtlistener):
+    fetch_opinions(CITATION, client, store)
+    courtlistener.close()
+    requests_before = courtlistener.state["requests"]
+    offline = CourtListenerClient(None, base_url=courtlistener.url, max_retries=0, timeout=1)
+    try:
+        cluster, opinions = fetch_opinions(CITATION, offline, store)
+    finally:
+        offline.close()
+    assert cluster["case_name"] == "Petitioner345 v. State"
+    assert len(opinions) == 2
+    assert courtlistener.state["requests"] == requests_before
+
+
+def test_stale_entry_is_revalidated_and_served_from_the_store_on_304(client, store, courtlistener):
+    _, first = fetch_opinions(CITATION, client, store)
+    fetched_at = store.get(CITATION)["fetched_at"]
+    time.sleep(0.01)
+
+    _, again = fetch_opinions(CITATION, client, store, revalidate_after=0)
+    assert again == first
+    assert courtlistener.state["not_modified"] == 2
+    # Revalidation renews the entry without rewriting it
+    assert store.get(CITATION)["fetched_at"] > fetched_at
+
+
+def test_stale_entry_is_served_when_revalidation_fails(client, store, courtlistener):
+    _, first = fetch_opinions(CITATION, client, store)
+    courtlistener.close()
+    offline = CourtListenerClient(None, base_url=courtlistener.url, max_retries=0, timeout=1)
+    try:
+        _, again = fetch_opinions(CITATION, offline, store, revalidate_after=0)
+    finally:
+        offline.close()
+    assert again == first
+
+
+def test_throttled_requests_are_retried():
+    server = start_fake_courtlistener(throttle=2)
+    client = CourtListenerClient(None, base_url=server.url, max_retries=3, backoff_factor=0.01, timeout=5)
+    try:
+        results = client.lookup_citation(CITATION)
+        assert results[0]["status"] == 200
+        assert server.state["throttled"] == 2
+        assert server.state["requests"] == 3
+    finally:
+        client.close()
+        server.close()
+
+
+def test_throttling_past_the_retry_budget_raises():
+    server = start_fake_courtlistener(throttle=10)
+    client = CourtListenerClient(None, base_url=server.url, max_retries=2, backoff_factor=0.01, timeout=5)
+    try:
+        with pytest.raises(requests.HTTPError) as e:
+            client.lookup_citation(CITATION)
+        assert e.value.response.status_code == 429
+        assert server.state["requests"] == 3
+    finally:
+        client.close()
+        server.close()
+
+
+def test_lookup_citations_resolves_a_batch_per_request(client, courtlistener):
+    citations = ["12 U.S. 345", "Not a citation", "6 U.S. 78", "30  U. S.  9"]
+    resolved = client.lookup_citations(citations, batch_size=2)
+    assert courtlistener.state["requests"] == 2
+    # Results are matched back to the citation they came from, by offset
+    assert set(resolved) == {"12 U.S. 345", "6 U.S. 78", "30  U. S.  9"}
+    assert resolved["6 U.S. 78"]["clusters"][0]["case_name"] == "Petitioner78 v. State"
+    assert resolved["30  U. S.  9"]["clusters"][0]["case_name"] == "Petitioner9 v. State"
+
+
+def test_resolved_cluster_skips_the_lookup_and_aliases_share_its_row(client, store, courtlistener):
+    resolved = client.lookup_citations([CITATION])
+    requests_before = courtlistener.state["requests"]
+    cluster, opinions = fetch_opinions(CITATION, client, store, cluster=resolved[CITATION]["clusters"][0])
+    # Only the two sub-opinion GETs
+    assert courtlistener.state["requests"] == requests_before + 2
+
+    stored = store.get(CITATION)
+    store.put_many([([CITATION, "86 S. Ct. 1602", "16 l. ed. 2d 694"], stored["cluster"], stored["opinions"])])
+    requests_before = courtlistener.state["requests"]
+    alias_cluster, alias_opinions = fetch_opinions("86  S. Ct. 1602", client, store)
+    assert alias_cluster == cluster and alias_opinions == opinions
+    assert store.canonical("16 L. Ed. 2d 694") == CITATION
+    assert courtlistener.state["requests"] == requests_before
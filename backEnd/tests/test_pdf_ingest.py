@@ -0,0 +1,45 @@
+# --- PyMuPDF text extraction: the in-process and worker-process paths give the same pages ---
+
+import re
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+from pdf_ingest import extract_pdf_text, iter_pdf_pages
+from pipeline import preprocess
+
+PAGES = 20
+FIRST_PAGE = 436
+
+
+@pytest.fixture(scope="module")
+def opinion_pdf(tmp_path_factory):
+    # Numbered like a reporter volume, so the markers come from the page labels, not the index
+    path = tmp_path_factory.mktemp("pdf") / "opinion.pdf"
+    doc = fitz.open()
+    for i in range(PAGES):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Opinion page {FIRST_PAGE + i}. The Court considered custodial interrogation.")
+    doc.set_page_labels([{"startpage": 0, "prefix": "", "style": "D", "firstpagenum": FIRST_PAGE}])
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def test_serial_and_parallel_extraction_match(opinion_pdf):
+    serial = extract_pdf_text(opinion_pdf, workers=1)
+    parallel = "\n".join(iter_pdf_pages(opinion_pdf, workers=3, batch_pages=3, parallel_min_pages=1))
+    assert parallel == serial
+
+    markers = [int(n) for n in re.findall(r"\[Page (\d+)\]", preprocess(parallel))]
+    assert markers == list(range(FIRST_PAGE, FIRST_PAGE + PAGES))
+
+
+def test_each_page_follows_its_marker(opinion_pdf):
+    pages = list(iter_pdf_pages(opinion_pdf, workers=2, batch_pages=4, parallel_min_pages=1))
+    assert len(pages) == PAGES
+    for i, text in enumerate(pages):
+        number = FIRST_PAGE + i
+        assert text.startswith(f"*{number}\n")
+        assert f"Opinion page {number}." in text
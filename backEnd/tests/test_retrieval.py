@@ -0,0 +1,111 @@
+# --- Per-section retrieval: page-anchored passages, BM25 search, and extraction from passages ---
+
+import threading
+
+import fake_services
+import pipeline
+from retrieval import PassageIndex, split_passages, tokenize
+
+HEADINGS = {heading: kind for kind, heading in pipeline.OPINION_HEADINGS.items()}
+
+OPINION = (
+    "[Page 436] Petitioner was arrested at his home and taken to a police station. "
+    "Officers questioned him for two hours in an interrogation room. "
+    "[Page 437] He signed a written confession, which was admitted at trial over objection. "
+    "The jury convicted him of kidnapping and rape. "
+    "[Page 438] The question presented is whether statements obtained in custodial interrogation are admissible "
+    "without warnings of the privilege against self-incrimination. "
+    "[Page 439] We hold that the prosecution may not use such statements unless procedural safeguards were employed. "
+    "The judgment of the Supreme Court of Arizona is reversed. "
+    "Dissenting opinion by Harlan "
+    "[Page 504] I respectfully dissent, for the Court today imposes a rule the Constitution does not require. "
+    "The majority's rule will hamper legitimate police work."
+)
+
+
+def test_passages_keep_their_page_and_never_cross_one():
+    passages = split_passages(OPINION, HEADINGS, max_chars=120)
+    assert [p.index for p in passages] == list(range(len(passages)))
+    # The heading starts the dissent on the page it was set on; its text starts a new page
+    assert [p.page for p in passages] == ["436", "436", "437", "437", "438", "439", "439", "439", "504", "504"]
+    assert passages[7].text == "Dissenting opinion by Harlan"
+    assert all("[Page" not in p.text for p in passages)
+    assert passages[2].render() == "[Page 437] He signed a written confession, which was admitted at trial over objection."
+    # A sentence longer than max_chars stands alone rather than being cut
+    assert passages[4].text.startswith("The question presented") and len(passages[4].text) > 120
+
+
+def test_text_after_a_heading_belongs_to_that_opinion():
+    passages = split_passages(OPINION, HEADINGS, max_chars=120)
+    assert [p.kind for p in passages] == ["majority"] * 7 + ["dissent"] * 3
+    assert all(p.kind == "majority" for p in split_passages(OPINION, {}))
+
+
+def test_search_finds_the_passage_with_the_query_terms():
+    index = PassageIndex(split_passages(OPINION, HEADINGS, max_chars=120))
+    assert tokenize("Officers arrested") == ["officer", "arrest"]
+    assert [p.page for p in index.search("signed confession admitted", 1)] == ["437"]
+    assert index.search("custodial interrogation privilege", 1)[0].text.startswith("The question presented")
+    # Results come back in opinion order, with pinned passages always included
+    results = index.search("confession", 3, pinned=[9])
+    assert [p.index for p in results] == sorted(p.index for p in results) and results[-1].index == 9
+
+
+def test_section_passages_are_scoped_and_pinned():
+    index = PassageIndex(split_passages(OPINION, HEADINGS, max_chars=120))
+    dissent = pipeline.section_passages(index, "Dissent", 3)
+    assert dissent.split("\n\n") == [p.render() for p in index.passages[7:]]
+
+    disposition = pipeline.section_passages(index, "Disposition", 2)
+    # The last two majority passages, not the dissent that follows them
+    assert disposition.split("\n\n") == [index.passages[5].render(), index.passages[6].render()]
+    assert pipeline.section_passages(index, "Facts", 2).startswith(index.passages[0].render())
+
+    # Without opinion headings (an uploaded PDF) the Dissent section searches the whole text
+    flat = PassageIndex(split_passages(OPINION, {}, max_chars=120))
+    assert "[Page 504]" in pipeline.section_passages(flat, "Dissent", 1)
+
+
+def test_extraction_reads_section_passages_not_the_opinion(monkeypatch):
+    monkeypatch.delenv("LEX_SECTION_RETRIEVAL", raising=False)
+    monkeypatch.delenv("LEX_TWO_STAGE", raising=False)
+    monkeypatch.setenv("LEX_COMPACT", "0")
+    text = pipeline.preprocess(fake_services.make_opinion_text(20, 450, seed=3)) + " " + OPINION
+    requests = []
+    lock = threading.Lock()
+
+    def request_sections(prompt, keys, *args, kind="sections", **kwargs):
+        with lock:
+            requests.append((kind, keys, prompt))
+        part = {
+            "parties": {"petitioner": "Miranda", "respondent": "Arizona"},
+            "majority_author": "Warren",
+            "dissents": [{"author": "Harlan", "points": [{"point": "The rule is unwise", "page": 504}]}],
+        }
+        return {key: part.get(key, [{"point": f"{key} point", "page": 436}]) for key in keys}
+
+    def opinion_source_text(*args):
+        raise AssertionError("the whole opinion went to the extraction")
+
+    styled = {}
+
+    def style(text, **kwargs):
+        styled.update(kwargs["section_sources"])
+        return {key: "x" for key in pipeline.SECTION_KEYS}
+
+    monkeypatch.setattr(pipeline, "_request_sections", request_sections)
+    monkeypatch.setattr(pipeline, "opinion_source_text", opinion_source_text)
+    monkeypatch.setattr(pipeline, "generate_case_sections_with_mixtral", style)
+
+    ctx = pipeline.CaseContext(cleaned_text=text)
+    assert len(text) > 48000
+    sections = pipeline.segment_case_sections(ctx, "student", 0.3, 100, None)
+    assert all(sections[key] == "x" for key in pipeline.SECTION_KEYS)
+
+    assert all(kind == "extract" for kind, _, _ in requests)
+    assert sorted(keys for _, keys, _ in requests) == sorted(pipeline.SECTION_EXTRACTION_KEYS.values())
+    assert all(len(prompt) < len(text) / 4 for _, _, prompt in requests)
+    dissent_prompt = next(prompt for _, keys, prompt in requests if keys == ["dissents"])
+    assert "[Page 504] I respectfully dissent" in dissent_prompt
+    assert ctx.extraction["parties"]["petitioner"] == "Miranda"
+    assert "Dissent by Harlan:\n- The rule is unwise [Page 504]" in styled["Dissent"]
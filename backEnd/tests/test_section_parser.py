@@ -0,0 +1,94 @@
+# --- Incremental section parsing (SectionStreamParser, parse_sections) and streamed section requests ---
+
+import json
+
+import pytest
+
+import pipeline
+from fake_services import start_fake_ollama
+from llm_client import OllamaRouter
+from pipeline import SectionStreamParser, parse_sections
+
+SECTIONS = {
+    "Facts": "Miranda was questioned in custody without warnings (Page 491).",
+    "Issue": "Whether the statements were admissible (Page 439).",
+    "Dissent": "Justice Harlan dissented, writing that \"the new rule\" is unwise (Page 504).",
+}
+
+
+def _feed_in_chunks(parser, text, size):
+    completed = []
+    for i in range(0, len(text), size):
+        completed.extend(parser.feed(text[i:i + size]))
+    return completed
+
+
+@pytest.mark.parametrize("size", [1, 3, 17, 10000])
+def test_reports_each_section_once_as_it_closes(size):
+    text = json.dumps(SECTIONS, indent=2)
+    parser = SectionStreamParser()
+    completed = _feed_in_chunks(parser, text, size)
+    assert completed == list(SECTIONS.items())
+    assert parser.sections == SECTIONS
+    assert parser.complete
+
+
+def test_section_is_not_reported_before_its_value_closes():
+    parser = SectionStreamParser()
+    assert parser.feed('{"Facts": "Miranda was questioned') == []
+    assert parser.feed(' in custody", "Issue"') == [("Facts", "Miranda was questioned in custody")]
+    assert parser.feed(': "Admissibility"}') == [("Issue", "Admissibility")]
+
+
+def test_bare_number_waits_for_a_delimiter():
+    parser = SectionStreamParser()
+    assert parser.feed('{"page": 49') == []
+    assert parser.feed('1, "Facts": "x"}') == [("page", 491), ("Facts", "x")]
+
+
+def test_truncated_output_keeps_closed_sections():
+    text = json.dumps(SECTIONS)
+    parser = SectionStreamParser()
+    parser.feed(text[:text.index('"Dissent"') + 20])
+    assert list(parser.sections) == ["Facts", "Issue"]
+    assert not parser.complete
+
+
+def test_raw_newlines_inside_strings_are_accepted():
+    parser = SectionStreamParser()
+    parser.feed('{"Facts": "line one\nline two"}')
+    assert parser.sections == {"Facts": "line one\nline two"}
+
+
+def test_stray_brace_in_a_preamble_is_skipped():
+    text = 'Here is the brief {as requested}:\n' + json.dumps(SECTIONS)
+    parser = SectionStreamParser()
+    parser.feed(text)
+    assert parser.sections == SECTIONS
+
+
+def test_parse_sections_recovers_the_most_sections():
+    text = '{"note": "draft" follows below\n{"Facts": "a", "Issue": "b", "Rule of Law": "c", "Holding'
+    assert parse_sections(text) == {"Facts": "a", "Issue": "b", "Rule of Law": "c"}
+    assert parse_sections("no JSON at all") == {}
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    server = start_fake_ollama(tokens_per_second=20000)
+    router = OllamaRouter([server.url], health_interval=0, timeout=5)
+    monkeypatch.setattr(pipeline, "_llm_client", router)
+    monkeypatch.setenv("LEX_OLLAMA_FORMAT", "schema")
+    yield server
+    router.close()
+    server.close()
+
+
+def test_request_sections_streams_each_section(fake_client):
+    keys = ["Facts", "Issue", "Dissent"]
+    seen = []
+    prompt = "Brief **Miranda v. Arizona, 384 U.S. 436** [Page 436] text [Page 437] more [Page 438]"
+    sections = pipeline._request_sections(prompt, keys, 0.3, 1500, on_section=lambda k, v: seen.append(k))
+    assert seen == keys
+    assert list(sections) == keys
+    assert all("Miranda v. Arizona" in value and "(Page 437)" in value for value in sections.values())
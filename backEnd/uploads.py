@@ -0,0 +1,145 @@
+# --- uploads.py (Streams multipart file uploads straight to disk) ---
+
+from dataclasses import dataclass, field
+import tempfile
+import hashlib
+import os
+
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+    from python_multipart.exceptions import MultipartParseError
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+    from multipart.exceptions import MultipartParseError
+
+MAX_FIELD_BYTES = 64 * 1024
+
+
+@dataclass
+class Upload:
+    path: str
+    filename: str
+    size: int
+    sha256: str
+    fields: dict = field(default_factory=dict)
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class _PartCollector:
+    # MultipartParser callbacks: the file part's bytes are queued for the caller to write out,
+    # small text fields are kept in memory
+    def __init__(self, file_field: str, max_bytes: int):
+        self.file_field = file_field
+        self.max_bytes = max_bytes
+        self.fields = {}
+        self.filename = None
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.pending = []
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._name = None
+        self._is_file = False
+        self._value = bytearray()
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._part_begin,
+            "on_header_field": self._header_field_data,
+            "on_header_value": self._header_value_data,
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+        }
+
+    def _part_begin(self):
+        self._headers = {}
+        self._value = bytearray()
+
+    def _header_field_data(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _header_value_data(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._name = options.get(b"name", b"").decode("utf-8", "replace")
+        self._is_file = self._name == self.file_field and b"filename" in options
+        if self._is_file:
+            if self.filename is not None:
+                raise HTTPException(400, f"Only one '{self.file_field}' file may be uploaded")
+            self.filename = os.path.basename(options[b"filename"].decode("utf-8", "replace"))
+
+    def _part_data(self, data: bytes, start: int, end: int):
+        if self._is_file:
+            chunk = data[start:end]
+            self.size += len(chunk)
+            if self.size > self.max_bytes:
+                raise HTTPException(413, f"Upload exceeds {self.max_bytes // (1024 * 1024)} MB")
+            self.digest.update(chunk)
+            self.pending.append(chunk)
+        else:
+            self._value += data[start:end]
+            if len(self._value) > MAX_FIELD_BYTES:
+                raise HTTPException(413, f"Form field '{self._name}' is too large")
+
+    def _part_end(self):
+        if not self._is_file and self._name:
+            self.fields[self._name] = self._value.decode("utf-8", "replace")
+
+
+async def receive_upload(
+    request: Request,
+    directory: str,
+    max_bytes: int,
+    file_field: str = "file",
+    suffix: str = ""
+) -> Upload:
+    """Parses a multipart/form-data body as it arrives, writing the `file_field` part to a new file in
+    `directory` chunk by chunk, so memory use doesn't grow with the upload's size."""
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(415, "Expected a multipart/form-data upload")
+
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+    collector = _PartCollector(file_field, max_bytes)
+    parser = MultipartParser(boundary, collector.callbacks())
+    try:
+        with os.fdopen(fd, "wb") as out:
+            async for chunk in request.stream():
+                parser.write(chunk)
+                if collector.pending:
+                    data = b"".join(collector.pending)
+                    collector.pending.clear()
+                    await run_in_threadpool(out.write, data)
+            parser.finalize()
+        if collector.filename is None:
+            raise HTTPException(400, f"Missing '{file_field}' file")
+    except MultipartParseError as e:
+        os.remove(path)
+        raise HTTPException(400, f"Malformed multipart body: {e}")
+    except BaseException:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        raise
+    return Upload(path, collector.filename, collector.size, collector.digest.hexdigest(), collector.fields)